@@ -1,41 +1,36 @@
 #!/usr/bin/env python
 
-import time
-
-import cv2
 import rospy
-from std_msgs.msg import String
-
-
-def get_image():
-    """Fetch an image from the webcam"""
-    cap = cv2.VideoCapture(0)
-    ret, frame = cap.read()
-    cap.release()
-    return frame
-
+from sensor_msgs.msg import CompressedImage
+from std_msgs.msg import Float32
 
-def encode_image(image):
-    """Encode an image as a jpeg and return the raw bytes"""
-    _, jpeg = cv2.imencode('.jpg', image)
-    return jpeg.tobytes()
-
-
-def send_image(image, pub):
-    """Send an image to the ROS topic"""
-    msg = encode_image(image)
-    pub.publish(msg)
+from Cam_pipeline import CameraSource, CapturePipeline, AdaptiveController
 
 
 def cam_node():
     """Main function"""
-    pub = rospy.Publisher('chatter', String, queue_size=1)
+    pub = rospy.Publisher('/camera/image/compressed', CompressedImage, queue_size=1)
     rospy.init_node('cam_node', anonymous=True)
-    rate = rospy.Rate(10)  # 10hz
-    while not rospy.is_shutdown():
-        image = get_image()
-        send_image(image, pub)
-        rate.sleep()
+
+    def send_image(jpeg, capture_time):
+        """Send an encoded image to the ROS topic"""
+        msg = CompressedImage()
+        msg.header.stamp = rospy.Time.from_sec(capture_time)
+        msg.header.frame_id = "camera"
+        msg.format = "jpeg"
+        msg.data = jpeg
+        pub.publish(msg)
+
+    # Capture, encode and publish run on their own threads, the controller picks the resolution, quality and rate
+    # Nothing is encoded while no one is subscribed
+    controller = AdaptiveController(rospy.get_param('~target_bitrate', 2000000))
+    pipeline = CapturePipeline(CameraSource(0), send_image, is_wanted=lambda: pub.get_num_connections() > 0,
+                               controller=controller)
+    for topic in ('/camera/backlog', '/camera/frame_age'):
+        rospy.Subscriber(topic, Float32, lambda msg, source=topic: controller.report_delay(msg.data, source))
+    pipeline.start()
+    rospy.on_shutdown(pipeline.stop)
+    rospy.spin()
 
 
 if __name__ == '__main__':
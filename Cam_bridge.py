@@ -1,39 +1,97 @@
+"""
+Publishes the robot's webcam as sensor_msgs/CompressedImage through rosbridge
+
+    python Cam_bridge.py [--host 127.0.0.1] [--port 9090] [--rate 15] [--target-kbps 2000] [--synthetic]
+
+Nothing is encoded while /camera/image/compressed has no subscribers. Resolution, JPEG quality and frame rate adapt
+to keep under the target bitrate and to the delay the driver station reports on /camera/backlog and
+/camera/frame_age (std_msgs/Float32, seconds)
+"""
+import argparse
+import logging
 
 import roslibpy
-import cv2
 
-client = roslibpy.Ros(host='127.0.0.1', port=9090)
+from Cam_pipeline import CameraSource, CapturePipeline, AdaptiveController, compressed_image
+from ROS.CameraFrames import SyntheticFrameSource
+
+logging = logging.getLogger(__name__)
+
+IMAGE_TOPIC = '/camera/image/compressed'
+BACKLOG_TOPIC = '/camera/backlog'
+FRAME_AGE_TOPIC = '/camera/frame_age'
+
+
+class SubscriberWatch:
+    """Polls rosapi for the number of subscribers to a topic without blocking the caller"""
+
+    def __init__(self, client, topic, interval=1.0):
+        self.client = client
+        self.topic = topic
+        self.interval = interval
+        self.subscribers = 0
+        self._service = roslibpy.Service(client, '/rosapi/subscribers', 'rosapi/Subscribers')
+
+    def start(self):
+        self._poll()
 
-publisher = roslibpy.Topic(client, '/camera/image/compressed', 'sensor_msgs/CompressedImage')
-publisher.advertise()
+    def _poll(self):
+        if self.client.is_connected:
+            self._service.call(roslibpy.ServiceRequest({"topic": self.topic}), self._on_result,
+                               lambda error: logging.error(f"Subscriber lookup for {self.topic} failed: {error}"))
+        self.client.call_later(self.interval, self._poll)
 
-def get_image():
-    """Fetch an image from the webcam"""
-    cap = cv2.VideoCapture(0)
-    ret, frame = cap.read()
-    cap.release()
-    return frame
+    def _on_result(self, result):
+        subscribers = len(result["subscribers"])
+        if (subscribers == 0) != (self.subscribers == 0):
+            logging.info(f"{self.topic} now has {subscribers} subscribers")
+        self.subscribers = subscribers
 
+    def __call__(self):
+        return self.subscribers > 0
 
-def encode_image(image):
-    """Encode an image as a jpeg and return the raw bytes"""
-    _, jpeg = cv2.imencode('.jpg', image)
-    return jpeg.tobytes()
 
+def main():
+    import logging as logging_config
+    logging_config.basicConfig(level=logging_config.INFO)
 
-def send_image(image, pub):
-    """Send an image to the ROS topic"""
-    msg = encode_image(image)
-    pub.publish(msg)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--rate", type=float, default=15, help="Highest publish rate (Hz)")
+    parser.add_argument("--target-kbps", type=float, default=2000, help="Bitrate the camera should stay under")
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--synthetic", action="store_true", help="Publish generated frames instead of the camera")
+    args = parser.parse_args()
 
+    client = roslibpy.Ros(host=args.host, port=args.port)
 
-def publish_image():
-    image = get_image()
-    send_image(image, publisher)
+    publisher = roslibpy.Topic(client, IMAGE_TOPIC, 'sensor_msgs/CompressedImage')
+    publisher.advertise()
+    watch = SubscriberWatch(client, IMAGE_TOPIC)
+    sequence = [0]
 
+    def send_image(jpeg, capture_time):
+        """Send an encoded image to the ROS topic"""
+        sequence[0] += 1
+        publisher.publish(roslibpy.Message(compressed_image(jpeg, capture_time, sequence[0])))
 
-client.on_ready(publish_image)
-client.run_forever()
+    source = SyntheticFrameSource() if args.synthetic else CameraSource(args.device)
+    # The camera stays open for as long as the bridge runs
+    levels = [(scale, quality, min(fps, args.rate)) for scale, quality, fps in AdaptiveController.LEVELS]
+    controller = AdaptiveController(args.target_kbps * 1000, levels=levels)
+    pipeline = CapturePipeline(source, send_image, is_wanted=watch, controller=controller)
+    for topic in (BACKLOG_TOPIC, FRAME_AGE_TOPIC):
+        feedback = roslibpy.Topic(client, topic, 'std_msgs/Float32')
+        feedback.subscribe(lambda message, source=topic: controller.report_delay(message["data"], source))
 
+    client.on_ready(pipeline.start)
+    client.on_ready(watch.start)
+    try:
+        client.run_forever()
+    finally:
+        pipeline.stop()
 
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import base64
+import threading
+import time
+import logging
+
+import cv2
+
+from ROS.CameraFrames import encode_jpeg
+
+logging = logging.getLogger(__name__)
+
+ENCODE_MARGIN = 0.01  # Seconds of slack between an encode finishing and the publish tick it is meant for
+
+
+class LatestSlot:
+    """Holds only the newest item, a put() replaces whatever the consumer hasn't taken yet"""
+
+    def __init__(self):
+        self._item = None
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def put(self, item):
+        """Stores item, returns True if an item that was never taken got overwritten"""
+        with self._condition:
+            overwritten = self._item is not None
+            self._item = item
+            self._sequence += 1
+            self._condition.notify_all()
+            return overwritten
+
+    def take(self, timeout=None):
+        """Waits up to timeout for an item and removes it, returns None on timeout"""
+        with self._condition:
+            if self._item is None:
+                self._condition.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def wake(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+class CameraSource:
+    """Keeps the capture device open for the life of the pipeline"""
+
+    def __init__(self, device=0, width=None, height=None):
+        self.device = device
+        self.capture = cv2.VideoCapture(device)
+        if width is not None and height is not None:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Don't let the driver queue stale frames either
+        if not self.capture.isOpened():
+            raise Exception(f"Unable to open camera {device}")
+
+    def read(self):
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def release(self):
+        self.capture.release()
+
+
+def scale_frame(frame, scale):
+    if scale == 1.0:
+        return frame
+    return cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def compressed_image(jpeg, capture_time, seq=0, frame_id="camera"):
+    """Builds a rosbridge sensor_msgs/CompressedImage, rosbridge expects the uint8[] data base64 encoded"""
+    secs = int(capture_time)
+    return {
+        "header": {"seq": seq, "stamp": {"secs": secs, "nsecs": int((capture_time - secs) * 1e9)},
+                   "frame_id": frame_id},
+        "format": "jpeg",
+        "data": base64.b64encode(jpeg).decode("ascii"),
+    }
+
+
+class AdaptiveController:
+    """
+    Closed loop choice of (scale, JPEG quality, fps) for the camera from a ladder of levels, best first
+    Inputs are the encoded frame sizes (giving the bitrate each level costs) and delay reports from the viewer, the
+    age of the frames it receives or the link's queueing delay, whichever is worse
+    It steps down as soon as the bitrate exceeds target or the viewer falls behind and only steps back up after the
+    link has been quiet for hold seconds and the better level is predicted to fit, so it doesn't oscillate
+    """
+
+    LEVELS = [  # (scale, quality, fps)
+        (1.0, 85, 15),
+        (1.0, 70, 12),
+        (0.75, 70, 10),
+        (0.75, 55, 8),
+        (0.5, 55, 6),
+        (0.5, 40, 4),
+        (0.25, 40, 2),
+    ]
+
+    def __init__(self, target_bitrate=2_000_000, levels=None, max_delay=0.5, min_delay=0.15, hold=3.0,
+                 down_interval=0.5, level=None, clock=time.monotonic):
+        self.target_bitrate = target_bitrate  # bits per second
+        self.levels = levels or self.LEVELS
+        self.max_delay = max_delay
+        self.min_delay = min_delay
+        self.hold = hold
+        self.down_interval = down_interval
+        self.clock = clock
+        self.level = len(self.levels) // 2 if level is None else level
+
+        self._frame_bytes = {}  # level -> moving average of the encoded frame size
+        self._delays = {}  # feedback source -> (delay, time reported)
+        self._last_change = self.clock()
+        self._delay_at_change = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def record_frame(self, nbytes):
+        with self._lock:
+            average = self._frame_bytes.get(self.level)
+            self._frame_bytes[self.level] = nbytes if average is None else average * 0.8 + nbytes * 0.2
+
+    def report_delay(self, delay, source="viewer"):
+        """Seconds the viewer is behind, each source's latest report counts for 3 seconds"""
+        with self._lock:
+            self._delays[source] = (delay, self.clock())
+
+    def delay(self):
+        now = self.clock()
+        fresh = [delay for delay, reported in self._delays.values() if now - reported < 3]
+        return max(fresh) if fresh else 0.0
+
+    def predicted_bitrate(self, level):
+        """bits/s of a level, measured if it has been used, otherwise scaled from the nearest measured level"""
+        scale, quality, fps = self.levels[level]
+        if level in self._frame_bytes:
+            return self._frame_bytes[level] * fps * 8
+        if not self._frame_bytes:
+            return 0.0
+        known = min(self._frame_bytes, key=lambda known_level: abs(known_level - level))
+        known_scale, known_quality, _ = self.levels[known]
+        # JPEG size goes roughly with pixel count and (less than linearly) with quality
+        ratio = (scale / known_scale) ** 2 * (quality / known_quality)
+        return self._frame_bytes[known] * ratio * fps * 8
+
+    def update(self):
+        """Re-evaluates the level, returns the (scale, quality, fps) to use next"""
+        with self._lock:
+            now = self.clock()
+            delay = self.delay()
+            since_change = now - self._last_change
+            over_budget = self.predicted_bitrate(self.level) > self.target_bitrate
+            # Once a step down has the viewer's delay falling, give the backlog time to drain before stepping again
+            behind = delay > self.max_delay and delay >= self._delay_at_change * 0.9
+            if (behind or over_budget) and since_change > self.down_interval:
+                steps = 2 if delay > self.max_delay * 4 else 1
+                self._set_level(min(self.level + steps, len(self.levels) - 1), now, delay)
+            elif delay < self.min_delay and since_change > self.hold and self.level > 0 \
+                    and self.predicted_bitrate(self.level - 1) < self.target_bitrate * 0.85:
+                self._set_level(self.level - 1, now, delay)
+            return self.levels[self.level]
+
+    def _set_level(self, level, now, delay):
+        if level != self.level:
+            scale, quality, fps = self.levels[level]
+            logging.info(f"Camera level {self.level} -> {level} ({scale:.2f}x, q{quality}, {fps}fps), "
+                         f"delay {delay * 1000:.0f}ms, {self.predicted_bitrate(self.level) / 1000:.0f}kbps")
+            self.level = level
+        self._last_change = now
+        self._delay_at_change = delay
+
+
+class CapturePipeline:
+    """
+    Three stage camera pipeline: capture -> encode -> publish, each on its own thread
+    Stages hand over through LatestSlots, so when encoding or publishing falls behind the older frames are dropped
+    instead of queued and the published image is always the newest one available
+    The encoder is paced to start just early enough before each publish tick, so frames the publisher would never
+    send aren't encoded
+    publish(jpeg_bytes, capture_time) is called at a steady rate Hz, a tick with no new frame publishes nothing
+    While is_wanted() returns False (e.g. no subscribers) frames are still captured but never encoded or published
+    With an AdaptiveController the scale, quality and rate follow the controller instead of being fixed
+    """
+
+    def __init__(self, source, publish, rate=10, quality=80, encoder=encode_jpeg, is_wanted=None, controller=None):
+        self.source = source
+        self.publish = publish
+        self.rate = rate
+        self.quality = quality
+        self.scale = 1.0
+        self.encoder = encoder
+        self.is_wanted = is_wanted
+        self.controller = controller  # type: AdaptiveController or None
+
+        self._frames = LatestSlot()  # (frame, capture_time)
+        self._encoded = LatestSlot()  # (jpeg bytes, capture_time)
+        self._running = False
+        self._threads = []
+        self._next_tick = time.perf_counter()
+        self._encode_time = 0.0  # Moving average of one encode (s)
+
+        self.captured = 0
+        self.encoded = 0
+        self.published = 0
+        self.dropped_frames = 0  # Captured but replaced by a newer frame before being encoded
+        self.dropped_encoded = 0  # Encoded but replaced by a newer frame before being published
+        self.skipped_ticks = 0  # Publish ticks skipped because publish() itself overran
+        self.unwanted_ticks = 0  # Ticks where encoding was skipped because nobody wanted the image
+        self.latency = 0.0  # Capture to publish of the last published frame (s)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._threads = [threading.Thread(target=target, name=f"camera-{target.__name__.strip('_')}", daemon=True)
+                         for target in (self._capture_loop, self._encode_loop, self._publish_loop)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self._frames.wake()
+        self._encoded.wake()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self.source.release()
+
+    def stats(self):
+        return {"captured": self.captured, "encoded": self.encoded, "published": self.published,
+                "dropped_frames": self.dropped_frames, "dropped_encoded": self.dropped_encoded,
+                "skipped_ticks": self.skipped_ticks, "unwanted_ticks": self.unwanted_ticks, "latency": self.latency}
+
+    def set_rate(self, rate):
+        """Changes the publish rate, takes effect from the next tick"""
+        if rate != self.rate:
+            logging.info(f"Camera publish rate set to {rate:.1f}Hz")
+        self.rate = rate
+
+    def _capture_loop(self):
+        while self._running:
+            try:
+                frame = self.source.read()
+            except Exception as e:
+                logging.error(f"Camera capture failed: {e}")
+                time.sleep(1)
+                continue
+            if frame is None:
+                time.sleep(0.01)
+                continue
+            self.captured += 1
+            if self._frames.put((frame, time.time())):
+                self.dropped_frames += 1
+
+    def _encode_loop(self):
+        encoded_tick = None
+        while self._running:
+            # Encode once per publish tick, starting so it finishes just before the tick
+            tick = self._next_tick
+            if tick == encoded_tick:
+                time.sleep(min(max(tick - time.perf_counter(), 0.001), 0.5))
+                continue
+            delay = tick - self._encode_time * 2 - ENCODE_MARGIN - time.perf_counter()
+            if delay > 0:
+                time.sleep(min(delay, 0.5))
+                continue
+            if self.is_wanted is not None and not self.is_wanted():
+                encoded_tick = tick
+                self.unwanted_ticks += 1
+                continue
+            item = self._frames.take(timeout=0.5)
+            if item is None:
+                continue
+            frame, capture_time = item
+            if self.controller is not None:
+                self.scale, self.quality, rate = self.controller.update()
+                self.set_rate(rate)
+            start = time.perf_counter()
+            try:
+                jpeg = self.encoder(scale_frame(frame, self.scale), self.quality)
+            except Exception as e:
+                logging.error(f"Camera encode failed: {e}")
+                continue
+            self._encode_time = self._encode_time * 0.8 + (time.perf_counter() - start) * 0.2
+            if self.controller is not None:
+                self.controller.record_frame(len(jpeg))
+            self.encoded += 1
+            encoded_tick = tick
+            if self._encoded.put((jpeg, capture_time)):
+                self.dropped_encoded += 1
+
+    def _publish_loop(self):
+        self._next_tick = time.perf_counter() + 1 / self.rate
+        while self._running:
+            period = 1 / self.rate
+            delay = self._next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -period:
+                # Publishing overran by more than a tick, skip the missed ticks rather than bursting to catch up
+                missed = int(-delay / period)
+                self.skipped_ticks += missed
+                self._next_tick += missed * period
+            item = self._encoded.take(timeout=0)
+            self._next_tick += period
+            if item is None:
+                continue
+            jpeg, capture_time = item
+            try:
+                self.publish(jpeg, capture_time)
+            except Exception as e:
+                logging.error(f"Camera publish failed: {e}")
+                continue
+            self.published += 1
+            self.latency = time.time() - capture_time
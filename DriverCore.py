@@ -0,0 +1,97 @@
+import time
+import threading
+
+import controller
+from ROS.ROSInterface import ROSInterface
+from ROS.ReplayBuffer import ReplayBuffer
+from ROS.RobotState import CannonCombinedTopic
+
+import logging
+
+logging = logging.getLogger(__name__)
+
+
+class DriverCore:
+    """
+    Everything the driver station does that doesn't need a display: the gamepad drives the robot and works the
+    cannons, and with replay_seconds every shot saves a replay. The Qt window, the terminal dashboard and headless
+    mode all run on one of these, the Qt window only adds what needs a widget through add_button_listener
+    """
+
+    DEADBAND = 0.15
+    READ_INTERVAL = 0.1  # Seconds between gamepad reads
+
+    def __init__(self, robot: ROSInterface, cannon_robot: ROSInterface = None, replay_seconds=0.0):
+        self.robot = robot
+        # The cannon controller either shares the Pioneer's bridge or has its own
+        self.cannon_robot = cannon_robot if cannon_robot is not None else robot
+        self.cannons = [CannonCombinedTopic.for_cannon(self.cannon_robot, n) for n in range(2)]
+        self.armed_by_bumper = [False, False]
+        self.button_listeners = {}  # button -> callbacks run on the controller thread while it is held
+        self.controller_thread = None  # type: threading.Thread or None
+        try:
+            self.xbox_controller = controller.XboxController()
+        except Exception as e:
+            logging.error(f"Error initializing controller: {e}")
+            self.xbox_controller = None
+
+        # Every shot saves the camera feed from replay_seconds before it to a clip in configs/replays. Holding the
+        # camera token keeps the robot encoding frames whether or not a viewer is open, so it is opt-in
+        self.replay = None  # type: ReplayBuffer or None
+        self.replay_camera = None  # The replay buffer's camera token
+        camera = self.robot.get_state("camera")
+        if replay_seconds > 0 and camera is not None:
+            self.replay = ReplayBuffer(before=replay_seconds)
+            camera.add_message_listener(self.replay.on_message)
+            # Kept as delivered, nothing is decoded unless a viewer is open too
+            self.replay_camera = camera.start(decode=False)
+            self.cannon_robot.add_service_listener("/can/fire", lambda name: self.replay.trigger("fire"))
+
+    def add_button_listener(self, button, callback):
+        """callback() runs on the controller thread on every read while the XboxController attribute button is set"""
+        self.button_listeners.setdefault(button, []).append(callback)
+
+    def start(self):
+        self.controller_thread = threading.Thread(target=self.controller_read_loop, name="controller", daemon=True)
+        self.controller_thread.start()
+
+    def controller_read_loop(self):
+        """Loop for the joystick"""
+        try:
+            while True:
+                # Apply deadbands to the joystick
+                forward = self.xbox_controller.LeftJoystickY * -1
+                if abs(forward) < self.DEADBAND:
+                    forward = 0
+                turn = self.xbox_controller.LeftJoystickX * -1
+                if abs(turn) < self.DEADBAND:
+                    turn = 0
+
+                self.robot.drive(forward, turn)
+
+                if self.xbox_controller.A:
+                    self.robot.execute_service("my_p3at/enable_motors")
+                if self.xbox_controller.B:
+                    self.robot.execute_service("my_p3at/disable_motors")
+                if self.xbox_controller.Y:
+                    self.cannon_robot.execute_service("/can/fire")
+                for button, callbacks in self.button_listeners.items():
+                    if getattr(self.xbox_controller, button):
+                        for callback in callbacks:
+                            callback()
+
+                # Each bumper arms its cannon while held, and only disarms it if the bumper armed it
+                bumpers = (self.xbox_controller.LeftBumper, self.xbox_controller.RightBumper)
+                for n, (held, cannon) in enumerate(zip(bumpers, self.cannons)):
+                    if held:
+                        if not cannon.is_armed():
+                            cannon.send_command("arm")
+                            self.armed_by_bumper[n] = True
+                    elif cannon.is_armed() and self.armed_by_bumper[n]:
+                        cannon.send_command("disarm")
+                        self.armed_by_bumper[n] = False
+
+                time.sleep(self.READ_INTERVAL)
+        except Exception as e:
+            logging.error(f"Error reading controller: {e}")
+            self.robot.drive(0, 0)
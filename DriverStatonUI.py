@@ -1,17 +1,15 @@
-import time
-import threading
-
 from PyQt5.QtWidgets import QMainWindow
 
-import controller
+from DriverCore import DriverCore
 from QT5_Classes.CannonUI import CannonUI
 from QT5_Classes.ConnectionUI import ConnectionUI
+from QT5_Classes.FrameClock import FrameClock
 from QT5_Classes.PointCloud2UI import PointCloud2UI
 from QT5_Classes.SignalUI import SignalUI
 from QT5_Classes.PioneerUI import PioneerUI
 from QT5_Classes.TopicStatusUI import TopicUI
+from QT5_Classes.TrendPlot import TrendPlot, TrendLane
 # from QT5_Classes.WebcamUI import WebcamWindow
-from ROS.ROSInterface import ROSInterface
 from ROS.RobotState import RobotState
 
 import logging
@@ -21,28 +19,32 @@ logging = logging.getLogger(__name__)
 
 class DriverStationUI:
 
-    def __init__(self, robot: ROSInterface):
+    def __init__(self, core: DriverCore, ui_fps=30):
+
+        self.core = core
+        self.robot = core.robot
+        self.cannon_robot = core.cannon_robot
 
-        self.robot = robot
-        self.last_redraw = 0  # type: int
+        self.robot_state = self.robot.robot_state_monitor.state_watcher  # type: RobotState
 
-        self.robot_state = robot.robot_state_monitor.state_watcher  # type: RobotState
-        try:
-            self.xbox_controller = controller.XboxController()
-        except Exception as e:
-            logging.error(f"Error initializing controller: {e}")
-            self.xbox_controller = None
+        # Every widget refreshes off the one frame clock
+        self.frame_clock = FrameClock.shared()
+        self.frame_clock.set_fps(ui_fps)
 
         self.window = QMainWindow()
-        self.window.resize(1280, 720)
+        # The status bar shows how busy the GUI thread is below the 1280x720 layout
+        status_bar = self.window.statusBar()
+        self.window.resize(1280, 720 + status_bar.sizeHint().height())
+        self.frame_clock.add_report_listener(lambda clock: status_bar.showMessage(clock.status_text()))
 
         self.connection_ui = ConnectionUI(self.robot, self.window)
         self.pioneer_ui = PioneerUI(self.robot, parent=self.window)
-        self.cannon_ui = CannonUI(self.robot, parent=self.window)
+        self.cannon_ui = CannonUI(self.cannon_robot, parent=self.window)
         self.signal_info = SignalUI(self.robot, self.window)
         self.topic_info = TopicUI(self.robot, self.window)
         # self.webcam = WebcamWindow(self.robot, self.window)
         self.sonar_view = PointCloud2UI(self.robot, parent=self.window)
+        self.trend_plot = self.make_trend_plot()
 
         # Move the pioneer UI to the bottom left
         self.pioneer_ui.move(0, 480)
@@ -51,6 +53,8 @@ class DriverStationUI:
         # Move the webcam to the top right
         # self.webcam.move(640, 0)
         self.sonar_view.move(640, 0)
+        # Trends in the free space under the cannon controls
+        self.trend_plot.move(115, 320)
         # Move the signal info to the bottom right
         # self.signal_info.move(self.window.width() - self.signal_info.width(), 20 + self.webcam.height())
         self.signal_info.move(self.window.width() - self.signal_info.width(), 20 + self.sonar_view.height())
@@ -64,63 +68,21 @@ class DriverStationUI:
 
         self.window.show()
 
-        self.tank1_was_armed = False
-        self.tank2_was_armed = False
-
-        threading.Thread(target=self.controller_read_loop, daemon=True).start()
-
-    # def run(self):
-    #     """Draw the HUD until the program exits"""
-    #
-    #     with Live(self.draw_table(), refresh_per_second=1, screen=True) as live:
-    #         while self.robot.client.is_connected:
-    #             if self.should_redraw():
-    #                 live.update(self.draw_table())
-    #             time.sleep(0.1)
-
-    def controller_read_loop(self):
-        """Loop for the joystick"""
-        # Read the controller while the window is open
-        try:
-            while True:
-                # Apply deadbands to the joystick
-                forward = self.xbox_controller.LeftJoystickY * -1
-                if abs(forward) < 0.15:
-                    forward = 0
-                turn = self.xbox_controller.LeftJoystickX * -1
-                if abs(turn) < 0.15:
-                    turn = 0
-
-                self.robot.drive(forward, turn)
-
-                if self.xbox_controller.A:
-                    self.robot.execute_service("my_p3at/enable_motors")
-                if self.xbox_controller.B:
-                    self.robot.execute_service("my_p3at/disable_motors")
-                if self.xbox_controller.X:
-                    self.sonar_view.toggle()
-                if self.xbox_controller.Y:
-                    self.robot.execute_service("/can/fire")
-
-                if self.xbox_controller.LeftBumper:
-                    if not self.cannon_ui.tank1.cannonArmed():
-                        self.cannon_ui.tank1.armDisarm(True)
-                        self.tank1_was_armed = True
-                else:
-                    if self.cannon_ui.tank1.cannonArmed() and self.tank1_was_armed:
-                        self.cannon_ui.tank1.armDisarm(False)
-                        self.tank1_was_armed = False
-
-                if self.xbox_controller.RightBumper:
-                    if not self.cannon_ui.tank2.cannonArmed():
-                        self.cannon_ui.tank2.armDisarm(True)
-                        self.tank2_was_armed = True
-                else:
-                    if self.cannon_ui.tank2.cannonArmed() and self.tank2_was_armed:
-                        self.cannon_ui.tank2.armDisarm(False)
-                        self.tank2_was_armed = False
-
-                time.sleep(0.1)
-        except Exception as e:
-            logging.error(f"Error reading controller: {e}")
-            self.robot.drive(0, 0)
+        # The gamepad's X button shows and hides the sonar
+        self.core.add_button_listener("X", self.sonar_view.toggle)
+
+    def make_trend_plot(self):
+        """Scrolling traces of the tank pressures, battery voltage and commanded velocity"""
+        cannon, robot = self.cannon_robot, self.robot
+        # Same topics AirTankElement shows as pressure
+        tank1 = cannon.add_history("tank_1_pressure", "cannon_0_state")
+        tank2 = cannon.add_history("tank_2_pressure", "cannon_1_state")
+        voltage = robot.add_history("battery_voltage", "battery_voltage")
+        forward = robot.add_history("cmd_vel_forward", "cmd_vel", lambda value: value["linear"]["x"])
+        turn = robot.add_history("cmd_vel_turn", "cmd_vel", lambda value: value["angular"]["z"])
+        lanes = [
+            TrendLane("Pressure", [("T1", tank1, "deepskyblue"), ("T2", tank2, "orange")], (0, 100)),
+            TrendLane("Battery", [("V", voltage, "limegreen")], unit="V"),
+            TrendLane("Cmd vel", [("fwd", forward, "yellow"), ("turn", turn, "magenta")], (-1, 1)),
+        ]
+        return TrendPlot(lanes, parent=self.window)
@@ -0,0 +1,46 @@
+import asyncio
+import time
+import logging
+
+from PyQt5.QtCore import QTimer, QObject
+
+logging = logging.getLogger(__name__)
+
+
+class QtAsyncioPump(QObject):
+    """
+    Drives an asyncio event loop from the Qt event loop so rosbridge traffic is handled on the GUI thread
+    Each timer tick steps the asyncio loop with call_soon(loop.stop) and run_forever(), one pass over its ready
+    callbacks and I/O per step, until a step finds nothing to do or the time budget is used up. Only the public loop
+    API is used, so any AbstractEventLoop (uvloop included) can be pumped
+    """
+
+    IDLE_STEP = 30e-6  # An idle step takes ~5us, one that returns quicker than this found no work
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval_ms=2, budget_ms=4, parent=None):
+        super().__init__(parent)
+        self.loop = loop
+        self.budget = budget_ms / 1000
+        self.max_passes = 16  # Upper bound on loop steps per tick
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.pump)
+        self.timer.start(interval_ms)
+
+    def pump(self):
+        try:
+            asyncio.set_event_loop(self.loop)
+            deadline = time.perf_counter() + self.budget
+            for _ in range(self.max_passes):
+                start = time.perf_counter()
+                self.loop.call_soon(self.loop.stop)
+                self.loop.run_forever()
+                now = time.perf_counter()
+                # Anything scheduled by a quick step runs on the next tick
+                if now - start < self.IDLE_STEP or now > deadline:
+                    break
+        except Exception as e:
+            logging.error(f"Error pumping asyncio loop: {e}")
+
+    def stop(self):
+        self.timer.stop()
@@ -2,12 +2,13 @@ import traceback
 
 from PyQt5 import QtCore, Qt
 from PyQt5.QtCore import pyqtSlot, QLine, QRect, QPoint, QSize
-from PyQt5.QtGui import QPainter, QColor, QPen
+from PyQt5.QtGui import QPainter, QColor, QPen, QFont, QPixmap, QRegion, QStaticText, QTextOption
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QGridLayout, QPushButton, QLineEdit
 
 import logging
 import random
 
+from QT5_Classes.FrameClock import FrameClock
 from ROS.RobotState import CannonCombinedTopic
 
 logging = logging.getLogger(__name__)
@@ -97,6 +98,108 @@ logging = logging.getLogger(__name__)
 #             logging.error(f"Error setting solenoid graphic: {e}")
 
 
+class TankGauge(QWidget):
+    """
+    A tank's pressure as a bar filling a box with the value written in the middle, painted as one widget
+    The empty, full and fault boxes (fill and border) are drawn once into pixmaps, so a paint is two blits split at the
+    bar's end plus the value's QStaticText. set_value() only repaints the strip of bar that moved and the text band,
+    and nothing when the bar and the text come out the same
+    """
+
+    FILLS = {None: QColor("grey"), False: QColor("green"), True: QColor("red")}  # Empty, then by fault state
+    BORDER = QPen(QColor("black"), 2)
+    TEXT_COLOR = QColor("black")
+
+    def __init__(self, minimum, maximum, unit, width=500, height=60, parent=None):
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+        self.value = None
+        self.fault = True
+        self.fill_width = width
+
+        font = QFont(self.font())
+        font.setPixelSize(20)
+        font.setBold(True)
+        self.setFont(font)
+        # The text is centered in a fixed band across the middle, so changing it never needs a layout pass here
+        text_height = self.fontMetrics().height()
+        self._text_rect = QRect(0, (height - text_height) // 2, width, text_height)
+        self.text = QStaticText("Unknown")
+        self.text.setTextFormat(QtCore.Qt.PlainText)
+        self.text.setTextOption(QTextOption(QtCore.Qt.AlignHCenter))
+        self.text.setTextWidth(width)
+        self._boxes = {}  # Fill state to pixmap
+        self._ratio = None
+
+    def set_value(self, value, fault=False):
+        """Shows value (None if unknown), a fault fills the bar red. Returns True if the gauge will be repainted"""
+        if fault or value is None:
+            fill_width = self.width()
+        else:
+            fraction = (value - self.minimum) / (self.maximum - self.minimum)
+            fill_width = int(self.width() * min(max(fraction, 0), 1))
+        text = f"{value:.2f}{self.unit}" if value is not None else "Unknown"
+
+        dirty = QRegion()
+        if fault != self.fault:
+            dirty = QRegion(self.rect())
+        elif fill_width != self.fill_width:
+            left, right = sorted((fill_width, self.fill_width))
+            dirty = QRegion(left, 0, right - left, self.height())
+        if text != self.text.text():
+            self.text.setText(text)
+            dirty = dirty.united(self._text_rect)
+
+        self.value = value
+        self.fault = fault
+        self.fill_width = fill_width
+        if dirty.isEmpty():
+            return False
+        self.update(dirty)
+        return True
+
+    def box(self, fill):
+        """The tank filled with one colour, redrawn only when the screen's pixel ratio changes"""
+        ratio = self.devicePixelRatioF()
+        if ratio != self._ratio:
+            self._boxes.clear()
+            self._ratio = ratio
+        pixmap = self._boxes.get(fill)
+        if pixmap is None:
+            pixmap = QPixmap(self.size() * ratio)
+            pixmap.setDevicePixelRatio(ratio)
+            pixmap.fill(self.FILLS[fill])
+            painter = QPainter(pixmap)
+            painter.setPen(self.BORDER)
+            painter.drawRect(self.rect().adjusted(1, 1, -1, -1))
+            painter.end()
+            self._boxes[fill] = pixmap
+        return pixmap
+
+    def paintEvent(self, event):
+        try:
+            painter = QPainter(self)
+            ratio = self.devicePixelRatioF()
+            fill, height = self.fill_width, self.height()
+            if fill > 0:
+                painter.drawPixmap(QRect(0, 0, fill, height), self.box(self.fault),
+                                   QRect(0, 0, int(fill * ratio), int(height * ratio)))
+            if fill < self.width():
+                painter.drawPixmap(QRect(fill, 0, self.width() - fill, height), self.box(None),
+                                   QRect(int(fill * ratio), 0, int((self.width() - fill) * ratio), int(height * ratio)))
+            if event.rect().intersects(self._text_rect):
+                painter.setPen(self.TEXT_COLOR)
+                painter.drawStaticText(self._text_rect.topLeft(), self.text)
+            painter.end()
+        except Exception as e:
+            logging.error(f"Error painting tank gauge: {e}")
+
+
 class AirTankElement(QWidget):
     """
     Shows the pressure in a particular air tank, represented as a horizontal bar that fits inside of a horizontal rectangle
@@ -114,17 +217,7 @@ class AirTankElement(QWidget):
 
         self.tank_name = tank_name
 
-        set_pressure_topic = robot.get_state(f"cannon_{cannon_number}_target_pressure")
-        # get_pressure_topic = robot.get_state(f"cannon_{cannon_number}_pressure")
-        get_pressure_topic = robot.get_state(f"cannon_{cannon_number}_state")
-        set_state_topic = robot.get_state(f"cannon_{cannon_number}_set_state")
-        # get_state_topic = robot.get_state(f"cannon_{cannon_number}_state")
-        get_state_topic = robot.get_state(f"cannon_{cannon_number}_pressure")
-        get_auto_topic = robot.get_state(f"cannon_{cannon_number}_auto")
-
-        self.combined_topic = CannonCombinedTopic(set_pressure_topic, get_pressure_topic,
-                                                  set_state_topic, get_state_topic,
-                                                  get_auto_topic)
+        self.combined_topic = CannonCombinedTopic.for_cannon(robot, cannon_number)
 
         self.tank_max_pressure = tank_max_pressure
         self.tank_min_pressure = tank_min_pressure
@@ -136,27 +229,8 @@ class AirTankElement(QWidget):
         self.status = "Initializing"
 
         # Instantiate the UI graphics
-        self.tank_box = QLabel(self)
-        self.tank_box.setFixedSize(500, 60)
-        self.tank_box.setStyleSheet("background-color: grey; border: 2px solid black")
-
-        self.tank_pressure_bar = QLabel(self.tank_box)
-        self.tank_pressure_bar.setFixedSize(500, 60)
-        self.tank_pressure_bar.setStyleSheet("background-color: green; border")
-
-        # Setup the tank pressure text (in the center of the tank graphic)
-        self.tank_pressure_text = QLabel("Unknown", parent=self.tank_box)
-        self.tank_pressure_text.setFixedSize(150, 30)
-        self.tank_pressure_text.setAlignment(QtCore.Qt.AlignCenter)
-
-        # self.tank_pressure_text.setFixedSize(500, 60)
-        self.tank_pressure_text.setStyleSheet("color: black; background-color: transparent; border: 0px;"
-                                              "font-size: 20px; font-weight: bold")
-        self.tank_pressure_text.setText(str(self.tank_pressure) + " " + self.tank_pressure_unit)
-        # Move the tank pressure text to the center of the tank graphic
-        self.tank_pressure_text.move(int(self.tank_box.width() / 2 - self.tank_pressure_text.width() / 2),
-                                     int(self.tank_box.height() / 2 - self.tank_pressure_text.height() / 2))
-        # self.tank_pressure_text.setAlignment(QtCore.Qt.AlignCenter)
+        self.gauge = TankGauge(self.tank_min_pressure, self.tank_max_pressure, self.tank_pressure_unit, parent=self)
+        self.gauge.set_value(self.tank_pressure, fault=True)
 
         # Setup tank buttons
         self.auto_button = QPushButton("AUTO", parent=self)
@@ -203,8 +277,7 @@ class AirTankElement(QWidget):
 
         # Set up the layout
         self.tank_name_label.move(0, 0)
-        self.tank_box.move(10, 25)
-        # self.tank_pressure_bar.move(10, 10)
+        self.gauge.move(10, 25)
         self.pressure_set_input.move(10, 85)
         self.pressure_set_button.move(65, 85)
         # The buttons are placed on the bottom right side of the tank graphic
@@ -218,10 +291,8 @@ class AirTankElement(QWidget):
 
         self.set_style_sheets()
 
-        # Start the timer
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_loop)
-        self.timer.start(150)
+        # Refreshed by the shared frame clock
+        self.refresh = FrameClock.shared().register(self.update_loop, 150, name="AirTankElement")
 
     def set_style_sheets(self):
         self.auto_button.setStyleSheet("background-color: grey; font-size: 15px;")
@@ -250,25 +321,17 @@ class AirTankElement(QWidget):
                 self.status = "No Robot"
         except Exception as e:
             logging.error(f"{e}")
+        self.update_gauge()
 
-    def paintEvent(self, event):
-        super().paintEvent(event)
-
-        # If the tank is in a fault state, then set the pressure bar to red
-
+    def update_gauge(self):
+        """Updates the name and the gauge, each one only repaints if what it shows changed"""
         self.tank_name_label.setText(f"{self.tank_name}: {self.status}")
 
-        if self.robot is not None:
-            if self.robot.is_connected:
-                self.tank_pressure_bar.setStyleSheet("background-color: green")
-                self.tank_pressure_bar.setFixedSize(int(500 * self.pressure_percent), 60)
-                self.tank_pressure_text.setText(f"{self.tank_pressure:.2f}{self.tank_pressure_unit}")
-            else:
-                self.tank_pressure_bar.setStyleSheet("background-color: red")
-                self.tank_pressure_bar.setFixedSize(500, 60)
+        # If the tank is in a fault state, then the pressure bar is red
+        if self.robot is not None and self.robot.is_connected:
+            self.gauge.set_value(self.tank_pressure)
         else:
-            self.tank_pressure_bar.setStyleSheet("background-color: red")
-            self.tank_pressure_bar.setFixedSize(500, 60)
+            self.gauge.set_value(self.gauge.value, fault=True)
 
     @pyqtSlot()
     def on_arm_button_clicked(self):
@@ -373,9 +436,7 @@ class CannonUI(QWidget):
         self.tank2.move(60, 130)
         self.surface_label.move(0, 0)
 
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_loop)
-        self.timer.start(150)
+        self.refresh = FrameClock.shared().register(self.update_loop, 150, name="CannonUI")
 
     # def set(self, tank1_pressure, tank2_pressure):
     #     self.tank1.set(tank1_pressure)
@@ -2,6 +2,8 @@ import os
 
 from PyQt5.QtWidgets import QWidget, QLineEdit, QPushButton, QLabel
 
+from QT5_Classes.SSHLogUI import SSHLogUI
+
 
 class ConnectionUI(QWidget):
     """
@@ -40,11 +42,16 @@ class ConnectionUI(QWidget):
         self.connect_button = QPushButton("Connect", self)
         self.connect_button.clicked.connect(self.start_connect)
         self.connect_button.setFixedWidth(100)
+        self.log_button = QPushButton("Rosserial Log", self)
+        self.log_button.clicked.connect(self.open_log)
+        self.log_button.setFixedWidth(100)
+        self.log_window = None  # type: SSHLogUI or None
 
         # Set the layout of the UI
         self.ip_entry_label.move(0, 33)
         self.ip_entry.move(self.ip_entry_label.width() - 5, 30)
         self.connect_button.move(self.ip_entry_label.width() - 5, 60)
+        self.log_button.move(self.ip_entry_label.width() - 5, 90)
 
     def start_connect(self):
         ip = self.ip_entry.text()
@@ -65,5 +72,9 @@ class ConnectionUI(QWidget):
         self.connect_button.setText("Connect")
         self.robot.disconnect()
 
+    def open_log(self):
+        self.log_window = SSHLogUI(self.robot)
+        self.log_window.show()
+
     def paintEvent(self, event) -> None:
         super().paintEvent(event)
@@ -0,0 +1,162 @@
+import time
+import logging
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import QObject, QTimer
+
+logging = logging.getLogger(__name__)
+
+
+class FrameClockEntry:
+    """One widget refresh registered with the FrameClock, runs every `every` ticks while active"""
+
+    def __init__(self, clock, callback, interval_ms, widget, name):
+        self.clock = clock
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.every = clock.ticks(interval_ms)
+        self.widget = widget
+        self.name = name
+        self.active = True
+        self.time = 0.0  # Seconds spent in callback, summed
+
+    def cancel(self):
+        self.clock.unregister(self)
+
+
+class FrameClock(QObject):
+    """
+    The one timer every widget refreshes from, ticking at the display rate
+    Widgets register a callback with an interval that is rounded to whole ticks, so refreshes that used to fire out
+    of phase on their own QTimers now run back to back on the same tick. A callback returning True marks its widget
+    dirty and all dirty widgets get update() together after the pass, so Qt paints them in one go. Ticks where no
+    callback is due return straight away
+    The clock also reports what share of the GUI thread the refresh passes take and how late its ticks fire, the
+    lag catches everything else that holds the thread up (message handling, painting, the asyncio pump)
+    """
+
+    _shared = None  # type: FrameClock or None
+
+    def __init__(self, fps=30, parent=None):
+        super().__init__(parent)
+        self.fps = fps
+        self.entries = []
+        self.tick_count = 0
+
+        # Measured over the last report window
+        self._window_start = self._last_tick = time.perf_counter()
+        self._pass_time = 0.0
+        self._max_pass = 0.0
+        self._passes = 0
+        self._lag = 0.0
+        self._max_lag = 0.0
+        self._ticks = 0
+        self.utilisation = 0.0  # Fraction of the last window spent in refresh passes
+        self.frame_time = 0.0  # Mean refresh pass, seconds
+        self.max_frame_time = 0.0
+        self.lag = 0.0  # Mean time ticks fired after they were due, seconds
+        self.max_lag = 0.0
+        self.passes_per_second = 0.0
+        self._report_listeners = []
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(round(1000 / fps))
+
+        self._report_timer = QTimer(self)
+        self._report_timer.timeout.connect(self._report)
+        self._report_timer.start(1000)
+
+    @classmethod
+    def shared(cls):
+        """The application wide clock, created on first use"""
+        if cls._shared is None:
+            cls._shared = FrameClock()
+        return cls._shared
+
+    def set_fps(self, fps):
+        """Changes the display rate, registered intervals keep their length in milliseconds"""
+        self.fps = fps
+        for entry in self.entries:
+            entry.every = self.ticks(entry.interval_ms)
+        self.timer.start(round(1000 / fps))
+
+    def ticks(self, interval_ms):
+        return max(1, round(interval_ms * self.fps / 1000))
+
+    def register(self, callback, interval_ms=0, widget=None, name=None):
+        """
+        Runs callback() every interval_ms (rounded to whole ticks, at least every tick), if it returns True
+        widget.update() is called after the pass. Returns the entry, set entry.active to pause it
+        """
+        entry = FrameClockEntry(self, callback, interval_ms, widget,
+                                name or getattr(callback, "__qualname__", str(callback)))
+        self.entries.append(entry)
+        return entry
+
+    def unregister(self, entry):
+        if entry in self.entries:
+            self.entries.remove(entry)
+
+    def tick(self):
+        now = time.perf_counter()
+        lag = max(now - self._last_tick - 1 / self.fps, 0.0)
+        self._last_tick = now
+        self._lag += lag
+        self._max_lag = max(self._max_lag, lag)
+        self._ticks += 1
+
+        self.tick_count += 1
+        due = [entry for entry in self.entries if entry.active and self.tick_count % entry.every == 0]
+        if not due:
+            return
+        start = time.perf_counter()
+        dirty = []
+        for entry in due:
+            before = time.perf_counter()
+            try:
+                if entry.callback() and entry.widget is not None:
+                    dirty.append(entry.widget)
+            except Exception as e:
+                logging.error(f"Error in frame callback {entry.name}: {e}")
+            entry.time += time.perf_counter() - before
+        for widget in dirty:
+            widget.update()
+        elapsed = time.perf_counter() - start
+        self._pass_time += elapsed
+        self._max_pass = max(self._max_pass, elapsed)
+        self._passes += 1
+
+    def add_report_listener(self, callback):
+        """callback(clock) runs once a second after the utilisation figures are updated"""
+        self._report_listeners.append(callback)
+
+    def _report(self):
+        now = time.perf_counter()
+        window = now - self._window_start
+        if window <= 0:
+            return
+        self.utilisation = min(self._pass_time / window, 1.0)
+        self.frame_time = self._pass_time / self._passes if self._passes else 0.0
+        self.max_frame_time = self._max_pass
+        self.lag = self._lag / self._ticks if self._ticks else 0.0
+        self.max_lag = self._max_lag
+        self.passes_per_second = self._passes / window
+        self._window_start = now
+        self._pass_time = self._max_pass = self._lag = self._max_lag = 0.0
+        self._passes = self._ticks = 0
+        for listener in self._report_listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logging.error(f"Error in frame clock report listener: {e}")
+
+    def status_text(self):
+        return (f"Refresh {self.utilisation:.0%} of GUI thread, {self.frame_time * 1000:.1f} ms "
+                f"(max {self.max_frame_time * 1000:.1f}) {self.passes_per_second:.0f}/s at {self.fps} fps  |  "
+                f"tick lag {self.lag * 1000:.1f} ms (max {self.max_lag * 1000:.0f})")
+
+    def stop(self):
+        self.timer.stop()
+        self._report_timer.stop()
@@ -2,14 +2,21 @@ import math
 import traceback
 
 from PyQt5 import QtCore
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QMainWindow, QGridLayout, QPushButton
+from PyQt5.QtGui import QPainter, QColor, QBrush
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QMainWindow, QGridLayout
 import logging
+from QT5_Classes.FrameClock import FrameClock
+from QT5_Classes.StatusIndicator import StatusIndicator
 
 logging = logging.getLogger(__name__)
 
 
 class CmdVelWidget(QWidget):
-    """Display the X, Y values as a dot in a 1:1 window"""
+    """Display the X, Y values as a dot in a 1:1 window, the box and dot are painted directly"""
+
+    BOX_BRUSH = QBrush(QColor("black"))
+    DOT_BRUSH = QBrush(QColor("green"))
+    DOT_RADIUS = 3
 
     def __init__(self, size=100, expected_bounds=(-1, 1), parent=None):
         super().__init__()
@@ -19,10 +26,8 @@ class CmdVelWidget(QWidget):
         self.size = size
         self.expected_bounds = expected_bounds
 
-        # Set up the background box
-        self.box = QWidget(parent=self)
-        self.box.setFixedSize(size, size)
-        self.box.setStyleSheet("background-color: black")
+        # The background box, painted in paintEvent
+        self.box = QtCore.QRect(15, 15, size, size)
 
         # Set up the UI name text
         self.name = QLabel("Velocity CMD", parent=self)
@@ -37,13 +42,7 @@ class CmdVelWidget(QWidget):
         # Set text color to white
         self.value.setStyleSheet("color: green; font-size: 14px; font-weight: bold; alignment: center")
 
-        # Set up the dot
-        self.dot = QLabel("•", parent=self.box)
-        # self.dot.setFixedSize(5, 5)
-        self.dot.setStyleSheet("background-color: transparent; color: green")
-
         # Set up the layout
-        self.box.move(15, 15)
         self.name.move(15, 0)
         self.value.move(int(15 - self.value.width() / 2), self.box.height() + 15)
 
@@ -52,25 +51,26 @@ class CmdVelWidget(QWidget):
 
     def set(self, x, y):
         # print(f"Setting to {x}, {y}")
+        if (-y, x) == (self.x, self.y):
+            return
         self.x = -y
         self.y = x
-        self.repaint()
+        self.value.setText(f"{self.x}, {self.y}")
+        self.update(self.box)
 
     def paintEvent(self, event):
         try:
-            super().paintEvent(event)
+            painter = QPainter(self)
+            painter.fillRect(self.box, self.BOX_BRUSH)
 
             # Make zero the center of the box not the top left
-            x = (self.x * self.size / 2) + self.size / 2
-            y = (self.y * self.size / 2) + self.size / 2
-
-            # Move the dot to where it should be
-            point = QtCore.QPoint(int(x - self.dot.width() / 2), int(y - self.dot.height() / 2))
-            # print(f"Moving dot to {point}")
-            self.dot.move(point)
-
-            # Update the value text
-            self.value.setText(f"{self.x}, {self.y}")
+            x = self.box.x() + (self.x * self.size / 2) + self.size / 2
+            y = self.box.y() + (self.y * self.size / 2) + self.size / 2
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QtCore.Qt.NoPen)
+            painter.setBrush(self.DOT_BRUSH)
+            painter.drawEllipse(QtCore.QPointF(x, y), self.DOT_RADIUS, self.DOT_RADIUS)
+            painter.end()
         except Exception as e:
             logging.error(f"Error in paintEvent: {e}")
 
@@ -96,17 +96,21 @@ class PioneerUI(QWidget):
         self.motor_state = QLabel("Motor State", parent=self)
         self.motor_state.setFixedSize(110, 20)
         self.motor_state.setStyleSheet("color: black; font-size: 17px; font-weight: bold; alignment: center")
-        self.motor_state_toggle = QPushButton("Unknown", parent=self)
+        self.motor_state_toggle = StatusIndicator({"unknown": ("darkorange", "#e1e1e1"),
+                                                   "enabled": ("black", "green"),
+                                                   "disabled": ("black", "red")},
+                                                  text="Unknown", border=True, parent=self)
         self.motor_state_toggle.setFixedSize(100, 40)
         self.motor_state_toggle.clicked.connect(self.toggle_motor_state)
-        self.motor_state_toggle.setStyleSheet("font-color: black; font-size: 17px; font-weight: bold; alignment: center")
         self.motor_state_toggle.setEnabled(False)
         self.battery_voltage_header = QLabel("Battery Voltage", parent=self)
         self.battery_voltage_header.setFixedSize(150, 20)
         self.battery_voltage_header.setStyleSheet("color: black; font-size: 17px; font-weight: bold; alignment: center")
-        self.battery_voltage = QLabel("Unknown", parent=self)
+        self.battery_voltage = StatusIndicator({"unknown": ("black", None), "good": ("green", None),
+                                                "low": ("darkorange", None), "critical": ("red", None)},
+                                               text="Unknown", alignment=QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                                               parent=self)
         self.battery_voltage.setFixedSize(100, 20)
-        self.battery_voltage.setStyleSheet("color: black; font-size: 17px; font-weight: bold; alignment: center")
         self.velocity_header = QLabel("Velocity", parent=self)
         self.velocity_header.setFixedSize(100, 20)
         self.velocity_header.setStyleSheet("color: black; font-size: 17px; font-weight: bold; alignment: center")
@@ -129,14 +133,12 @@ class PioneerUI(QWidget):
 
         self.update()
 
-        # Set the update timer
-        self.update_timer = QtCore.QTimer()
-        self.update_timer.timeout.connect(self.updateUI)
-        self.update_timer.start(100)
+        # Refreshed by the shared frame clock
+        self.refresh = FrameClock.shared().register(self.updateUI, 100, name="PioneerUI")
 
     def toggle_motor_state(self):
         try:
-            if self.motor_state_toggle.text() == "Enabled":
+            if self.motor_state_toggle.state == "enabled":
                 self.robot.execute_service("my_p3at/disable_motors")
             else:
                 self.robot.execute_service("my_p3at/enable_motors")
@@ -163,18 +165,14 @@ class PioneerUI(QWidget):
         # Update the motor state with the current motor state
         try:
             motor_state = self.robot.robot_state_monitor.state_watcher.state("motors_state")
+            self.motor_state_toggle.setEnabled(True)
             if motor_state.value is not None:
-                self.motor_state_toggle.setEnabled(True)
                 if motor_state.value:
-                    self.motor_state_toggle.setText("Enabled")
-                    self.motor_state_toggle.setStyleSheet("background-color: green")
+                    self.motor_state_toggle.set_state("enabled", "Enabled")
                 else:
-                    self.motor_state_toggle.setText("Disabled")
-                    self.motor_state_toggle.setStyleSheet("background-color: red")
+                    self.motor_state_toggle.set_state("disabled", "Disabled")
             else:
-                self.motor_state_toggle.setText("Unknown")
-                self.motor_state_toggle.setStyleSheet("font-color: darkorange")
-                self.motor_state_toggle.setEnabled(True)
+                self.motor_state_toggle.set_state("unknown", "Unknown")
         except Exception as e:
             logging.error(f"Error updating motor state: {e}")
             self.motor_state.setText("Motor State: Error")
@@ -184,17 +182,17 @@ class PioneerUI(QWidget):
             battery_voltage = self.robot.robot_state_monitor.state_watcher.state("battery_voltage")
             if battery_voltage.value is not None:
                 if battery_voltage.value > 12.5:
-                    self.battery_voltage.setStyleSheet("color: green; font-size: 17px; font-weight: bold")
+                    state = "good"
                 elif battery_voltage.value > 12.2:
-                    self.battery_voltage.setStyleSheet("color: darkorange; font-size: 17px; font-weight: bold")
+                    state = "low"
                 else:
-                    self.battery_voltage.setStyleSheet("color: red; font-size: 17px; font-weight: bold")
-                self.battery_voltage.setText(f"{round(battery_voltage.value, 3)}V")
+                    state = "critical"
+                self.battery_voltage.set_state(state, f"{round(battery_voltage.value, 3)}V")
             else:
-                self.battery_voltage.setText("Unknown")
+                self.battery_voltage.set_state("unknown", "Unknown")
         except Exception as e:
             logging.error(f"Error updating battery voltage: {e}")
-            self.battery_voltage.setText("Battery Voltage: Error")
+            self.battery_voltage.set_state("unknown", "Error")
 
         try:
             pose = self.robot.robot_state_monitor.state_watcher.state("odometry")
@@ -205,7 +203,6 @@ class PioneerUI(QWidget):
                     for_vel = self.last_vel[0]
                     rot_vel = self.last_vel[1]
                 else:
-                    self.velocity.setStyleSheet("color: black")
                     # Convert from m/s to mi/hr
                     for_vel = for_vel * 2.23694
                     # Convert from rad/s to deg/s
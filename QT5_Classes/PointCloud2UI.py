@@ -1,7 +1,7 @@
 import base64
 import logging
+import math
 import struct
-import subprocess
 import time
 import traceback
 
@@ -9,11 +9,81 @@ import numpy as np
 
 from PyQt5 import QtCore, QtGui
 from PyQt5.QtCore import pyqtSlot
-from PyQt5.QtGui import QPixmap, QImage
+from PyQt5.QtGui import QPixmap, QImage, QPolygonF
 from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QOpenGLWidget
 
+from QT5_Classes.FrameClock import FrameClock
+from QT5_Classes.QtArrays import array_to_polygon
+from QT5_Classes.WebcamUI import WebcamWindow
+from ROS.OccupancyGrid import OccupancyGrid, pose_from_odometry
+from ROS.Sonar import SonarScan, FAR, CLEAR, NEAR
+
 logging = logging.getLogger(__name__)
 
+DOT_COLORS = {FAR: QtGui.QColor(255, 0, 0), CLEAR: QtGui.QColor(0, 255, 0), NEAR: QtGui.QColor(255, 165, 0)}
+DOT_SIZE = 5
+DENSE_SCAN = 2000  # Past this many points dots are drawn square, round dots are stroked as paths and cost ~8x more
+
+
+class SonarLayer:
+    """
+    The drawable form of a sonar scan, built once per scan: the closed outline through every point that is not FAR
+    and one point set per colour class, so painting is a handful of drawPoints/drawPolyline calls whatever the size
+    """
+
+    def __init__(self):
+        self.outline = QPolygonF()
+        self.points = {}  # colour class -> QPolygonF
+        self.dense = False
+        self.dot_pens = {color_class: QtGui.QPen(color, DOT_SIZE, QtCore.Qt.SolidLine, QtCore.Qt.RoundCap)
+                         for color_class, color in DOT_COLORS.items()}
+        self.dense_dot_pens = {color_class: QtGui.QPen(color, DOT_SIZE, QtCore.Qt.SolidLine, QtCore.Qt.SquareCap)
+                               for color_class, color in DOT_COLORS.items()}
+
+    def set_scan(self, pixels, classes):
+        pixels = np.asarray(pixels, dtype=np.float64)
+        self.dense = len(pixels) > DENSE_SCAN
+        self.points = {color_class: array_to_polygon(pixels[classes == color_class])
+                       for color_class in DOT_COLORS if np.any(classes == color_class)}
+        visible = pixels[classes != FAR]
+        self.outline = array_to_polygon(np.concatenate((visible, visible[:1])) if len(visible) else visible)
+
+    def paint(self, qp, line_color):
+        pens = self.dense_dot_pens if self.dense else self.dot_pens
+        for color_class, points in self.points.items():
+            qp.setPen(pens[color_class])
+            qp.drawPoints(points)
+        qp.setPen(QtGui.QPen(line_color, 1, QtCore.Qt.SolidLine))
+        qp.drawPolyline(self.outline)
+
+
+def grid_to_screen(grid, pose, scale=40, center=(320, 240)):
+    """
+    QTransform from occupancy grid image pixels to the robot centred view (forward up, scale pixels per meter)
+    screen x = cx - scale * robot y, screen y = cy - scale * robot x, the robot frame being the grid's world frame
+    rotated by -yaw around the robot
+    """
+    x, y, yaw = pose
+    cos, sin = math.cos(yaw), math.sin(yaw)
+    step = scale * grid.resolution
+    # World position of the image's (0, 0) corner relative to the robot
+    dx = grid.offset[0] * grid.resolution - x
+    dy = grid.offset[1] * grid.resolution - y
+    return QtGui.QTransform(step * sin, -step * cos, -step * cos, -step * sin,
+                            center[0] + scale * (sin * dx - cos * dy), center[1] - scale * (cos * dx + sin * dy))
+
+
+def draw_grid(size):
+    """The static background, only redrawn when the widget is resized"""
+    pixmap = QPixmap(size)
+    pixmap.fill(QtCore.Qt.black)
+    qp = QtGui.QPainter(pixmap)
+    qp.setPen(QtGui.QPen(QtCore.Qt.gray, 1, QtCore.Qt.DashLine))
+    qp.drawLine(320, 0, 320, 480)
+    qp.drawLine(0, 240, 640, 240)
+    qp.end()
+    return pixmap
+
 
 class PointCloud2UI(QOpenGLWidget):
 
@@ -24,7 +94,11 @@ class PointCloud2UI(QOpenGLWidget):
         try:
             self.robot = robot
 
-            self.point_cloud_topic = self.robot.robot_state_monitor.state_watcher.state("sonar")
+            # Scans come filtered from robot.sonar, fed by the PointCloud2 sonar once it sends anything and the JSON
+            # PointCloud one until then
+            self.sonar_topic = self.robot.robot_state_monitor.state_watcher.state("sonar")
+            self.sonar_cloud2_topic = self.robot.robot_state_monitor.state_watcher.state("sonar_pointcloud2")
+            self.point_cloud_topic = self.sonar_topic
 
             # self.window = QWidget()
             # self.label = QLabel(self)
@@ -36,150 +110,157 @@ class PointCloud2UI(QOpenGLWidget):
             self.toggle_button = QPushButton("Toggle Scan", self)
             self.webcam_button = QPushButton("Open Webcam", self)
             self.webcam_button.clicked.connect(self.open_webcam)
+            self.camera_button = QPushButton("ROS Camera", self)
+            self.camera_button.clicked.connect(self.open_camera_topic)
+            self.clear_map_button = QPushButton("Clear Map", self)
+            self.clear_map_button.clicked.connect(self.clear_map)
+            self.webcam_window = None  # type: WebcamWindow or None
 
-            self.dot_x_offset = 2
-            # self.dot_x_offset = 0
-            self.dot_y_offset = 2
-            # self.dot_y_offset = 0
+            # Scans are fused at the odometry pose into a map that scrolls with the robot, drawn under the scan
+            self.odometry_topic = self.robot.robot_state_monitor.state_watcher.state("odometry")
+            self.occupancy = OccupancyGrid()
+            self.map_pixels = None  # type: np.ndarray or None
+            self.map_image = None  # type: QImage or None
+            self.map_transform = None  # type: QtGui.QTransform or None
 
-            # Create a 2D array to store the point cloud
-            self.dots = []
-            for i in range(16):
-                self.dots.append((320, 240, 0))
-                # self.dot.setFixedSize(5, 5)
-                # dot.setStyleSheet("background-color: transparent; color: green")
-                # dot.move(320 - self.dot_x_offset, 240 - self.dot_y_offset)
-                # self.dots.append(dot)
+            # A red dot in the center until the first scan arrives
+            self.layer = SonarLayer()
+            self.layer.set_scan(np.array([[320, 240]]), np.array([FAR]))
+            self.grid = None  # type: QPixmap or None
+            self.scan = None  # type: SonarScan or None
+            self._processed_sequence = -1  # The sonar message the dots were computed from
+            self._drawn_color = None
+            # Toggle Scan freezes the view, the sonar topics stay subscribed as the speed governor needs the scans
+            self.paused = False
 
             self.toggle_button.clicked.connect(self.toggle)
             self.toggle_button.move(10, 471)
             self.webcam_button.move(120, 471)
+            self.camera_button.move(230, 471)
+            self.clear_map_button.move(340, 471)
 
             # self.window.show()
 
-            # Start the timer
-            self.timer = QtCore.QTimer()
-            self.timer.timeout.connect(self.process_2d_point_cloud)
-            self.timer.start(100)
+            # Checked every 100ms by the shared frame clock, repainted only when there is something new
+            self.refresh = FrameClock.shared().register(self.process_2d_point_cloud, 100, widget=self,
+                                                        name="PointCloud2UI")
         except Exception as e:
             logging.error(f"Error in __init__: {e} {traceback.format_exc()}")
 
     @pyqtSlot()
     def open_webcam(self):
-        """Open an ffplay window"""
+        """Open the robot's MJPEG stream in its own window"""
         try:
-            subprocess.Popen(["ffplay", "-x", "480", "-y", "320", "-f", "mjpeg", f"http://{self.robot.address}:8080",
-                             "-vf", "transpose=2,transpose=2"])
+            if self.webcam_window is not None:
+                self.webcam_window.close()
+            # The camera is mounted upside down
+            self.webcam_window = WebcamWindow(self.robot, url=f"http://{self.robot.address}:8080", rotation=180)
+            self.webcam_window.resize(480, 360)
+            self.webcam_window.show()
         except Exception as e:
             logging.error(f"Error in open_webcam: {e} {traceback.format_exc()}")
 
-    def process_cloud(self, cloud: list):
+    @pyqtSlot()
+    def open_camera_topic(self):
+        """Show /camera/image/compressed, decoded off the GUI thread by the camera ImageTopic"""
         try:
-            # Move each dot to a location on the screen
-            dot_num = 0
-            for point in cloud:
-                # Values are in meters from the center of the robot, so we need to convert them to pixels
-                # Max range is 5 meters, so we need to scale the values to fit on the screen
-                # raw_x = point["y"] - 0.5 if point["y"] > 0 else point["y"] + 0.5
-                raw_y = point["x"] + 0.2 if point["x"] > 0 else point["x"] - 0.2
-                x = (round(-point["y"] * 40) + 320) - self.dot_x_offset
-                y = (round(-raw_y * 40) + 240) - self.dot_y_offset
-
-                # calculate the distance from the center of the robot
-                distance = np.sqrt(point["x"] ** 2 + point["y"] ** 2)
-                if distance > 5:
-                    self.dots[dot_num] = (x, y, 0)
-                    # self.dots[dot_num].setStyleSheet("background-color: transparent; color: red")
-                elif distance < 1:
-                    self.dots[dot_num] = (x, y, 2)
-                    # self.dots[dot_num].setStyleSheet("background-color: transparent; color: darkorange")
-                else:
-                    self.dots[dot_num] = (x, y, 1)
-                    # self.dots[dot_num].setStyleSheet("background-color: transparent; color: green")
-
-                # dot = self.dots[dot_num]
-
-                # Move the dot to the correct location
-                # dot.move(x, y)
-                dot_num += 1
+            if self.webcam_window is not None:
+                self.webcam_window.close()
+            self.webcam_window = WebcamWindow(self.robot, stream=self.robot.get_state("camera"), rotation=180)
+            self.webcam_window.resize(480, 360)
+            self.webcam_window.show()
+        except Exception as e:
+            logging.error(f"Error in open_camera_topic: {e} {traceback.format_exc()}")
 
+    def process_cloud(self, scan: SonarScan, raw: SonarScan = None):
+        """Shows a filtered scan, the raw one (when given) goes into the map which does its own filtering"""
+        try:
+            # Values are in meters from the center of the robot, 40 pixels per meter puts the 5m max range on screen
+            self.scan = scan
+            self.layer.set_scan(self.scan.pixels(scale=40, center=(320, 240)), self.scan.classes)
+            self.update_map(raw if raw is not None else scan)
         except Exception as e:
             logging.error(f"Error in process_cloud: {e} {traceback.format_exc()}")
 
-    def draw_lines(self, qp):
-        """Draw lines inbetween each adjacent point"""
-
-        for dot in self.dots:
-            if dot[2] == 0:
-                qp.setBrush(QtGui.QColor(255, 0, 0))
-            elif dot[2] == 1:
-                qp.setBrush(QtGui.QColor(0, 255, 0))
-            elif dot[2] == 2:
-                qp.setBrush(QtGui.QColor(255, 165, 0))
-            qp.drawEllipse(dot[0], dot[1], 5, 5)
-            # Fill the dot with the correct color
-
-        # last_dot = self.dots[-1]  # Grab the last dot that is not red
-        for dot in self.dots:
-            # if dot.styleSheet() == "background-color: transparent; color: red":
-            #     continue
-            if dot[2] == 0:
-                continue
-            last_dot = dot
+    def update_map(self, scan):
+        """Fuses a scan at the latest pose and rebuilds the map image"""
+        if self.odometry_topic is None:
+            return
+        odometry = self.odometry_topic.value
+        if odometry is None:
+            return
+        pose = pose_from_odometry(odometry)
+        self.occupancy.update(pose, scan.points)
+        self.map_pixels = self.occupancy.to_image(out=self.map_pixels)
+        size = self.occupancy.size
+        # The QImage is a view of map_pixels, which is reused for every scan and kept alive by self
+        self.map_image = QImage(self.map_pixels.data, size, size, size, QImage.Format_Grayscale8)
+        self.map_transform = grid_to_screen(self.occupancy, pose)
 
+    @pyqtSlot()
+    def clear_map(self):
+        self.occupancy.clear()
+        if self.map_pixels is not None:
+            self.map_pixels.fill(0)
+        super().update()
+
+    def line_color(self):
+        """Green while scans arrive, yellow once they are stale, unsubscribed or the view is paused, red before any"""
         if not self.point_cloud_topic.has_data:
-            qp.setPen(QtGui.QPen(QtCore.Qt.red, 1, QtCore.Qt.SolidLine))
-        elif self.point_cloud_topic._last_update < time.time() - 5 or not self.point_cloud_topic._listener.is_subscribed:
-            qp.setPen(QtGui.QPen(QtCore.Qt.darkYellow, 1, QtCore.Qt.SolidLine))
-        else:
-            qp.setPen(QtGui.QPen(QtCore.Qt.green, 1, QtCore.Qt.SolidLine))
-
-        for dot in self.dots:
-            # Draw a line from the last dot to the current dot
-
-            # If the dot is red, don't draw a line
-            # if dot.styleSheet() == "background-color: transparent; color: red":
-            #     continue
-            if dot[2] == 0:
-                continue
-            # elif dot.styleSheet() == "background-color: transparent; color: darkorange"\
-            #         and last_dot.styleSheet() == "background-color: transparent; color: darkorange":
-            #     qp.setPen(QtGui.QPen(QtCore.Qt.darkYellow, 1, QtCore.Qt.SolidLine))
-
-            start_x = last_dot[0] + self.dot_x_offset
-            start_y = last_dot[1] + self.dot_y_offset
-            end_x = dot[0] + self.dot_x_offset
-            end_y = dot[1] + self.dot_y_offset
-            qp.drawLine(start_x, start_y, end_x, end_y)
-            last_dot = dot
-
-        qp.setPen(QtGui.QPen(QtCore.Qt.gray, 1, QtCore.Qt.DashLine))
-        qp.drawLine(320, 0, 320, 480)
-        qp.drawLine(0, 240, 640, 240)
+            return QtCore.Qt.red
+        elif self.paused or self.point_cloud_topic._last_update < time.time() - 5 \
+                or not self.point_cloud_topic._listener.is_subscribed:
+            return QtCore.Qt.darkYellow
+        return QtCore.Qt.green
+
+    def draw_lines(self, qp):
+        """Draw the cached grid, then the scan's dots and the outline inbetween adjacent points"""
+        if self.grid is None or self.grid.size() != self.size():
+            self.grid = draw_grid(self.size())
+        qp.drawPixmap(0, 0, self.grid)
+        if self.map_image is not None:
+            # Added on top of the black background, unknown cells are black so the grid lines still show through
+            qp.save()
+            qp.setTransform(self.map_transform)
+            qp.setCompositionMode(QtGui.QPainter.CompositionMode_Plus)
+            qp.drawImage(0, 0, self.map_image)
+            qp.restore()
+        self.layer.paint(qp, self.line_color())
 
     def toggle(self):
+        """Pauses or resumes the view, only the refresh and drawing stop, the sonar topics keep delivering"""
         try:
-            logging.info("Toggling PointCloud2UI")
-            if self.point_cloud_topic._listener.is_subscribed:
-                self.point_cloud_topic.unsubscribe()
-                self.timer.stop()
-            else:
-                self.point_cloud_topic.resubscribe()
-                self.timer.start()
+            self.paused = not self.paused
+            logging.info(f"Sonar view {'paused' if self.paused else 'resumed'}")
+            # A paused view gets one more pass to repaint in the paused colour, which then stops the refresh
+            self.refresh.active = True
         except Exception as e:
             logging.error(f"Error in toggle: {e} {traceback.format_exc()}")
 
     def process_2d_point_cloud(self):
         """Renders the 2D point cloud from the robot's sonar"""
         try:
-            if self.point_cloud_topic is None or not self.point_cloud_topic.has_data:
+            # Read once, the filter replaces the whole tuple on every scan
+            sequence, scan, raw = self.robot.sonar.latest
+            if self.robot.sonar_source is not None and self.robot.sonar_source is not self.point_cloud_topic:
+                logging.info(f"Sonar view following {self.robot.sonar_source.topic_name}")
+                self.point_cloud_topic = self.robot.sonar_source
+            if self.point_cloud_topic is None or scan is None:
                 return
-            # print(self.point_cloud_topic.value["points"])
-            self.process_cloud(self.point_cloud_topic.value["points"])
+            # Only a new scan, or the line colour changing with the topic's state, needs a repaint
+            color = self.line_color()
+            if self.paused:
+                sequence = self._processed_sequence  # The frozen scan stays on screen
+                self.refresh.active = False
+            if sequence == self._processed_sequence and color == self._drawn_color:
+                return False
+            if sequence != self._processed_sequence:
+                self._processed_sequence = sequence
+                self.process_cloud(scan, raw)
+            self._drawn_color = color
+            return True
         except Exception as e:
             logging.error(f"Error in render_2d_point_cloud: {e} {traceback.format_exc()}")
-        else:
-            super().update()
 
     def paintGL(self) -> None:
         try:
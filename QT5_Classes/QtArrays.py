@@ -0,0 +1,12 @@
+import numpy as np
+from PyQt5.QtGui import QPolygonF
+
+
+def array_to_polygon(points):
+    """(n, 2) array to a QPolygonF, written straight into the polygon's buffer instead of one QPointF per point"""
+    polygon = QPolygonF(len(points))
+    if len(points):
+        buffer = polygon.data()
+        buffer.setsize(len(points) * 2 * np.dtype(np.float64).itemsize)
+        np.frombuffer(buffer, dtype=np.float64).reshape(-1, 2)[:] = points
+    return polygon
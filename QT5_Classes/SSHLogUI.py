@@ -0,0 +1,57 @@
+import traceback
+import logging
+
+import humanize
+from PyQt5.QtGui import QFont, QTextCursor
+from PyQt5.QtWidgets import QWidget, QPlainTextEdit, QVBoxLayout, QLabel
+from QT5_Classes.FrameClock import FrameClock
+
+logging = logging.getLogger(__name__)
+
+
+class SSHLogUI(QWidget):
+    """
+    Separate window showing the output of a remote command (rosserial by default) from the robot's SSH session
+    The text is only replaced when the log buffer has changed since the last refresh
+    """
+
+    def __init__(self, robot, name="rosserial", parent=None):
+        super().__init__(parent)
+        self.robot = robot
+        self.name = name
+        self._version = -1
+
+        self.setWindowTitle(f"{name} log")
+        self.resize(640, 400)
+        self.status_label = QLabel("Not started", self)
+        self.text = QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("Courier", 9))
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.text)
+
+        self.refresh = FrameClock.shared().register(self.update_loop, 500, name="SSHLogUI")
+        self.update_loop()
+
+    def update_loop(self):
+        try:
+            ssh = self.robot.ssh
+            remote = ssh.command(self.name) if ssh is not None else None
+            if remote is None:
+                self.status_label.setText("Not started")
+                return
+            state = "Running" if remote.running else f"Exited ({remote.exit_status})"
+            self.status_label.setText(f"{state}: {remote.command} - showing last "
+                                      f"{humanize.naturalsize(len(remote.log), binary=True)}")
+            if remote.log.version == self._version:
+                return
+            self._version = remote.log.version
+            self.text.setPlainText(remote.log.text())
+            self.text.moveCursor(QTextCursor.End)
+        except Exception as e:
+            logging.error(f"Error updating {self.name} log: {e} {traceback.format_exc()}")
+
+    def closeEvent(self, event) -> None:
+        self.refresh.cancel()
+        super().closeEvent(event)
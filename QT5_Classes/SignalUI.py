@@ -4,11 +4,13 @@ import subprocess
 import time
 import typing
 
-from PyQt5 import QtCore
+from PyQt5.QtGui import QColor, QPalette
 from PyQt5.QtWidgets import QWidget, QGridLayout, QLabel, QVBoxLayout, QSizePolicy
 import psutil
 import humanize
 
+from QT5_Classes.FrameClock import FrameClock
+
 import logging
 
 logging = logging.getLogger(__name__)
@@ -32,10 +34,19 @@ def decode_netsh_output(output):
     return info_dict
 
 
+def text_palette(color):
+    """A palette for labels that only sets the text colour, built once per colour instead of a stylesheet per update"""
+    palette = QPalette()
+    palette.setColor(QPalette.WindowText, QColor(color))
+    return palette
+
+
 class PioneerSignalWidget(QWidget):
 
+    PALETTES = {color: text_palette(color) for color in ("red", "darkorange", "black")}
+
     def __init__(self, robot, parent=None, width=300):
-        """Displays info of the pioneer's connection via the ROS bridge"""
+        """Displays the quality of the link to the pioneer's ROS bridge, measured in-band by the robot's LinkProbe"""
         super().__init__()
         super().setParent(parent)
         super().setFixedSize(width, 200)
@@ -43,98 +54,93 @@ class PioneerSignalWidget(QWidget):
         self.robot = robot
         self.header = QLabel("Pioneer Connection", parent=self)
         self.header.setStyleSheet("color: red; font-size: 17px; font-weight: bold; alignment: center")
-        self.network_name = QLabel(f"Network Name: ", parent=self)
-        self.network_name.setStyleSheet("color: red; font-size: 14px; font-weight: bold; alignment: center")
-        self.signal_strength = QLabel(f"Signal Strength: ", parent=self)
-        self.signal_strength.setStyleSheet("color: red; font-size: 14px; font-weight: bold; alignment: center")
+        self.round_trip = QLabel(f"Round Trip: ", parent=self)
+        self.jitter = QLabel(f"Jitter: ", parent=self)
+        self.loss = QLabel(f"Packet Loss: ", parent=self)
         self.ip_address = QLabel(f"IP Address: ", parent=self)
-        self.ip_address.setStyleSheet("color: red; font-size: 14px; font-weight: bold; alignment: center")
-        self.usage = QLabel(f"Usage: ", parent=self)
-        self.usage.setStyleSheet("color: red; font-size: 14px; font-weight: bold; alignment: center")
         self.current_ros_time = QLabel(f"Time: ", parent=self)
-        self.current_ros_time.setStyleSheet("color: red; font-size: 14px; font-weight: bold; alignment: center")
-
-        self.network_text = "No connection"
-        self.usage_text = "No connection"
+        # The text colour comes from a palette so a status change doesn't make Qt reparse the stylesheet
+        self.color = None
+        for label in self.value_labels():
+            label.setStyleSheet("font-size: 14px; font-weight: bold; alignment: center")
+        self.set_color("red")
+
+        self.round_trip_text = "No connection"
+        self.jitter_text = "No connection"
+        self.loss_text = "No connection"
         self.ip_address_text = "No connection"
-        self.signal_strength_text = "No connection"
         self.time_text = "No connection"
 
         self.header.setFixedSize(width, 20)
-        self.network_name.setFixedSize(width, 20)
-        self.signal_strength.setFixedSize(width, 20)
+        self.round_trip.setFixedSize(width, 20)
+        self.jitter.setFixedSize(width, 20)
+        self.loss.setFixedSize(width, 20)
         self.ip_address.setFixedSize(width, 20)
-        self.usage.setFixedSize(width, 20)
         self.current_ros_time.setFixedSize(width, 20)
 
         # Move all the labels
         self.header.move(0, 0)
-        self.network_name.move(0, 20)
-        self.signal_strength.move(0, 35)
-        self.ip_address.move(0, 50)
-        self.usage.move(0, 65)
+        self.round_trip.move(0, 20)
+        self.jitter.move(0, 35)
+        self.loss.move(0, 50)
+        self.ip_address.move(0, 65)
         self.current_ros_time.move(0, 80)
 
-        # Setup the timer
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(2000)
+        # Refreshed by the shared frame clock
+        self.refresh = FrameClock.shared().register(self.update_info, 2000, name=type(self).__name__)
 
     def update_info(self):
-        """Updates the info of the driver station's connection"""
-        # Get the info from the command line
+        """Updates the info of the pioneer's connection from the link probe statistics"""
         try:
             if self.robot.is_connected:
-                if client := self.robot.robot_state_monitor.state_watcher.state("pioneer_conn"):
-                    info_dict = client.get_info()
-                    self.set_color("black")
-                    self.header.setText("Pioneer Connection: UP")
-                    self.network_text = info_dict["SSID"]
-                    self.signal_strength_text = info_dict["Signal"]
-                    self.ip_address_text = info_dict["IPv4 Address"]
-                    self.usage_text = info_dict["Usage"]
-                    ros_time = datetime.datetime.fromtimestamp(self.robot.client.get_time()['secs'])
-                    self.time_text = ros_time.strftime("%H:%M:%S")
+                stats = self.robot.link_probe.stats()
+                self.ip_address_text = str(self.robot.address)
+                if stats["rtt"] is not None:
+                    self.header.setText("Pioneer Connection: DEGRADED" if self.robot.link_probe.degraded
+                                        else "Pioneer Connection: UP")
+                    self.set_color("darkorange" if self.robot.link_probe.degraded else "black")
+                    self.round_trip_text = f"{stats['rtt']:.1f}ms (max {stats['rtt_max']:.0f}ms)"
+                    self.jitter_text = f"{stats['jitter']:.1f}ms"
+                    self.loss_text = f"{stats['loss']:.0%} of {stats['samples']}"
                 else:
                     self.header.setText("Pioneer Connection: UP")
                     self.set_color("red")
-                    self.network_text = "No topic"
-                    self.signal_strength_text = "No topic"
-                    self.ip_address_text = "No topic"
-                    self.usage_text = "No topic"
-                    self.robot.client.get_time(self.time_callback)
+                    self.round_trip_text = "No probes"
+                    self.jitter_text = "No probes"
+                    self.loss_text = "No probes" if stats["loss"] is None else f"{stats['loss']:.0%}"
+                if self.robot.link_probe.ros_time is not None:
+                    ros_time = datetime.datetime.fromtimestamp(self.robot.link_probe.ros_time)
+                    self.time_text = ros_time.strftime("%H:%M:%S")
             else:
                 self.set_color("red")
                 self.header.setText("Pioneer Connection: DOWN")
-                self.network_text = "No connection"
-                self.signal_strength_text = "No connection"
+                self.round_trip_text = "No connection"
+                self.jitter_text = "No connection"
+                self.loss_text = "No connection"
                 self.ip_address_text = "No connection"
-                self.usage_text = "No connection"
                 self.time_text = "No connection"
         except Exception as e:
             logging.error(f"Error updating pioneer connection info: {e}")
         else:  # Format the each line so it appears like its a table with the names flush left and the values flush right
-            # First get how long the longest name is
-            # Then get the longest value
             longest_value = 21
-            # Then format the text
-            self.network_name.setText(f"<pre>Network Name:    {self.network_text.rjust(longest_value)}</pre>")
-            self.signal_strength.setText(f"<pre>Signal Strength: {self.signal_strength_text.rjust(longest_value)}</pre>")
+            self.round_trip.setText(f"<pre>Round Trip:      {self.round_trip_text.rjust(longest_value)}</pre>")
+            self.jitter.setText(f"<pre>Jitter:          {self.jitter_text.rjust(longest_value)}</pre>")
+            self.loss.setText(f"<pre>Packet Loss:     {self.loss_text.rjust(longest_value)}</pre>")
             self.ip_address.setText(f"<pre>IP Address:      {self.ip_address_text.rjust(longest_value)}</pre>")
-            self.usage.setText(f"<pre>Usage:           {self.usage_text.rjust(longest_value)}</pre>")
             self.current_ros_time.setText(f"<pre>ROS Time:        {self.time_text.rjust(longest_value)}</pre>")
         self.repaint()
 
-    def time_callback(self, value):
-        ros_time = datetime.datetime.fromtimestamp(value['time']['secs'])
-        self.time_text = ros_time.strftime("%H:%M:%S")
+    def value_labels(self):
+        return self.round_trip, self.jitter, self.loss, self.ip_address, self.current_ros_time
 
     def set_color(self, color):
-        """Sets the color of the widget"""
-        self.network_name.setStyleSheet(f"color: {color}; font-size: 14px; font-weight: bold; alignment: center")
-        self.signal_strength.setStyleSheet(f"color: {color}; font-size: 14px; font-weight: bold; alignment: center")
-        self.ip_address.setStyleSheet(f"color: {color}; font-size: 14px; font-weight: bold; alignment: center")
-        self.usage.setStyleSheet(f"color: {color}; font-size: 14px; font-weight: bold; alignment: center")
+        """Sets the color of the widget, does nothing if it already is that color"""
+        if color == self.color:
+            return
+        self.color = color
+        palette = self.PALETTES[color]
+        for label in self.value_labels():
+            label.setPalette(palette)
 
 
 class DriverStationSignalWidget(QWidget):
@@ -184,10 +190,8 @@ class DriverStationSignalWidget(QWidget):
         self._last_bytes_received = 0
         self._last_time = time.time()
 
-        # Start the timer to update the info
-        self.timer = QtCore.QTimer()
-        self.timer.timeout.connect(self.update_info)
-        self.timer.start(2000)
+        # Refreshed by the shared frame clock
+        self.refresh = FrameClock.shared().register(self.update_info, 2000, name=type(self).__name__)
 
     def update_info(self):
         try:
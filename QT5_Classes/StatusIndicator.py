@@ -0,0 +1,74 @@
+import logging
+
+from PyQt5 import QtCore
+from PyQt5.QtGui import QPainter, QColor, QBrush, QPen, QFont
+from PyQt5.QtWidgets import QAbstractButton
+
+logging = logging.getLogger(__name__)
+
+
+class IndicatorStyle:
+    """The pen and brush for one state of an indicator, built once instead of parsed from CSS per update"""
+
+    def __init__(self, text_color, background=None):
+        self.text_color = QColor(text_color)
+        self.pen = QPen(self.text_color)
+        self.brush = QBrush(QColor(background)) if background is not None else None
+
+
+class StatusIndicator(QAbstractButton):
+    """
+    A label or button that shows a state as a colour and a line of text, painted directly
+    styles maps each state to an IndicatorStyle (or to the (text colour, background) arguments for one).
+    set_state() only schedules a repaint when the state or the text actually changed, so it can be called from
+    every refresh without Qt reparsing a stylesheet, re-polishing or relaying out the widget
+    """
+
+    def __init__(self, styles, state=None, text="", font_size=17, bold=True, border=False,
+                 alignment=QtCore.Qt.AlignCenter, parent=None):
+        super().__init__(parent)
+        self.styles = {name: style if isinstance(style, IndicatorStyle) else IndicatorStyle(*style)
+                       for name, style in styles.items()}
+        self.state = state if state is not None else next(iter(self.styles))
+        self.alignment = alignment
+        self.border = QPen(QColor("black"), 1) if border else None
+        font = QFont(self.font())
+        font.setPixelSize(font_size)
+        font.setBold(bold)
+        self.setFont(font)
+        self.setText(text)
+        self.setFocusPolicy(QtCore.Qt.NoFocus)
+        # Paints every pixel itself when it has a background, Qt can skip erasing behind it
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent, self.styles[self.state].brush is not None)
+
+    def set_state(self, state, text=None):
+        """Returns True if the indicator changed and will be repainted"""
+        if state == self.state and (text is None or text == self.text()):
+            return False
+        if state not in self.styles:
+            logging.error(f"Unknown indicator state {state}")
+            return False
+        self.state = state
+        if text is not None:
+            self.setText(text)  # Schedules its own update
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent, self.styles[state].brush is not None)
+        self.update()
+        return True
+
+    def sizeHint(self):
+        return self.fontMetrics().size(0, self.text()) + QtCore.QSize(8, 4)
+
+    def paintEvent(self, event):
+        style = self.styles[self.state]
+        painter = QPainter(self)
+        rect = self.rect()
+        if style.brush is not None:
+            painter.fillRect(rect, style.brush)
+        if self.border is not None:
+            painter.setPen(self.border)
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+        if self.isDown():
+            painter.fillRect(rect, QColor(0, 0, 0, 40))
+        painter.setPen(style.pen if self.isEnabled() else QPen(QColor("grey")))
+        painter.drawText(rect.adjusted(2, 0, -2, 0), int(self.alignment), self.text())
+        painter.end()
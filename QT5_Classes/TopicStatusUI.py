@@ -1,31 +1,136 @@
+import os
 import time
 import traceback
 import logging
 
-from PyQt5.QtCore import QTimer
-from PyQt5.QtWidgets import QWidget, QLabel
+import humanize
+from PyQt5 import QtCore
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtGui import QBrush, QColor, QFont
+from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QTableView, QLineEdit, QHeaderView, QAbstractItemView
+from QT5_Classes.FrameClock import FrameClock
 
 
 logging = logging.getLogger(__name__)
 
+SORT_ROLE = QtCore.Qt.UserRole
 
-def update_label_value(label, topic_name, value, color="black"):
-    max_width = 40
-    remaining_width = max_width - len(topic_name)
-    # If the remaining width is negative, then we need to truncate the topic name to fit
-    if remaining_width < 0:
-        topic_name = topic_name[:remaining_width]
 
-    # When setting the color only the value should be colored, not the topic name
-    label.setText(f"<pre>{topic_name}: <font color={color}>{str(value).rjust(remaining_width)}</font></pre>")
+class TopicTableModel(QAbstractTableModel):
+    """
+    One row per non-hidden SmartTopic with its name, bandwidth and status
+    refresh() works out each row's displayed values and only emits dataChanged for the runs of rows whose values
+    changed, so the view only repaints (and the sort proxy only re-sorts) what moved. Tooltips are built when asked for
+    Topics added to the robot after the model was made are picked up on the next refresh
+    """
+
+    COLUMNS = ("Topic", "B/s", "Status")
+    TOPIC, BANDWIDTH, STATUS = range(3)
+    BRUSHES = {color: QBrush(QColor(color)) for color in ("green", "darkorange", "red", "black")}
+    SEVERITY = {"red": 0, "darkorange": 1, "green": 2}  # Sorting by status puts problems first
+
+    def __init__(self, robot, parent=None):
+        super().__init__(parent)
+        self.robot = robot
+        self.topics = []
+        self.rows = []  # Per topic (bandwidth text, bytes per second, status text, color)
+        self.refresh_time = 0.0  # Seconds the last refresh took
+        self.changed_rows = 0  # Rows the last refresh emitted dataChanged for
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.topics)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        topic = self.topics[index.row()]
+        bandwidth, bytes_per_second, status, color = self.rows[index.row()]
+        column = index.column()
+        if role == QtCore.Qt.DisplayRole:
+            return (topic.topic_name, bandwidth, status)[column]
+        if role == SORT_ROLE:
+            return (topic.topic_name, bytes_per_second, self.SEVERITY.get(color, 3))[column]
+        if role == QtCore.Qt.ForegroundRole and column == self.STATUS:
+            return self.BRUSHES.get(color)
+        if role == QtCore.Qt.TextAlignmentRole and column == self.BANDWIDTH:
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        if role == QtCore.Qt.ToolTipRole:
+            return self.tooltip(topic)
+        return None
 
-    # label.setText(f"<pre>{topic_name}:{str(value).rjust(remaining_width, '*')}</pre>")
-    # label.setText(f"<pre>{topic_name}: {'*' * available_chars}{value}</pre>")
+    @staticmethod
+    def tooltip(topic):
+        stats = topic.stats.snapshot()
+        if not stats["messages"]:
+            return topic.topic_name
+        return (f"{topic.topic_name}\n"
+                f"{stats['bytes_per_second']:.0f} B/s, {stats['messages_per_second']:.1f} msg/s\n"
+                f"decode {stats['decode_us']:.1f}us, update {stats['update_us']:.1f}us per msg\n"
+                f"{humanize.naturalsize(stats['bytes'], binary=True)} in {stats['messages']} msgs")
+
+    @staticmethod
+    def row_values(topic):
+        status, color = topic.get_status()
+        stats = topic.stats.snapshot()
+        bytes_per_second = stats["bytes_per_second"]
+        bandwidth = humanize.naturalsize(bytes_per_second, gnu=True, format="%.1f") + "/s" if stats["messages"] else ""
+        return bandwidth, bytes_per_second, status, color
+
+    def add_new_topics(self):
+        topics = [topic for topic in self.robot.get_smart_topics() if not topic.hidden]
+        known = set(map(id, self.topics))
+        new = [topic for topic in topics if id(topic) not in known]
+        if not new:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.topics), len(self.topics) + len(new) - 1)
+        self.topics.extend(new)
+        self.rows.extend(self.row_values(topic) for topic in new)
+        self.endInsertRows()
+
+    def refresh(self):
+        start = time.perf_counter()
+        self.add_new_topics()
+        changed = {self.BANDWIDTH: [], self.STATUS: []}
+        for row, topic in enumerate(self.topics):
+            values = self.row_values(topic)
+            old = self.rows[row]
+            self.rows[row] = values
+            # Compared as displayed, the raw rate only matters for sorting
+            if values[0] != old[0]:
+                changed[self.BANDWIDTH].append(row)
+            if values[2:] != old[2:]:
+                changed[self.STATUS].append(row)
+        # One dataChanged per run of consecutive rows, per column. The topic column never changes, so while the table
+        # is sorted by name the proxy has nothing to re-sort
+        for column, rows in changed.items():
+            for first, last in self.runs(rows):
+                self.dataChanged.emit(self.index(first, column), self.index(last, column))
+        self.changed_rows = len(set(changed[self.BANDWIDTH]).union(changed[self.STATUS]))
+        self.refresh_time = time.perf_counter() - start
+
+    @staticmethod
+    def runs(rows):
+        """(first, last) of every run of consecutive numbers in the sorted list rows"""
+        first = None
+        for i, row in enumerate(rows):
+            if first is None:
+                first = row
+            if i + 1 == len(rows) or rows[i + 1] != row + 1:
+                yield first, row
+                first = None
 
 
 class TopicUI(QWidget):
     """
-    This widget is how the target IP address is set and the connection is made and displayed
+    Status of every topic, as a sortable table that can be filtered by name
     """
 
     def __init__(self, robot, parent=None):
@@ -35,34 +140,69 @@ class TopicUI(QWidget):
         self.robot = robot
         self.parent = parent
 
-        # Create a topic status label
-        self.topic_status_labels = []
         self.topic_status_header = QLabel("Topic Status", self)
         self.topic_status_header.setStyleSheet("font-weight: bold; font-size: 17px")
         self.topic_status_header.move(0, 0)
-        offset_y = 20
-        for topic in self.robot.get_smart_topics():
-            if topic.hidden:
-                continue
-            label = QLabel(f"<pre>{topic.topic_name}:</pre>", self)
-            label.setStyleSheet("font-weight: bold")
-            label.move(0, offset_y)
-            label.setFixedSize(350, 20)
-            self.topic_status_labels.append((topic, label))
-            offset_y += 15
+        self.export_button = QPushButton("Export", self)
+        self.export_button.setFixedSize(60, 20)
+        self.export_button.move(self.width() - self.export_button.width(), 0)
+        self.export_button.clicked.connect(self.export_report)
+        self.filter_entry = QLineEdit(self)
+        self.filter_entry.setPlaceholderText("Filter")
+        self.filter_entry.setFixedSize(120, 20)
+        self.filter_entry.move(self.export_button.x() - self.filter_entry.width() - 5, 0)
+
+        self.model = TopicTableModel(robot, self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(SORT_ROLE)
+        self.proxy.setFilterKeyColumn(TopicTableModel.TOPIC)
+        self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.filter_entry.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.table = QTableView(self)
+        self.table.setModel(self.proxy)
+        self.table.setFixedSize(self.width(), self.height() - 22)
+        self.table.move(0, 22)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(TopicTableModel.TOPIC, QtCore.Qt.AscendingOrder)
+        self.table.setShowGrid(False)
+        self.table.setWordWrap(False)
+        self.table.setSelectionMode(QAbstractItemView.NoSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.table.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        font = QFont(self.table.font())
+        font.setPixelSize(12)
+        self.table.setFont(font)
+        self.table.setTextElideMode(QtCore.Qt.ElideMiddle)
+        self.table.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        # Fixed row heights and column widths, the view never measures its contents
+        rows = self.table.verticalHeader()
+        rows.hide()
+        rows.setSectionResizeMode(QHeaderView.Fixed)
+        rows.setDefaultSectionSize(self.table.fontMetrics().height() + 1)
+        columns = self.table.horizontalHeader()
+        columns.setSectionResizeMode(QHeaderView.Fixed)
+        columns.setStretchLastSection(True)
+        columns.resizeSection(TopicTableModel.TOPIC, 180)
+        columns.resizeSection(TopicTableModel.BANDWIDTH, 60)
 
         self.update_loop()
-        # Setup the timer to update the labels
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.update_loop)
-        self.update_timer.start(2000)
+        # Refreshed by the shared frame clock
+        self.refresh = FrameClock.shared().register(self.update_loop, 2000, name="TopicUI")
 
     def update_loop(self):
         try:
-            # The topic status's should be on the very right of the text box so we need to figure out how many characters
-            # fit in the box and then subtract that from the total length of the name of the topic
-            for topic, label in self.topic_status_labels:
-                status, color = topic.get_status()
-                update_label_value(label, topic.topic_name, status, color=color)
+            self.model.refresh()
         except Exception as e:
             logging.error(f"Error in topicUI update: {e} {traceback.format_exc()}")
+
+    def export_report(self):
+        """Logs the top topics by bandwidth and saves them as CSV next to the other configs"""
+        try:
+            os.makedirs("configs", exist_ok=True)
+            self.robot.export_topic_report("configs/topic_report.csv")
+            logging.info(f"Topic report saved to configs/topic_report.csv\n{self.robot.topic_report()}")
+        except Exception as e:
+            logging.error(f"Error exporting topic report: {e} {traceback.format_exc()}")
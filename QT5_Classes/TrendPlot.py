@@ -0,0 +1,158 @@
+import time
+import logging
+
+import numpy as np
+from PyQt5 import QtCore
+from PyQt5.QtGui import QPainter, QColor, QPen, QPixmap, QFont
+from PyQt5.QtWidgets import QWidget
+
+from QT5_Classes.FrameClock import FrameClock
+from QT5_Classes.QtArrays import array_to_polygon
+
+logging = logging.getLogger(__name__)
+
+
+class TrendLane:
+    """
+    One horizontal strip of a TrendPlot: traces sharing a y scale
+    traces is a list of (name, SampleHistory, colour), value_range a fixed (low, high) or None to fit the visible data
+    """
+
+    def __init__(self, title, traces, value_range=None, unit=""):
+        self.title = title
+        self.traces = [(name, history, QPen(QColor(color), 1)) for name, history, color in traces]
+        self.value_range = value_range
+        self.unit = unit
+
+
+def envelope_points(mins, maxes, left, top, height, low, high):
+    """
+    Pixel column min/max pairs to polyline runs, each column becomes a vertical stroke from its min to its max and
+    consecutive columns are joined, columns without samples break the line. Returns a list of (n, 2) arrays
+    """
+    scale = height / (high - low) if high > low else 0.0
+    columns = np.flatnonzero(~np.isnan(mins))
+    if not len(columns):
+        return []
+    points = np.empty((len(columns) * 2, 2))
+    points[0::2, 0] = points[1::2, 0] = left + columns + 0.5
+    points[0::2, 1] = top + height - (mins[columns] - low) * scale
+    points[1::2, 1] = top + height - (maxes[columns] - low) * scale
+    np.clip(points[:, 1], top, top + height, out=points[:, 1])
+    breaks = np.flatnonzero(np.diff(columns) > 1) + 1
+    return np.split(points, breaks * 2)
+
+
+class TrendPlot(QWidget):
+    """
+    Scrolling traces of recent values, one lane per TrendLane
+    Each trace is reduced to a min and a max per pixel column by SampleHistory.columns, so drawing costs the same for
+    a minute or hours of samples. The lane backgrounds and titles are drawn once into a pixmap. Clicking the plot
+    cycles through SPANS
+    """
+
+    SPANS = (60, 600, 3600)  # Seconds of history shown
+    MARGIN = 4
+    LABEL_WIDTH = 80  # Right hand strip with the newest value of each trace
+
+    def __init__(self, lanes, span=60, refresh_ms=100, parent=None, width=520, height=155, clock=time.time):
+        super().__init__(parent)
+        self.setFixedSize(width, height)
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        self.lanes = lanes  # type: list[TrendLane]
+        self.span = span
+        self.clock = clock
+        font = QFont(self.font())
+        font.setPixelSize(10)
+        self.setFont(font)
+        self._background = None  # type: QPixmap or None
+        self.paint_time = 0.0  # Seconds the last paint took
+        self.max_paint_time = 0.0
+        self.refresh = FrameClock.shared().register(self.isVisible, refresh_ms, widget=self, name="TrendPlot")
+
+    def set_span(self, span):
+        self.span = span
+        self._background = None
+        self.update()
+
+    def mousePressEvent(self, event):
+        spans = self.SPANS
+        self.set_span(spans[(spans.index(self.span) + 1) % len(spans)] if self.span in spans else spans[0])
+
+    def lane_rects(self):
+        """Plot area of each lane, in widget coordinates"""
+        lane_height = self.height() / len(self.lanes)
+        plot_width = self.width() - self.LABEL_WIDTH - self.MARGIN
+        return [QtCore.QRect(self.MARGIN, int(i * lane_height) + self.MARGIN, plot_width,
+                             int(lane_height) - 2 * self.MARGIN) for i in range(len(self.lanes))]
+
+    def background(self):
+        """Lane frames, titles and the span, redrawn only when the size, span or pixel ratio change"""
+        ratio = self.devicePixelRatioF()
+        if self._background is None or self._background.devicePixelRatioF() != ratio:
+            self._background = QPixmap(self.size() * ratio)
+            self._background.setDevicePixelRatio(ratio)
+            self._background.fill(QColor("black"))
+            painter = QPainter(self._background)
+            painter.setFont(self.font())
+            for lane, rect in zip(self.lanes, self.lane_rects()):
+                painter.setPen(QPen(QColor(60, 60, 60), 1, QtCore.Qt.DashLine))
+                painter.drawLine(rect.left(), rect.center().y(), rect.right(), rect.center().y())
+                painter.setPen(QColor(90, 90, 90))
+                painter.drawRect(rect)
+                painter.setPen(QColor("white"))
+                painter.drawText(rect.adjusted(3, 1, 0, 0), int(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop), lane.title)
+            painter.setPen(QColor("grey"))
+            span = f"{self.span // 60} min" if self.span >= 60 else f"{self.span} s"
+            painter.drawText(self.rect().adjusted(0, 0, -self.MARGIN, -1),
+                             int(QtCore.Qt.AlignRight | QtCore.Qt.AlignBottom), f"last {span}")
+            painter.end()
+        return self._background
+
+    def resizeEvent(self, event):
+        self._background = None
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        try:
+            painter = QPainter(self)
+            painter.drawPixmap(0, 0, self.background())
+            now = self.clock()
+            for lane, rect in zip(self.lanes, self.lane_rects()):
+                self.paint_lane(painter, lane, rect, now)
+            painter.end()
+        except Exception as e:
+            logging.error(f"Error painting trend plot: {e}")
+        self.paint_time = time.perf_counter() - start
+        self.max_paint_time = max(self.max_paint_time, self.paint_time)
+
+    def paint_lane(self, painter, lane, rect, now):
+        columns = [(name, history, pen, *history.columns(now - self.span, now, rect.width()))
+                   for name, history, pen in lane.traces]
+        if lane.value_range is not None:
+            low, high = lane.value_range
+        else:
+            with np.errstate(invalid="ignore"):
+                lows = [np.nanmin(mins) for _, _, _, mins, _ in columns if not np.isnan(mins).all()]
+                highs = [np.nanmax(maxes) for _, _, _, _, maxes in columns if not np.isnan(maxes).all()]
+            if not lows:
+                return
+            low, high = min(lows), max(highs)
+            pad = max((high - low) * 0.1, 0.05)
+            low, high = low - pad, high + pad
+            painter.setPen(QColor("grey"))
+            painter.drawText(rect.adjusted(0, 1, -3, 0), int(QtCore.Qt.AlignRight | QtCore.Qt.AlignTop), f"{high:.2f}")
+            painter.drawText(rect.adjusted(0, 0, -3, -1), int(QtCore.Qt.AlignRight | QtCore.Qt.AlignBottom),
+                             f"{low:.2f}")
+
+        label_y = rect.top()
+        for name, history, pen, mins, maxes in columns:
+            painter.setPen(pen)
+            for run in envelope_points(mins, maxes, rect.left(), rect.top(), rect.height(), low, high):
+                painter.drawPolyline(array_to_polygon(run))
+            last = history.last
+            value = f"{last[1]:.2f}{lane.unit}" if last is not None else "--"
+            painter.drawText(QtCore.QRect(rect.right() + self.MARGIN, label_y, self.LABEL_WIDTH, 12),
+                             int(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter), f"{name} {value}")
+            label_y += 12
@@ -1,64 +1,254 @@
-import datetime
+import collections
+import threading
+import time
+import urllib.request
 import logging
 
-import requests as requests
-from PIL.ImageQt import ImageQt
+import cv2
+import numpy as np
 from PyQt5 import QtGui, QtCore
-from PyQt5.QtCore import QThread, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtMultimediaWidgets import QVideoWidget
-from PyQt5.QtQuick import QQuickItem
-from PyQt5.QtWidgets import QWidget, QLabel, QOpenGLWidget
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QWidget
 
-# from QT5_Classes.WebcamTest import NetworkMJPGImage
+from QT5_Classes.FrameClock import FrameClock
+
+logging = logging.getLogger(__name__)
+
+
+class MJPEGStream:
+    """
+    Reads a multipart MJPEG stream (e.g. mjpg-streamer on the robot) on a background thread
+    The reader only keeps the newest complete JPEG, a second thread decodes it with cv2, so when the GUI or decoder
+    can't keep up the stale frames are skipped instead of building up latency
+    """
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.received = 0
+        self.decoded = 0
+        self.error = None
+
+        self._jpeg = None  # (bytes, receive time) waiting to be decoded
+        self._frame = None  # (BGR ndarray, receive time), newest decoded frame
+        self._frame_id = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._response = None
+        self._decode_times = collections.deque(maxlen=30)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._read_loop, name="mjpeg-reader", daemon=True).start()
+        threading.Thread(target=self._decode_loop, name="mjpeg-decoder", daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._response is not None:
+            self._response.close()
+
+    def latest(self):
+        """Returns (frame id, BGR frame, receive time) of the newest decoded frame"""
+        with self._condition:
+            if self._frame is None:
+                return self._frame_id, None, None
+            return (self._frame_id,) + self._frame
+
+    @property
+    def fps(self):
+        """Decoded frames per second over the last 30 frames"""
+        times = self._decode_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                self._response = urllib.request.urlopen(self.url, timeout=self.timeout)
+                content_type = self._response.headers.get("Content-Type", "")
+                boundary = content_type.split("boundary=")[-1].strip('"') if "boundary=" in content_type else None
+                self.error = None
+                self._read_parts(self._response, boundary)
+            except Exception as e:
+                if self._running:
+                    self.error = str(e)
+                    logging.error(f"MJPEG stream {self.url} failed: {e}")
+                    time.sleep(1)
+
+    def _read_parts(self, response, boundary):
+        """Splits the stream on its part headers, using Content-Length when given and the JPEG EOI marker otherwise"""
+        buffer = bytearray()
+        while self._running:
+            # read1 returns whatever has arrived instead of waiting for a fixed amount
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            while True:
+                header_end = buffer.find(b"\r\n\r\n")
+                if header_end < 0:
+                    break
+                headers = bytes(buffer[:header_end]).lower()
+                start = header_end + 4
+                length = None
+                for line in headers.split(b"\r\n"):
+                    if line.startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                if length is not None:
+                    end = start + length
+                    if len(buffer) < end:
+                        break
+                else:
+                    end = buffer.find(b"\xff\xd9", start)
+                    if end < 0:
+                        break
+                    end += 2
+                self._set_jpeg(bytes(buffer[start:end]))
+                # Drop everything up to the next part's boundary line
+                next_part = buffer.find(f"--{boundary}".encode() if boundary else b"--", end)
+                if next_part < 0:
+                    del buffer[:end]
+                    break
+                del buffer[:next_part]
+        if self._running:
+            raise Exception("Stream ended")
+
+    def _set_jpeg(self, jpeg):
+        with self._condition:
+            self._jpeg = (jpeg, time.time())
+            self.received += 1
+            self._condition.notify_all()
+
+    def _decode_loop(self):
+        while self._running:
+            with self._condition:
+                while self._jpeg is None and self._running:
+                    self._condition.wait(0.5)
+                item, self._jpeg = self._jpeg, None
+            if item is None:
+                continue
+            jpeg, received = item
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            with self._condition:
+                self._frame = (frame, received)
+                self._frame_id += 1
+            self.decoded += 1
+            self._decode_times.append(time.time())
 
 
 class WebcamWindow(QWidget):
 
-    def __init__(self, robot, parent=None):
-        """Is a widget within the main window that displays the webcam image"""
+    def __init__(self, robot, parent=None, url=None, rotation=0, stream=None):
+        """
+        Is a widget that displays the robot's webcam, either inside the main window or on its own
+        The source is the MJPEG stream at url, or stream: anything with start/stop/latest like an ImageTopic
+        """
         try:
             super().__init__()
             super().setParent(parent)
-            super().setFixedSize(640, 480)
+            super().resize(640, 480)
+            self.setWindowTitle("Webcam")
             self.robot = robot
             self.parent = parent
+            self.url = url
+            self.rotation = rotation  # Degrees, applied when painting so the frame itself is never copied
+            self.streamer = None  # type: MJPEGStream or None
+            self.release_stream = None  # Stops this window's use of the streamer, once
 
-            self.image_label = QLabel(self)
-            self.image_label.resize(640, 480)
-            self.image_label.move(0, 0)
-
-            # self.quick_item = QQuickItem()
-            # self.streamer = NetworkMJPGImage()
-
-            self.info_label = QLabel(self)
-            self.info_label.setStyleSheet("QLabel { background-color : black; color : white; }")
-            self.info_label.resize(640, 20)
-            self.info_label.move(0, 460)
+            self._image = None  # type: QImage or None
+            self._frame = None  # Keeps the ndarray backing self._image alive
+            self._frame_id = 0
+            self._received = None
 
-            self.robot.hook_on_ready(self.on_ready)
+            if stream is not None:
+                self.streamer = stream
+                token = stream.start()
+                self.release_stream = lambda: stream.stop(token)
+            elif self.url is not None:
+                self.start_stream(self.url)
+            else:
+                self.robot.hook_on_ready(self.on_ready)
 
-            # Start timer
-            # self.timer = QtCore.QTimer()
-            # self.timer.timeout.connect(self.fetch_image)
-            # self.timer.start(1000)
+            # Checked on every frame clock tick, only repaints when the decoder has produced a new frame and the
+            # overlay is refreshed at least every second
+            self.refresh = FrameClock.shared().register(self.check_frame, 0, widget=self, name="WebcamWindow")
+            self._last_paint = 0
         except Exception as e:
             logging.error(f"Error initializing webcam: {e}")
 
     def on_ready(self):
-        # Set teh video widget address
-        ip = self.robot.address
-        # print(f"{self.video_stream.state()}")
         # The stream is of type mjpeg
-        net_resource = QtCore.QUrl(f"http://{ip}:8080")
-        self.streamer.setSourceURL(net_resource)
+        self.start_stream(f"http://{self.robot.address}:8080")
+
+    def start_stream(self, url):
+        self.stop_stream()
+        self.url = url
+        self.streamer = MJPEGStream(url)
         self.streamer.start()
-        logging.info(f"Webcam stream started")
+        self.release_stream = self.streamer.stop
+        logging.info(f"Webcam stream started from {url}")
+
+    def check_frame(self):
+        if self.streamer is None:
+            return
+        frame_id, frame, received = self.streamer.latest()
+        if frame_id != self._frame_id and frame is not None:
+            self._frame_id = frame_id
+            self._frame = frame
+            self._received = received
+            height, width = frame.shape[:2]
+            # Wraps the decoded buffer directly, no copy or colour conversion
+            self._image = QImage(frame.data, width, height, frame.strides[0], QImage.Format_BGR888)
+            return True
+        return time.time() - self._last_paint > 1
 
     def paintEvent(self, event):
         try:
+            self._last_paint = time.time()
             painter = QtGui.QPainter(self)
-            self.streamer.paint(painter)
+            painter.fillRect(self.rect(), QtCore.Qt.black)
+            if self._image is not None:
+                size = self._image.size().scaled(self.size(), QtCore.Qt.KeepAspectRatio)
+                target = QtCore.QRect(0, 0, size.width(), size.height())
+                target.moveCenter(self.rect().center())
+                if self.rotation:
+                    painter.save()
+                    painter.translate(self.rect().center())
+                    painter.rotate(self.rotation)
+                    painter.translate(-self.rect().center())
+                    painter.drawImage(target, self._image)
+                    painter.restore()
+                else:
+                    painter.drawImage(target, self._image)
+            painter.setPen(QtCore.Qt.white)
+            painter.drawText(5, self.height() - 5, self.info_text())
+            painter.end()
         except Exception as e:
             logging.error(f"Error in paintEvent: {e}")
+
+    def info_text(self):
+        if self.streamer is None:
+            return "No stream"
+        if self.streamer.error is not None and self._image is None:
+            return f"{self.url}: {self.streamer.error}"
+        age = (time.time() - self._received) * 1000 if self._received is not None else 0
+        skipped = self.streamer.received - self.streamer.decoded
+        return f"{self.streamer.fps:.1f} fps  age {age:.0f} ms  skipped {skipped}"
+
+    def stop_stream(self):
+        if self.release_stream is not None:
+            self.release_stream()
+            self.release_stream = None
+
+    def closeEvent(self, event) -> None:
+        # Qt sends a second closeEvent when a window the user already closed is close()d again
+        self.refresh.cancel()
+        self.stop_stream()
+        super().closeEvent(event)
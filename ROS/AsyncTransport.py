@@ -0,0 +1,333 @@
+import asyncio
+import collections
+import concurrent.futures
+import json
+import threading
+import time
+import logging
+
+import roslibpy
+import websockets
+from roslibpy.core import Message, MessageEncoder, ServiceResponse
+
+try:
+    import cbor2  # Optional, lets topics subscribe with compression="cbor"
+except ImportError:
+    cbor2 = None
+
+logging = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1  # Seconds between reconnect attempts, doubles up to RECONNECT_MAX_DELAY
+RECONNECT_MAX_DELAY = 10
+MAX_OUTBOX = 1000  # Messages waiting to be written, past it new publishes are dropped
+
+
+class EventLoopThread:
+    """Runs an asyncio event loop on a single daemon thread, used when there is no Qt loop to drive it"""
+
+    def __init__(self, loop=None, name="asyncio-rosbridge"):
+        self.loop = loop or asyncio.new_event_loop()
+        self.name = name
+        self._thread = None  # type: threading.Thread or None
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.is_running:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    async def _shutdown(self):
+        """Cancel everything still scheduled on the loop and let it unwind before stopping"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+
+class AsyncRos(roslibpy.Ros):
+    """
+    Drop in replacement for roslibpy.Ros that speaks the rosbridge v2 protocol over a single asyncio event loop.
+    roslibpy.Topic, roslibpy.Service and the rosapi helpers (get_topics, get_topic_type, get_time...) all run on
+    top of this class unchanged, only the transport underneath them is replaced.
+    The loop is either driven by the caller (e.g. QtAsyncioPump on the GUI thread) or by an EventLoopThread
+    """
+
+    def __init__(self, host, port=None, is_secure=False, loop=None, loop_thread=None, executor=None):
+        # roslibpy.Ros.__init__ is deliberately not called, it would create a twisted factory
+        self._id_counter = 0
+        self._id_lock = threading.Lock()
+        scheme = "wss" if is_secure else "ws"
+        self.url = host if port is None else f"{scheme}://{host}:{port}"
+        self.loop = loop or asyncio.new_event_loop()  # type: asyncio.AbstractEventLoop
+        # If no one else drives the loop we start our own thread for it on run()
+        self.loop_thread = loop_thread if loop is not None else EventLoopThread(self.loop)
+        self.executor = executor  # Used for blocking callbacks, None means the loop's default executor
+
+        self.is_connecting = False
+        self._terminated = False
+        self._websocket = None
+        self._connected = threading.Event()
+        self._listeners = {}  # Event name -> list of callbacks
+        self._listener_lock = threading.Lock()
+        self._ready_callbacks = []
+        # (op, encoded message) waiting to be written. Protocol ops (advertise, subscribe, services...) are kept
+        # across reconnects, publishes are only ever queued while connected
+        self._outbox = collections.deque()
+        self.dropped_publishes = 0  # Publishes made while disconnected or with the outbox full
+        self._writer = None  # type: asyncio.Task or None
+        self._pending_service_requests = {}
+        self._connection_task = None  # type: asyncio.Task or None
+        self.receive_stats = {}  # topic -> TopicStats, filled in by TopicStats.instrument_client
+        # CBOR messages arrive as binary frames, uint8[] fields (image and point cloud data) stay raw bytes
+        self.supports_cbor = cbor2 is not None
+
+    @property
+    def id_counter(self):
+        with self._id_lock:
+            self._id_counter += 1
+            return self._id_counter
+
+    @property
+    def is_connected(self):
+        return self._connected.is_set()
+
+    def _in_loop_thread(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _call_soon(self, callback, *args):
+        if self._in_loop_thread():
+            self.loop.call_soon(callback, *args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def connect(self):
+        if self.is_connected or self.is_connecting or self._terminated:
+            return
+        self.is_connecting = True
+        self._call_soon(self._start_connection_task)
+
+    def _start_connection_task(self):
+        if self._connection_task is None or self._connection_task.done():
+            self._connection_task = self.loop.create_task(self._maintain_connection())
+
+    async def _maintain_connection(self):
+        delay = RECONNECT_DELAY
+        while not self._terminated:
+            try:
+                async with websockets.connect(self.url, max_size=None, compression=None) as websocket:
+                    delay = RECONNECT_DELAY
+                    await self._on_open(websocket)
+                    async for payload in websocket:
+                        self._on_message(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.debug(f"rosbridge connection to {self.url} failed: {e}")
+            finally:
+                if self._websocket is not None:
+                    self._on_close()
+            if self._terminated:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _on_open(self, websocket):
+        logging.info(f"Connection to ROS ready ({self.url})")
+        self._websocket = websocket
+        self.is_connecting = False
+        self._connected.set()
+        self._start_writer()
+        callbacks, self._ready_callbacks = self._ready_callbacks, []
+        for callback in callbacks:
+            self._run_callback(callback)
+
+    def _on_close(self):
+        logging.info(f"Connection to ROS closed ({self.url})")
+        self._websocket = None
+        self._connected.clear()
+        # Publishes still waiting are stale by the time the connection is back
+        unsent = len(self._outbox)
+        self._outbox = collections.deque(item for item in self._outbox if item[0] != "publish")
+        self.dropped_publishes += unsent - len(self._outbox)
+        for request_id, (_, errback) in list(self._pending_service_requests.items()):
+            if errback:
+                self._run_callback(errback, {"exception": "Connection closed"})
+        self._pending_service_requests.clear()
+        self.emit("close", self)
+
+    def _on_message(self, payload):
+        try:
+            start = time.perf_counter()
+            message = cbor2.loads(payload) if isinstance(payload, bytes) else json.loads(payload)
+            decode = time.perf_counter() - start
+            op = message.get("op")
+            if op == "publish":
+                stats = self.receive_stats.get(message["topic"])
+                if stats is not None:
+                    stats.record_receive(len(payload), decode)
+                self.emit(message["topic"], message["msg"])
+            elif op == "service_response":
+                self._handle_service_response(message)
+            elif op == "call_service":
+                self.emit(message["service"], message)
+            elif op == "status":
+                logging.debug(f"rosbridge status: {message.get('msg')}")
+            else:
+                logging.warning(f"No handler registered for operation {op}")
+        except Exception as e:
+            logging.error(f"Error handling rosbridge message: {e}")
+
+    def _handle_service_response(self, message):
+        handlers = self._pending_service_requests.pop(message.get("id"), None)
+        if handlers is None:
+            logging.warning(f"No handler registered for service response {message.get('id')}")
+            return
+        callback, errback = handlers
+        if message.get("result", True) is False:
+            if errback:
+                self._run_callback(errback, message.get("values"))
+        elif callback:
+            self._run_callback(callback, ServiceResponse(message.get("values")))
+
+    @staticmethod
+    def _run_callback(callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error(f"Error in rosbridge callback {callback}: {e}")
+
+    def _send_payload(self, op, payload):
+        """
+        Must be called on the loop, sends now if connected otherwise queues protocol ops until the connection is
+        ready. A publish while disconnected is dropped, replayed on reconnect it would only be stale (a burst of old
+        drive commands), and so is one that finds MAX_OUTBOX messages already waiting on a slow link
+        """
+        if op == "publish" and (self._websocket is None or len(self._outbox) >= MAX_OUTBOX):
+            self.dropped_publishes += 1
+            return
+        self._outbox.append((op, payload))
+        self._start_writer()
+
+    def _start_writer(self):
+        if self._websocket is not None and (self._writer is None or self._writer.done()):
+            self._writer = self.loop.create_task(self._drain_outbox())
+
+    async def _drain_outbox(self):
+        """Single writer so messages go out in the order they were sent"""
+        while self._outbox and self._websocket is not None:
+            try:
+                await self._websocket.send(self._outbox[0][1])
+            except Exception as e:
+                logging.debug(f"Failed to send rosbridge message, keeping it for the reconnect: {e}")
+                return
+            self._outbox.popleft()
+
+    def close(self):
+        self._terminated = True
+        if self._connection_task is not None:
+            self._call_soon(self._connection_task.cancel)
+
+    def run(self, timeout=roslibpy.ros.CONNECTION_TIMEOUT):
+        if self.loop_thread is not None:
+            self.loop_thread.start()
+        self.connect()
+        if self._in_loop_thread():
+            return  # Cannot block the loop we are waiting on, the connection will complete asynchronously
+        if not self._connected.wait(timeout):
+            raise Exception("Failed to connect to ROS")
+
+    def run_forever(self):
+        self.connect()
+        if self.loop_thread is not None:
+            self.loop.run_forever()
+
+    def call_in_thread(self, callback):
+        self._call_soon(self.loop.run_in_executor, self.executor, callback)
+
+    def call_later(self, delay, callback):
+        self._call_soon(self.loop.call_later, delay, callback)
+
+    def terminate(self):
+        self.close()
+        if self.loop_thread is not None:
+            self.loop_thread.stop()
+
+    def on(self, event_name, callback):
+        with self._listener_lock:
+            self._listeners.setdefault(event_name, []).append(callback)
+
+    def off(self, event_name, callback=None):
+        with self._listener_lock:
+            if callback is None:
+                self._listeners.pop(event_name, None)
+            elif callback in self._listeners.get(event_name, []):
+                self._listeners[event_name].remove(callback)
+
+    def emit(self, event_name, *args):
+        with self._listener_lock:
+            callbacks = list(self._listeners.get(event_name, ()))
+        for callback in callbacks:
+            self._run_callback(callback, *args)
+
+    def on_ready(self, callback, run_in_thread=True):
+        if run_in_thread:
+            self._call_soon(self._add_ready_callback, lambda: self.loop.run_in_executor(self.executor, callback))
+        else:
+            self._call_soon(self._add_ready_callback, callback)
+
+    def _add_ready_callback(self, callback):
+        if self._websocket is not None:
+            self._run_callback(callback)
+        else:
+            self._ready_callbacks.append(callback)
+
+    def send_on_ready(self, message):
+        payload = json.dumps(dict(message), cls=MessageEncoder)
+        self._call_soon(self._send_payload, message.get("op"), payload)
+
+    def blocking_call_from_thread(self, callback, timeout):
+        if self._in_loop_thread():
+            raise RuntimeError("Blocking rosbridge calls cannot be made from the event loop thread, pass a callback")
+        future = concurrent.futures.Future()
+        self._call_soon(callback, future)
+        return future.result(timeout)
+
+    def get_service_request_callback(self, message):
+        def get_call_results(future):
+            self.call_async_service(message,
+                                    lambda result: future.set_result({"result": result}),
+                                    lambda error: future.set_result({"exception": error}))
+        return get_call_results
+
+    def call_sync_service(self, message, timeout):
+        return self.blocking_call_from_thread(self.get_service_request_callback(message), timeout)
+
+    def call_async_service(self, message, callback, errback):
+        payload = json.dumps(dict(message), cls=MessageEncoder)
+
+        def _send_internal():
+            self._pending_service_requests[message["id"]] = (callback, errback)
+            self._send_payload(message["op"], payload)
+
+        self._call_soon(_send_internal)
+
+    def set_status_level(self, level, identifier):
+        self.send_on_ready(Message({"op": "set_level", "level": level, "id": identifier}))
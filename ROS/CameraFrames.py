@@ -0,0 +1,51 @@
+"""
+Camera frames without a camera: a synthetic frame source and the JPEG encoding, shared by the robot's camera pipeline
+(Cam_pipeline.py) and the RobotSimulator
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+class SyntheticFrameSource:
+    """Generates frames with a moving bar and a frame counter at fps, for running the pipeline without a camera"""
+
+    def __init__(self, width=640, height=480, fps=30):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.count = 0
+        self._next = time.perf_counter()
+        # Smooth gradients plus a little sensor noise compress roughly like a real indoor scene
+        y, x = np.mgrid[0:height, 0:width]
+        scene = np.stack([x * 200 // width, y * 200 // height, (x + y) * 100 // (width + height)], axis=2)
+        noise = np.random.default_rng(0).integers(0, 12, (height, width, 3))
+        self._background = (scene + noise).astype(np.uint8)
+
+    def read(self):
+        self._next += 1 / self.fps
+        delay = self._next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self._next = time.perf_counter()
+        return self.frame()
+
+    def frame(self):
+        """The next frame without waiting for its capture time"""
+        frame = self._background.copy()
+        x = (self.count * 8) % self.width
+        frame[:, x:x + 16] = 255
+        cv2.putText(frame, str(self.count), (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        self.count += 1
+        return frame
+
+    def release(self):
+        pass
+
+
+def encode_jpeg(image, quality=80):
+    """Encode an image as a jpeg and return the raw bytes"""
+    _, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return jpeg.tobytes()
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+import roslibpy
+
+logging = logging.getLogger(__name__)
+
+CACHE_DIRECTORY = "configs/discovery"
+
+
+class DiscoveryCache:
+    """
+    Persists what was discovered about a robot (topic types, service types and message schemas) under configs/
+    so a reconnect can subscribe straight away instead of asking rosapi for every topic's type first
+    validate() re-runs discovery in the background with a handful of non-blocking rosapi calls and fixes up any
+    SmartTopic whose type changed since the cache was written
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.topics = {}  # topic -> type
+        self.services = {}  # service -> type ("" until looked up)
+        self.schemas = {}  # message type -> rosapi typedefs
+        self.nodes = []
+        self.updated = None
+        self.warmed = set()  # Names of the topics apply() gave a cached type
+        self._lock = threading.Lock()
+        self._pending = 0  # Outstanding rosapi calls of the current validation
+        self._on_done = None
+
+    @classmethod
+    def for_robot(cls, profile, address, port, directory=CACHE_DIRECTORY):
+        safe_address = re.sub(r"[^A-Za-z0-9_.-]", "_", str(address))
+        cache = cls(os.path.join(directory, f"{profile}-{safe_address}-{port}.json"))
+        cache.load()
+        return cache
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.topics = data.get("topics", {})
+            self.services = data.get("services", {})
+            self.schemas = data.get("schemas", {})
+            self.nodes = data.get("nodes", [])
+            self.updated = data.get("updated")
+            logging.info(f"Loaded discovery cache {self.path} ({len(self.topics)} topics)")
+        except Exception as e:
+            logging.error(f"Ignoring unreadable discovery cache {self.path}: {e}")
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock:
+                self.updated = time.time()
+                data = {"topics": self.topics, "services": self.services, "schemas": self.schemas,
+                        "nodes": self.nodes, "updated": self.updated}
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f, indent=1)
+            os.replace(temp_path, self.path)  # Never leave a half written cache behind
+        except Exception as e:
+            logging.error(f"Failed to save discovery cache {self.path}: {e}")
+
+    def topic_type(self, topic):
+        return self.topics.get(topic)
+
+    def apply(self, smart_topics):
+        """Gives every SmartTopic without a type its cached one, returns how many were warmed up"""
+        warmed = 0
+        for smart_topic in smart_topics:
+            if smart_topic.topic_type is None and self.topics.get(smart_topic.topic_name):
+                smart_topic.set_type(self.topics[smart_topic.topic_name])
+                self.warmed.add(smart_topic.topic_name)
+                warmed += 1
+        return warmed
+
+    def validate(self, client, smart_topics, on_done=None):
+        """Refreshes the cache from live discovery without blocking, correcting SmartTopics with stale types"""
+        self._on_done = on_done
+        with self._lock:
+            self._pending = 3
+        self._call(client, "/rosapi/topics", "rosapi/Topics", {},
+                   lambda result: self._on_topics(client, result, smart_topics))
+        self._call(client, "/rosapi/services", "rosapi/Services", {},
+                   lambda result: self._on_services(client, result))
+        self._call(client, "/rosapi/nodes", "rosapi/Nodes", {}, self._on_nodes)
+
+    def _call(self, client, name, service_type, args, callback):
+        """Calls a rosapi service, the caller must already have counted it in _pending"""
+        def _callback(result):
+            try:
+                callback(result)
+            except Exception as e:
+                logging.error(f"Error handling {name} during discovery: {e}")
+            self._finish()
+
+        def _errback(error):
+            logging.error(f"Discovery call {name} failed: {error}")
+            self._finish()
+
+        roslibpy.Service(client, name, service_type).call(roslibpy.ServiceRequest(args), _callback, _errback)
+
+    def _add_pending(self, count):
+        with self._lock:
+            self._pending += count
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+            done = self._pending == 0
+        if done:
+            self.save()
+            logging.info(f"Discovery validated: {len(self.topics)} topics, {len(self.services)} services, "
+                         f"{len(self.nodes)} nodes")
+            if self._on_done is not None:
+                self._on_done(self)
+
+    def _on_topics(self, client, result, smart_topics):
+        live = dict(zip(result["topics"], result.get("types", [])))
+        if not live and result["topics"]:
+            return  # Old rosapi without types, the SmartTopics resolve their own types
+        with self._lock:
+            self.topics = live
+        for smart_topic in smart_topics:
+            live_type = live.get(smart_topic.topic_name)
+            if smart_topic.topic_name not in live and smart_topic.topic_name in self.warmed:
+                # Warmed up from the cache but gone since, set_type() had it assumed to exist
+                self.warmed.discard(smart_topic.topic_name)
+                smart_topic.mark_missing()
+            elif live_type and smart_topic.topic_type != live_type:
+                logging.warning(f"{smart_topic.topic_name} changed type from {smart_topic.topic_type} to {live_type}")
+                smart_topic.retype(live_type)
+        new_types = {topic_type for topic_type in live.values() if topic_type and topic_type not in self.schemas}
+        self._add_pending(len(new_types))
+        for topic_type in new_types:
+            self._call(client, "/rosapi/message_details", "rosapi/MessageDetails", {"type": topic_type},
+                       lambda details, t=topic_type: self._on_schema(t, details))
+
+    def _on_schema(self, topic_type, details):
+        with self._lock:
+            self.schemas[topic_type] = details.get("typedefs", [])
+
+    def _on_services(self, client, result):
+        live = result["services"]
+        with self._lock:
+            self.services = {service: self.services.get(service, "") for service in live}
+        unknown = [service for service, service_type in self.services.items() if not service_type]
+        self._add_pending(len(unknown))
+        for service in unknown:
+            self._call(client, "/rosapi/service_type", "rosapi/ServiceType", {"service": service},
+                       lambda details, s=service: self._on_service_type(s, details))
+
+    def _on_service_type(self, service, details):
+        with self._lock:
+            self.services[service] = details.get("type", "")
+
+    def _on_nodes(self, result):
+        with self._lock:
+            self.nodes = result["nodes"]
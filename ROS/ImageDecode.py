@@ -0,0 +1,91 @@
+import binascii
+import logging
+
+import cv2
+import numpy as np
+
+logging = logging.getLogger(__name__)
+
+
+class FrameBuffers:
+    """
+    A small ring of preallocated BGR frames that decoded raw images are written into, so steady state decoding of a
+    fixed size stream allocates nothing beyond the base64 decode. A frame handed out stays untouched until count - 1
+    more frames have been decoded, long enough for the GUI to draw it
+    """
+
+    def __init__(self, count=3):
+        self.count = count
+        self._buffers = []
+        self._index = 0
+
+    def next(self, height, width, channels=3):
+        shape = (height, width, channels)
+        if not self._buffers or self._buffers[0].shape != shape:
+            self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(self.count)]
+        self._index = (self._index + 1) % self.count
+        return self._buffers[self._index]
+
+
+def message_encoding(message):
+    """rgb8/bgr8/mono8... for sensor_msgs/Image, jpeg or png for sensor_msgs/CompressedImage"""
+    if "encoding" in message:
+        return message["encoding"]
+    image_format = message.get("format", "").lower()
+    if "png" in image_format:
+        return "png"
+    if "jpeg" in image_format or "jpg" in image_format:
+        return "jpeg"
+    return image_format
+
+
+def _raw_view(message, data, channels):
+    """Views the decoded bytes as an image without copying, honouring the row stride"""
+    height, width = message["height"], message["width"]
+    step = message.get("step") or width * channels
+    rows = np.frombuffer(data, dtype=np.uint8, count=height * step).reshape(height, step)
+    return rows[:, :width * channels].reshape(height, width, channels)
+
+
+def _decode_rgb8(message, data, buffers):
+    image = _raw_view(message, data, 3)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=buffers.next(*image.shape[:2]))
+
+
+def _decode_bgr8(message, data, buffers):
+    image = _raw_view(message, data, 3)
+    frame = buffers.next(*image.shape[:2])
+    np.copyto(frame, image)  # The view is over the read only bytes, the ring buffer keeps it stable for the GUI
+    return frame
+
+
+def _decode_mono8(message, data, buffers):
+    image = _raw_view(message, data, 1)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR, dst=buffers.next(*image.shape[:2]))
+
+
+def _decode_compressed(message, data, buffers):
+    # imdecode can't write into an existing array, the frame it allocates is used as is
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+DECODERS = {
+    "rgb8": _decode_rgb8,
+    "bgr8": _decode_bgr8,
+    "mono8": _decode_mono8,
+    "jpeg": _decode_compressed,
+    "png": _decode_compressed,
+}
+
+
+def decode_image(message, buffers):
+    """Decodes a rosbridge Image or CompressedImage message to a BGR frame, None if it can't be decoded"""
+    encoding = message_encoding(message)
+    decoder = DECODERS.get(encoding)
+    if decoder is None:
+        logging.error(f"Unsupported image encoding: {encoding}")
+        return None
+    data = message["data"]
+    if isinstance(data, str):
+        data = binascii.a2b_base64(data)
+    return decoder(message, data, buffers)
@@ -0,0 +1,185 @@
+import threading
+import time
+import logging
+
+import numpy as np
+
+logging = logging.getLogger(__name__)
+
+# Approximate size of one rosapi/get_time round trip on the wire (request + response JSON plus websocket framing)
+PROBE_BYTES = 260
+
+
+class LinkProbe:
+    """
+    Measures the driver station to rosbridge path by timing a rosapi/get_time call every interval seconds
+    The last history probes are kept in a ring buffer (NaN marks a lost probe) from which the rolling RTT, jitter and
+    loss statistics are computed. At the default 1 Hz the probe costs ~260 B/s, far below 1% of any usable link
+    Listeners are called with the probe after every completed or lost probe
+    """
+
+    def __init__(self, interval=1.0, timeout=2.0, history=60):
+        self.client = None
+        self.interval = interval
+        self.timeout = timeout
+
+        self._rtt = np.full(history, np.nan)  # Seconds, NaN = lost
+        self._index = 0
+        self._count = 0
+        self._pending = {}  # probe id -> send time
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._generation = 0  # Bumped by every stop(), a tick from an earlier start() ends its chain
+        self._listeners = []
+
+        self.ros_time = None  # Last time reported by the robot (secs since epoch)
+        self.clock_offset = None  # Robot clock minus local clock (s), for comparing robot stamps with time.time()
+        self.degraded = False  # Hysteresis state used by the adaptive throttling
+
+    def set_client(self, client):
+        self.stop()
+        self.reset()
+        self.client = client
+        if self.client is not None:
+            self.client.on_ready(self.start, run_in_thread=False)
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def reset(self):
+        with self._lock:
+            self._rtt[:] = np.nan
+            self._index = 0
+            self._count = 0
+            self._pending.clear()
+            self.degraded = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._tick(self._generation)
+
+    def stop(self):
+        self._running = False
+        self._generation += 1
+
+    def _tick(self, generation):
+        if not self._running or generation != self._generation or self.client is None:
+            return
+        try:
+            self._expire_pending()
+            if self.client.is_connected:
+                self._send_probe()
+        except Exception as e:
+            logging.error(f"Link probe failed: {e}")
+        self.client.call_later(self.interval, lambda: self._tick(generation))
+
+    def _send_probe(self):
+        with self._lock:
+            probe_id = self._next_id
+            self._next_id += 1
+            self._pending[probe_id] = (time.perf_counter(), time.time())
+        self.client.get_time(lambda result: self._on_response(probe_id, result),
+                             lambda error: self._on_error(probe_id, error))
+
+    def _on_response(self, probe_id, result):
+        now = time.perf_counter()
+        with self._lock:
+            sent = self._pending.pop(probe_id, None)
+            if sent is None:
+                return  # Already counted as lost
+            rtt = now - sent[0]
+            self._record(rtt)
+        self.ros_time = result["time"]["secs"] + result["time"]["nsecs"] / 1e9
+        # The robot read its clock roughly half way through the round trip
+        offset = self.ros_time - (sent[1] + rtt / 2)
+        self.clock_offset = offset if self.clock_offset is None else self.clock_offset * 0.9 + offset * 0.1
+        self._notify()
+
+    def _on_error(self, probe_id, error):
+        logging.debug(f"Link probe {probe_id} failed: {error}")
+        with self._lock:
+            if self._pending.pop(probe_id, None) is None:
+                return
+            self._record(np.nan)
+        self._notify()
+
+    def _expire_pending(self):
+        now = time.perf_counter()
+        expired = False
+        with self._lock:
+            for probe_id, (sent, _) in list(self._pending.items()):
+                if now - sent > self.timeout:
+                    del self._pending[probe_id]
+                    self._record(np.nan)
+                    expired = True
+        if expired:
+            self._notify()
+
+    def _record(self, rtt):
+        """Must hold the lock"""
+        self._rtt[self._index] = rtt
+        self._index = (self._index + 1) % len(self._rtt)
+        self._count = min(self._count + 1, len(self._rtt))
+
+    def _notify(self):
+        self._update_degraded()
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logging.error(f"Error in link probe listener: {e}")
+
+    def samples(self):
+        """Returns the recorded RTTs in seconds, oldest first"""
+        with self._lock:
+            if self._count < len(self._rtt):
+                return self._rtt[:self._count].copy()
+            return np.roll(self._rtt, -self._index)
+
+    def stats(self):
+        """Returns a dict with rtt (mean), rtt_max, jitter (mean RTT delta) in ms and loss as a fraction"""
+        samples = self.samples()
+        received = samples[~np.isnan(samples)]
+        if len(samples) == 0:
+            return {"rtt": None, "rtt_max": None, "jitter": None, "loss": None, "samples": 0}
+        loss = 1 - len(received) / len(samples)
+        if len(received) == 0:
+            return {"rtt": None, "rtt_max": None, "jitter": None, "loss": loss, "samples": len(samples)}
+        jitter = float(np.mean(np.abs(np.diff(received)))) * 1000 if len(received) > 1 else 0.0
+        return {"rtt": float(np.mean(received)) * 1000, "rtt_max": float(np.max(received)) * 1000,
+                "jitter": jitter, "loss": loss, "samples": len(samples)}
+
+    def queueing_delay(self, window=5):
+        """
+        Seconds the recent probes spent queued behind other traffic: the median of the last window RTTs above the
+        lowest RTT seen. A window with no replies counts as the probe timeout
+        """
+        samples = self.samples()
+        received = samples[~np.isnan(samples)]
+        if len(received) == 0:
+            return self.timeout if len(samples) else 0.0
+        recent = samples[-window:]
+        recent = np.where(np.isnan(recent), self.timeout, recent)
+        return max(float(np.median(recent) - np.min(received)), 0.0)
+
+    @property
+    def bytes_per_second(self):
+        return PROBE_BYTES / self.interval
+
+    def _update_degraded(self, window=10):
+        """Degrade on >=10% loss or >250 ms RTT over the last window probes, recover below 2% and 100 ms"""
+        recent = self.samples()[-window:]
+        if len(recent) < 3:
+            return
+        loss = float(np.mean(np.isnan(recent)))
+        received = recent[~np.isnan(recent)]
+        rtt = float(np.mean(received)) if len(received) else float("inf")
+        if not self.degraded and (loss >= 0.1 or rtt > 0.25):
+            self.degraded = True
+            logging.warning(f"Link degraded: loss {loss:.0%}, rtt {rtt * 1000:.0f}ms")
+        elif self.degraded and loss < 0.02 and rtt < 0.1:
+            self.degraded = False
+            logging.info(f"Link recovered: rtt {rtt * 1000:.0f}ms")
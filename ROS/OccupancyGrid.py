@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+import logging
+
+logging = logging.getLogger(__name__)
+
+
+def pose_from_odometry(message):
+    """(x, y, yaw) of a nav_msgs/Odometry message"""
+    pose = message["pose"]["pose"]
+    q = pose["orientation"]
+    yaw = math.atan2(2 * (q["w"] * q["z"] + q["x"] * q["y"]), 1 - 2 * (q["y"] ** 2 + q["z"] ** 2))
+    return pose["position"]["x"], pose["position"]["y"], yaw
+
+
+class OccupancyGrid:
+    """
+    A fixed size log-odds occupancy grid that scrolls with the robot, cell [row, col] covers the world square
+    ((offset[0] + col) * resolution, (offset[1] + row) * resolution) plus one resolution.
+    update() fuses one scan with array operations over a fixed set of ray samples, and scrolling copies a fixed size
+    array, so the cost of a scan doesn't depend on how long the robot has been driving or how far it went
+    Pure numpy, poses are (x, y, yaw) in the odometry frame and scans are (n, 2) points in the robot frame
+    """
+
+    def __init__(self, size=400, resolution=0.05, max_range=5.0, hit=0.85, miss=-0.4, limit=4.0):
+        self.size = size
+        self.resolution = resolution
+        self.max_range = max_range  # Sonar points at or past this saw nothing, they only clear the cells on the way
+        self.hit = hit
+        self.miss = miss
+        self.limit = limit  # Log-odds are clamped so a cell can change its mind within a few scans
+        self.log_odds = np.zeros((size, size), dtype=np.float32)
+        self._spare = np.zeros_like(self.log_odds)  # Scrolling copies into this and swaps
+        self.offset = np.zeros(2, dtype=np.int64)  # World cell of log_odds[0, 0], (x, y)
+        self.offset[:] = -(size // 2)
+        # Distances along a ray that are sampled for free cells, half a cell apart so no cell is skipped
+        self._steps = np.arange(resolution / 2, max_range, resolution / 2)
+        self.scans = 0
+
+    def clear(self):
+        self.log_odds.fill(0)
+
+    def world_to_cell(self, x, y):
+        """(col, row) arrays of the cells under world points, they may fall outside the grid"""
+        col = np.floor(np.asarray(x) / self.resolution).astype(np.int64) - self.offset[0]
+        row = np.floor(np.asarray(y) / self.resolution).astype(np.int64) - self.offset[1]
+        return col, row
+
+    def recenter(self, x, y):
+        """Scrolls the grid, in whole cells, once the robot is more than a quarter of the grid from its center"""
+        col, row = self.world_to_cell(x, y)
+        shift = np.array([col, row], dtype=np.int64) - self.size // 2
+        if np.all(np.abs(shift) <= self.size // 4):
+            return False
+        self._spare.fill(0)
+        dx, dy = int(shift[0]), int(shift[1])
+        if abs(dx) < self.size and abs(dy) < self.size:
+            source = self.log_odds[max(dy, 0):self.size + min(dy, 0), max(dx, 0):self.size + min(dx, 0)]
+            self._spare[max(-dy, 0):self.size + min(-dy, 0), max(-dx, 0):self.size + min(-dx, 0)] = source
+        self.log_odds, self._spare = self._spare, self.log_odds
+        self.offset += shift
+        return True
+
+    def update(self, pose, points):
+        """Fuses one scan taken at pose, points are (n, 2) in the robot frame (x forward, y left)"""
+        x, y, yaw = pose
+        self.recenter(x, y)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        distance = np.hypot(points[:, 0], points[:, 1])
+        valid = distance > 1e-6
+        points, distance = points[valid], distance[valid]
+        if not len(points):
+            return
+
+        # Ray directions in the world frame
+        cos, sin = math.cos(yaw), math.sin(yaw)
+        direction_x = (cos * points[:, 0] - sin * points[:, 1]) / distance
+        direction_y = (sin * points[:, 0] + cos * points[:, 1]) / distance
+        hit = distance < self.max_range
+        length = np.minimum(distance, self.max_range)
+
+        # Every cell a ray passes through before its end is free, stopping a cell short of an echo
+        free = self._steps[None, :] < (length - np.where(hit, self.resolution, 0))[:, None]
+        free_x = x + direction_x[:, None] * self._steps[None, :]
+        free_y = y + direction_y[:, None] * self._steps[None, :]
+        free_cells = self._flat_cells(free_x[free], free_y[free])
+        hit_cells = self._flat_cells(x + direction_x[hit] * length[hit], y + direction_y[hit] * length[hit])
+        # A cell is updated once per scan however many samples land in it, an echo beats a ray passing by
+        free_cells = np.setdiff1d(free_cells, hit_cells, assume_unique=True)
+
+        cells = self.log_odds.reshape(-1)
+        cells[free_cells] += self.miss
+        cells[hit_cells] += self.hit
+        touched = np.concatenate((free_cells, hit_cells))
+        cells[touched] = np.clip(cells[touched], -self.limit, self.limit)
+        self.scans += 1
+
+    def _flat_cells(self, x, y):
+        col, row = self.world_to_cell(x, y)
+        inside = (col >= 0) & (col < self.size) & (row >= 0) & (row < self.size)
+        return np.unique(row[inside] * self.size + col[inside])
+
+    def probability(self):
+        return 1 / (1 + np.exp(-self.log_odds))
+
+    def to_image(self, out=None):
+        """
+        uint8 brightness per cell for display: unknown cells are black, free cells dim and occupied cells brighter
+        the more certain they are. Rows are world y, so the image still has to be rotated into the robot's frame
+        """
+        if out is None:
+            out = np.empty(self.log_odds.shape, dtype=np.uint8)
+        occupied = np.clip(self.log_odds * (175 / self.limit) + 80, 0, 255)
+        out[:] = np.where(self.log_odds > 0.5, occupied, np.where(self.log_odds < -0.5, 40, 0))
+        return out
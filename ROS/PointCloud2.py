@@ -0,0 +1,89 @@
+import binascii
+import time
+
+import numpy as np
+import logging
+
+logging = logging.getLogger(__name__)
+
+# sensor_msgs/PointField datatypes
+POINT_FIELD_TYPES = {1: "i1", 2: "u1", 3: "i2", 4: "u2", 5: "i4", 6: "u4", 7: "f4", 8: "f8"}
+FLOAT32 = 7
+
+
+def cloud_dtype(fields, point_step, is_bigendian=False):
+    """Structured dtype of one point, fields at their offsets and the padding up to point_step left out"""
+    order = ">" if is_bigendian else "<"
+    names, formats, offsets = [], [], []
+    for field in fields:
+        base = np.dtype(order + POINT_FIELD_TYPES[field["datatype"]])
+        count = field.get("count", 1) or 1
+        names.append(field["name"])
+        formats.append(base if count == 1 else (base, (count,)))
+        offsets.append(field["offset"])
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": point_step})
+
+
+class PointCloud2Decoder:
+    """
+    Turns rosbridge sensor_msgs/PointCloud2 messages into structured numpy arrays viewing the message's data, one
+    field per PointField ("x", "y", "z", "intensity"...). The fields description is only turned into a dtype when it
+    changes, so a steady stream costs one base64 decode (JSON) or nothing at all (CBOR, the data arrives as bytes)
+    """
+
+    def __init__(self):
+        self.dtype = None  # type: np.dtype or None
+        self._layout = None
+
+    def decode(self, message):
+        """
+        Returns the points as a flat structured array, or (height, width) when rows are padded past width points
+        The array is read only and shares memory with the message
+        """
+        layout = (message["fields"], message["point_step"], message.get("is_bigendian", False))
+        if layout != self._layout:
+            self.dtype = cloud_dtype(*layout)
+            self._layout = layout
+        data = message["data"]
+        if isinstance(data, str):
+            data = binascii.a2b_base64(data)
+        height, width = message.get("height", 1) or 1, message["width"]
+        row_step = message.get("row_step") or width * self.dtype.itemsize
+        if row_step == width * self.dtype.itemsize:
+            return np.frombuffer(data, dtype=self.dtype, count=height * width)
+        return np.ndarray((height, width), dtype=self.dtype, buffer=data, strides=(row_step, self.dtype.itemsize))
+
+
+def cloud_xy(cloud):
+    """
+    (n, 2) float64 x/y of a decoded cloud, the copy the array maths downstream works on
+    Non-finite points (a sonar beam without an echo) become NaN rows rather than being dropped, so point i stays beam i
+    """
+    cloud = cloud.reshape(-1)
+    xy = np.empty((len(cloud), 2), dtype=np.float64)
+    xy[:, 0] = cloud["x"]
+    xy[:, 1] = cloud["y"]
+    xy[~np.isfinite(xy).all(axis=1)] = np.nan
+    return xy
+
+
+def pointcloud2_message(points, header=None):
+    """
+    sensor_msgs/PointCloud2 with float32 x, y, z fields for an (n, 3) array, data is left as bytes: rosbridge sends
+    uint8[] as base64 in JSON and as a byte string in CBOR
+    """
+    points = np.ascontiguousarray(points, dtype="<f4").reshape(-1, 3)
+    if header is None:
+        now = time.time()
+        header = {"seq": 0, "stamp": {"secs": int(now), "nsecs": int(now % 1 * 1e9)}, "frame_id": ""}
+    return {
+        "header": header,
+        "height": 1,
+        "width": len(points),
+        "fields": [{"name": name, "offset": 4 * i, "datatype": FLOAT32, "count": 1} for i, name in enumerate("xyz")],
+        "is_bigendian": False,
+        "point_step": 12,
+        "row_step": 12 * len(points),
+        "data": points.tobytes(),
+        "is_dense": True,
+    }
@@ -1,12 +1,21 @@
+import concurrent.futures
 import time
 import traceback
 
-import paramiko
 import roslibpy
 import threading
 import logging
 
-from ROS.RobotState import RobotState, SmartTopic
+from ROS.AsyncTransport import AsyncRos, EventLoopThread
+from ROS.DiscoveryCache import DiscoveryCache, CACHE_DIRECTORY
+from ROS.LinkProbe import LinkProbe
+from ROS.PointCloud2 import cloud_xy
+from ROS.RobotState import RobotState, SmartTopic, ImageTopic, PointCloud2Topic
+from ROS.SampleHistory import SampleHistory
+from ROS.Sonar import SonarFilter, points_to_array
+from ROS.SpeedGovernor import SpeedGovernor
+from ROS.SSHSession import SSHSession, ROSSERIAL_COMMAND
+from ROS.TopicStats import instrument_client, format_top_report, export_top_report
 
 logging = logging.getLogger(__name__)
 
@@ -30,63 +39,60 @@ topic_to_name = {
     "/ext/compressor/voltage": "compressor_voltage",
 }
 
-topic_targets = [
-    SmartTopic("battery_voltage", "/my_p3at/battery_voltage"),
-    SmartTopic("motors_state", "/my_p3at/motors_state", hidden=True),
-    SmartTopic("cmd_vel", "/my_p3at/cmd_vel", allow_update=True),
-    SmartTopic("odometry", "/my_p3at/pose"),
-    SmartTopic("sonar", "/my_p3at/sonar"),
-    # SmartTopic("sonar_pointcloud2", "/my_p3at/sonar_pointcloud2"),
-    # SmartTopic("conn_stats", "/pioneer/conn_stats"),
-    SmartTopic("solenoids", "/pneumatics/solenoids"),
-    SmartTopic("cannon_angle", "/cannon/angle", allow_update=True),
-    # SmartTopic("diagnostics", "/diagnostics"),
-    SmartTopic("cannon_0_target_pressure", "/can0/set_pressure", allow_update=True, hidden=True),
-    SmartTopic("cannon_1_target_pressure", "/can1/set_pressure", allow_update=True, hidden=True),
-    SmartTopic("cannon_0_set_state", "/can0/set_state", allow_update=True, hidden=True),
-    SmartTopic("cannon_1_set_state", "/can1/set_state", allow_update=True, hidden=True),
-    SmartTopic("cannon_0_auto", "/can0/auto", hidden=True),
-    SmartTopic("cannon_1_auto", "/can1/auto", hidden=True),
-    SmartTopic("cannon_0_state", "/can0/state"),
-    SmartTopic("cannon_1_state", "/can1/state"),
-    SmartTopic("cannon_0_pressure", "/can0/pressure"),
-    SmartTopic("cannon_1_pressure", "/can1/pressure"),
-    # SmartTopic("compressor_voltage", "/ext/compressor/voltage"),
-    # ImageHandler("Img", "/usb_cam/image_raw"),
-]
-
-
-def ros_serial(address="localhost", username="ubuntu", password="ubuntu"):
-    logging.info("Connecting over SSH to %s", address)
-    ssh = paramiko.SSHClient()  # type: paramiko.SSHClient
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # Set policy to auto add host key
-    try:
-        ssh.connect(address, port=22, username=username, password=password)  # Connect to server
-    except Exception as e:
-        logging.error(f"SSH connection failed: {e}")
-        return False
-    else:
-        # Execute the ros start.py script
-        print("Starting ROSSERIAL to interface with the arduino")
-        stdin, stdout, stderr = ssh.exec_command("rosrun rosserial_python serial_node.py _port:=/dev/ttyACM0")
-        while not stdout.channel.exit_status_ready():
-            if stdout.channel.recv_ready():
-                print(stdout.channel.recv(1024).decode("utf-8"), end="")
-            if stderr.channel.recv_stderr_ready():
-                print(stderr.channel.recv_stderr(1024).decode("utf-8"), end="")
-
-        if stdout.channel.recv_exit_status() != 0:
-            logging.error("SSH command failed")
-            return False
-
-        ssh.close()
-        return True
+
+def pioneer_base_topics():
+    """Topics published by the Pioneer's own nodes (drive base and sensors)"""
+    return [
+        SmartTopic("battery_voltage", "/my_p3at/battery_voltage"),
+        SmartTopic("motors_state", "/my_p3at/motors_state", hidden=True),
+        SmartTopic("cmd_vel", "/my_p3at/cmd_vel", allow_update=True),
+        SmartTopic("odometry", "/my_p3at/pose", degraded_throttle_rate=250),
+        SmartTopic("sonar", "/my_p3at/sonar", degraded_throttle_rate=250),
+        PointCloud2Topic("sonar_pointcloud2", "/my_p3at/sonar_pointcloud2", degraded_throttle_rate=250),
+        # SmartTopic("conn_stats", "/pioneer/conn_stats"),
+        # SmartTopic("diagnostics", "/diagnostics"),
+        # Only subscribed while a viewer is open
+        ImageTopic("camera", "/camera/image/compressed", topic_type="sensor_msgs/CompressedImage"),
+    ]
+
+
+def cannon_topics():
+    """Topics published by the cannon controller, either through the Pioneer's bridge or its own"""
+    return [
+        SmartTopic("solenoids", "/pneumatics/solenoids"),
+        SmartTopic("cannon_angle", "/cannon/angle", allow_update=True),
+        SmartTopic("cannon_0_target_pressure", "/can0/set_pressure", allow_update=True, hidden=True),
+        SmartTopic("cannon_1_target_pressure", "/can1/set_pressure", allow_update=True, hidden=True),
+        SmartTopic("cannon_0_set_state", "/can0/set_state", allow_update=True, hidden=True),
+        SmartTopic("cannon_1_set_state", "/can1/set_state", allow_update=True, hidden=True),
+        SmartTopic("cannon_0_auto", "/can0/auto", hidden=True),
+        SmartTopic("cannon_1_auto", "/can1/auto", hidden=True),
+        SmartTopic("cannon_0_state", "/can0/state"),
+        SmartTopic("cannon_1_state", "/can1/state"),
+        SmartTopic("cannon_0_pressure", "/can0/pressure"),
+        SmartTopic("cannon_1_pressure", "/can1/pressure"),
+        # SmartTopic("compressor_voltage", "/ext/compressor/voltage"),
+    ]
+
+
+def pioneer_topics():
+    """The Pioneer with the cannon controller on the same bridge"""
+    return pioneer_base_topics() + cannon_topics()
+
+
+# Each ROSInterface builds its own SmartTopics from one of these profiles so several robots can run side by side
+topic_profiles = {
+    "pioneer": pioneer_topics,
+    "pioneer_base": pioneer_base_topics,
+    "cannon": cannon_topics,
+}
 
 
 class RobotStateMonitor:
 
-    def __init__(self, client):
+    def __init__(self, client, smart_topics):
         self.client = client
+        self.smart_topics = smart_topics
         self.state_watcher = RobotState()
 
         self.cached_topics = {}
@@ -106,7 +112,7 @@ class RobotStateMonitor:
 
     def set_client(self, client):
         self.client = client
-        for smart_topic in topic_targets:
+        for smart_topic in self.smart_topics:
             smart_topic.set_client(self.client)
 
     def unsub_all(self):
@@ -115,7 +121,7 @@ class RobotStateMonitor:
             smart_topic.unsub()
 
     def setup_watchers(self):
-        for smart_topic in topic_targets:
+        for smart_topic in self.smart_topics:
             self.state_watcher.add_watcher(smart_topic)
 
     # def setup_listener(self, name, topic):
@@ -136,20 +142,77 @@ class RobotStateMonitor:
 class ROSInterface:
     """
     This class handles the connection to the ROS bridge and all the SmartTopics
+    backend selects the rosbridge transport: "roslibpy" (twisted reactor thread) or "asyncio" (AsyncRos on a single
+    event loop). When using asyncio a loop driven by the caller (e.g. QtAsyncioPump) can be passed in, otherwise the
+    loop gets its own thread
+    Every instance owns its SmartTopics (built from a topic profile), connection and worker threads, so one process
+    can talk to several robots at once. Use the asyncio backend for that, roslibpy shares one twisted reactor thread
+    between all of its clients
     """
 
-    def __init__(self):
+    BACKENDS = ("roslibpy", "asyncio")
+
+    def __init__(self, backend="roslibpy", loop=None, profile="pioneer", name=None,
+                 discovery_directory=CACHE_DIRECTORY):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown ROS backend: {backend}")
+        if profile not in topic_profiles:
+            raise ValueError(f"Unknown topic profile: {profile}")
+        self.backend = backend
+        self.profile = profile
+        self.name = name or profile
+        self.loop = loop
+        self.loop_thread = None  # type: EventLoopThread or None
+        if self.backend == "asyncio" and self.loop is None:
+            self.loop_thread = EventLoopThread(name=f"asyncio-{self.name}")
+            self.loop = self.loop_thread.loop
+        # Blocking work handed off by the transport (on_ready(run_in_thread=True), call_in_thread) stays per robot,
+        # a pool per client as terminate() shuts it down
+        self.executor = None  # type: concurrent.futures.ThreadPoolExecutor or None
+        # Image decoding, handed to the ImageTopics on connect and shut down with the client like the executor
+        self.decode_pool = None  # type: concurrent.futures.ThreadPoolExecutor or None
+
         self.client = None  # type: roslibpy.Ros or None
         self.address = None
         self.port = None
-        self.robot_state_monitor = RobotStateMonitor(self.client)
+        self.smart_topics = topic_profiles[self.profile]()
+        self.discovery = None  # type: DiscoveryCache or None
+        self.discovery_directory = discovery_directory
+        self.robot_state_monitor = RobotStateMonitor(self.client, self.smart_topics)
         self.background_thread = None  # type: threading.Thread or None
 
         self.target_topics = topic_to_name.keys()
-        self.smart_topics = topic_targets
         self.rosserial_thread = None  # type: threading.Thread or None
+        self.ssh = None  # type: SSHSession or None
         self.future_callbacks = []
 
+        self.link_probe = LinkProbe()
+        self.link_probe.add_listener(self._on_link_probe)
+        self._link_degraded = False
+        self.camera_backlog = None  # type: roslibpy.Topic or None
+        self.camera_frame_age = None  # type: roslibpy.Topic or None
+        self.receive_stats = {}  # topic name -> TopicStats the transport records into, shared with the client
+        self.service_listeners = {}  # service name -> callbacks run whenever execute_service calls it
+        self.history = {}  # name -> SampleHistory of a topic's recent values, filled by add_history
+        self._last_frame_age_report = 0
+        # Every sonar scan goes through one filter, the sonar view and anything else needing proximity read it
+        self.sonar = SonarFilter()
+        self.sonar_source = None  # type: SmartTopic or None  # The topic the latest scan came from
+        self._sonar_cloud2 = None  # type: PointCloud2Topic or None
+        self._sonar_json = None  # type: SmartTopic or None  # Only subscribed while the PointCloud2 sonar isn't alive
+        # Drive commands are slowed down near obstacles, the limits are worked out as each filtered scan arrives
+        self.governor = SpeedGovernor()
+        self.sonar.add_listener(self.governor.on_scan)
+        for smart_topic in self.smart_topics:
+            if isinstance(smart_topic, ImageTopic):
+                smart_topic.add_frame_listener(self._on_camera_frame)
+            elif smart_topic.disp_name in ("sonar", "sonar_pointcloud2"):
+                smart_topic.add_listener(lambda value, topic=smart_topic: self._on_sonar(topic, value))
+                if isinstance(smart_topic, PointCloud2Topic):
+                    self._sonar_cloud2 = smart_topic
+                else:
+                    self._sonar_json = smart_topic
+
     @property
     def is_connected(self):
         return self.client.is_connected if self.client is not None else False
@@ -160,18 +223,32 @@ class ROSInterface:
         else:
             self.future_callbacks.append(callback)
 
-    def connect(self, address, port):
+    def connect(self, address, port, rosserial=True):
         try:
-            logging.info("Connecting to ROS bridge")
+            logging.info(f"Connecting {self.name} to ROS bridge at {address}:{port}")
             self.address = address
             self.port = port
-            self.client = roslibpy.Ros(host=self.address, port=self.port)
+            self.client = self._create_client()
+            self._set_decode_pool(concurrent.futures.ThreadPoolExecutor(max_workers=2,
+                                                                        thread_name_prefix=f"{self.name}-decode"))
+            # Topics whose type is cached subscribe as soon as the bridge is ready, without a rosapi round trip
+            self.discovery = DiscoveryCache.for_robot(self.profile, address, port, self.discovery_directory)
+            warmed = self.discovery.apply(self.smart_topics)
+            logging.info(f"{warmed} of {len(self.smart_topics)} topics warmed from the discovery cache")
+            self.receive_stats = {topic.topic_name: topic.stats for topic in self.smart_topics}
+            instrument_client(self.client, self.receive_stats)
             self.robot_state_monitor.set_client(self.client)
-            self.background_thread = threading.Thread(target=self._connect, daemon=True)
+            self.link_probe.set_client(self.client)
+            # Tells the robot's camera publisher how far behind the link is so it can lower its frame rate
+            self.camera_backlog = self._setup_publisher("/camera/backlog", "std_msgs/Float32")
+            self.camera_frame_age = self._setup_publisher("/camera/frame_age", "std_msgs/Float32")
+            self.background_thread = threading.Thread(target=self._connect, name=f"{self.name}-connect", daemon=True)
             self.background_thread.start()
 
-            self.rosserial_thread = threading.Thread(target=ros_serial, daemon=True, args=(address,))
-            self.rosserial_thread.start()
+            if rosserial:
+                self.rosserial_thread = threading.Thread(target=self._start_rosserial, name=f"{self.name}-rosserial",
+                                                         daemon=True)
+                self.rosserial_thread.start()
 
             # for smart_topic in self.smart_topics:
             #     smart_topic.connect()
@@ -179,6 +256,31 @@ class ROSInterface:
         except Exception as e:
             logging.error(f"Error connecting to ROS bridge: {e} {traceback.format_exc()}")
 
+    def _start_rosserial(self):
+        """Opens the shared SSH session and starts rosserial, its output is kept in ssh.log("rosserial")"""
+        try:
+            if self.ssh is None or self.ssh.address != self.address:
+                if self.ssh is not None:
+                    self.ssh.close()
+                self.ssh = SSHSession(self.address)
+            self.ssh.start("rosserial", ROSSERIAL_COMMAND)
+        except Exception as e:
+            logging.error(f"SSH connection failed: {e}")
+
+    def run_remote(self, command, timeout=30):
+        """Runs a command on the robot over the already open SSH session, returns (exit_status, output)"""
+        if self.ssh is None:
+            raise Exception("No SSH session")
+        return self.ssh.run(command, timeout)
+
+    def _create_client(self):
+        if self.backend == "asyncio":
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2,
+                                                                  thread_name_prefix=f"{self.name}-worker")
+            return AsyncRos(host=self.address, port=self.port, loop=self.loop, loop_thread=self.loop_thread,
+                            executor=self.executor)
+        return roslibpy.Ros(host=self.address, port=self.port)
+
     def disconnect(self):
         try:
             self.terminate()
@@ -191,13 +293,30 @@ class ROSInterface:
 
     def terminate(self):
         logging.info("Terminating ROSInterface")
+        self.link_probe.stop()
         self.robot_state_monitor.unsub_all()
+        if self.ssh is not None:
+            self.ssh.close()
+            self.ssh = None
         if self.client is not None:
             self.client.terminate()
             del self.client
         self.client = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self._set_decode_pool(None)
         # self.robot_state_monitor.set_client(self.client)
 
+    def _set_decode_pool(self, pool):
+        """Shuts down the current decode pool and hands pool (or None, no decoding) to the image topics"""
+        if self.decode_pool is not None:
+            self.decode_pool.shutdown(wait=False)
+        self.decode_pool = pool
+        for smart_topic in self.smart_topics:
+            if isinstance(smart_topic, ImageTopic):
+                smart_topic.executor = pool
+
     def _maintain_connection(self):
         # self._connect()
         # while True:
@@ -214,13 +333,68 @@ class ROSInterface:
             logging.error(f"Connection to ROS bridge failed: {e}")
             self.client.close()
         else:
-            self.robot_state_monitor = RobotStateMonitor(self.client)
-            print(f"Topics: {self.get_topics()}")
-            print(f"Services: {self.get_services()}")
-            print(f"Nodes: {self.get_nodes()}")
+            # Refresh the cache in the background instead of blocking on topics/services/nodes
+            self.discovery.validate(self.client, self.smart_topics)
             for callback in self.future_callbacks:
                 self.client.on_ready(callback)
 
+    def _on_link_probe(self, probe):
+        """
+        Runs after every probe: throttles the bulky topics while the link is degraded, restores them once it recovers
+        and checks which sonar topic is needed
+        """
+        if self.camera_backlog is not None and probe.client is self.client and self.is_connected:
+            self.camera_backlog.publish(roslibpy.Message({"data": probe.queueing_delay()}))
+        self._check_sonar_source()
+        if probe.degraded == self._link_degraded:
+            return
+        self._link_degraded = probe.degraded
+        for smart_topic in self.smart_topics:
+            smart_topic.set_link_degraded(probe.degraded)
+
+    def _check_sonar_source(self):
+        """
+        Both sonar topics carry the same scan, the JSON one is unsubscribed while the PointCloud2 one delivers and
+        subscribed again once that goes stale. Nothing changes while the PointCloud2 sonar is unsubscribed
+        """
+        cloud2, json_sonar = self._sonar_cloud2, self._sonar_json
+        if cloud2 is None or json_sonar is None or cloud2._listener is None or json_sonar._listener is None:
+            return
+        if not cloud2._listener.is_subscribed:
+            return
+        alive = cloud2.has_data and not cloud2.is_stale()
+        if alive and json_sonar._listener.is_subscribed:
+            logging.info(f"{cloud2.topic_name} is delivering, unsubscribing {json_sonar.topic_name}")
+            json_sonar.unsubscribe()
+        elif not alive and not json_sonar._listener.is_subscribed:
+            logging.info(f"{cloud2.topic_name} went quiet, resubscribing {json_sonar.topic_name}")
+            json_sonar.resubscribe()
+
+    def _on_sonar(self, smart_topic, value):
+        """Feeds the sonar filter, from the binary PointCloud2 sonar while it's alive and the JSON one otherwise"""
+        preferred = self._sonar_cloud2
+        if smart_topic is not preferred and preferred is not None and preferred.has_data and not preferred.is_stale():
+            return
+        self.sonar_source = smart_topic
+        self.sonar.update(cloud_xy(value) if smart_topic is preferred else points_to_array(value["points"]))
+
+    def _on_camera_frame(self, frame, header):
+        if header is not None:
+            self.report_frame_age(header["stamp"]["secs"] + header["stamp"]["nsecs"] / 1e9)
+
+    def report_frame_age(self, stamp, interval=0.5):
+        """
+        Called with the header stamp of every camera frame received, tells the robot's adaptive encoder how old
+        frames are on arrival (at most every interval seconds). Needs the link probe's clock offset to be known
+        """
+        now = time.time()
+        if self.camera_frame_age is None or self.link_probe.clock_offset is None \
+                or now - self._last_frame_age_report < interval:
+            return
+        self._last_frame_age_report = now
+        age = max(now + self.link_probe.clock_offset - stamp, 0.0)
+        self.camera_frame_age.publish(roslibpy.Message({"data": age}))
+
     def _setup_publisher(self, topic, message_type="std_msgs/String"):
         publisher = roslibpy.Topic(self.client, topic, message_type)
         publisher.advertise()
@@ -233,7 +407,40 @@ class ROSInterface:
     def get_smart_topics(self):
         return self.robot_state_monitor.get_states()
 
+    def add_smart_topic(self, smart_topic):
+        """Adds a topic on top of the profile's, it subscribes straight away if the bridge is already set up"""
+        self.smart_topics.append(smart_topic)
+        self.robot_state_monitor.state_watcher.add_watcher(smart_topic)
+        if self.client is not None:
+            self.receive_stats[smart_topic.topic_name] = smart_topic.stats
+            smart_topic.set_client(self.client)
+
+    def add_history(self, name, state_name, extract=float, seconds=4 * 3600, rate=50):
+        """
+        Keeps the last seconds of extract(value) of a topic in self.history[name], recorded on the receive thread as
+        each message arrives. extract picks a number out of message types that are not a single value
+        """
+        if name in self.history:
+            return self.history[name]
+        history = SampleHistory(seconds, rate)
+        self.history[name] = history
+
+        def record(value):
+            if value is not None:
+                history.append(extract(value))
+
+        self.get_state(state_name).add_listener(record)
+        return history
+
+    def topic_report(self, n=10, key="bytes_per_second"):
+        """Returns a text table of the n topics costing the most, by bytes_per_second, messages_per_second..."""
+        return format_top_report(self.smart_topics, n, key)
+
+    def export_topic_report(self, path, n=10, key="bytes_per_second"):
+        export_top_report(self.smart_topics, path, n, key)
+
     def drive(self, forward=0.0, turn=0.0):
+        forward = self.governor.limit(forward)
         state = self.get_state("cmd_vel")
         state.value = {"linear": {"x": forward, "y": 0, "z": 0},
                        "angular": {"x": 0, "y": 0, "z": turn}}
@@ -248,6 +455,10 @@ class ROSInterface:
     def get_nodes(self):
         return self.client.get_nodes()
 
+    def add_service_listener(self, name, callback):
+        """callback(name) runs (before the call goes out) every time execute_service calls the service"""
+        self.service_listeners.setdefault(name.lstrip("/"), []).append(callback)
+
     def execute_service(self, name, callback=None, errback=None, timeout=5):
         if self.client is None:
             raise Exception("No ROS client")
@@ -255,6 +466,11 @@ class ROSInterface:
             raise Exception("Not connected to ROS bridge")
         # if name not in self.client.get_services():
         #     raise Exception(f"Service {name} not available")
+        for listener in self.service_listeners.get(name.lstrip("/"), []):
+            try:
+                listener(name)
+            except Exception as e:
+                logging.error(f"Error in {name} service listener: {e}")
         service = roslibpy.Service(self.client, name, 'std_srvs/Empty')
         request = roslibpy.ServiceRequest()
         service.call(request, callback=callback, errback=errback, timeout=timeout)
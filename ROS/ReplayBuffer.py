@@ -0,0 +1,124 @@
+import binascii
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import logging
+
+logging = logging.getLogger(__name__)
+
+REPLAY_DIRECTORY = "configs/replays"
+
+
+class ReplayBuffer:
+    """
+    Keeps the last seconds of compressed camera frames exactly as rosbridge delivered them (base64 JPEG), bounded by
+    both age and max_bytes so memory stays fixed however long the session runs
+    trigger() saves a clip of before seconds leading up to the event and after seconds following it. The clip is
+    written by a background thread once the after window has passed, as the concatenated JPEGs (.mjpeg, playable
+    with ffplay -f mjpeg) next to a .json index of frame times, nothing is re-encoded
+    """
+
+    def __init__(self, before=8.0, after=2.0, max_bytes=64 * 1024 * 1024, directory=REPLAY_DIRECTORY):
+        self.before = before
+        self.after = after
+        self.seconds = before + after + 1  # Frames must survive until the clip after them is written
+        self.max_bytes = max_bytes
+        self.directory = directory
+
+        self._frames = collections.deque()  # (receive time, stamp, base64 data)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._writer = None  # type: threading.Thread or None
+        self._writer_lock = threading.Lock()  # The writer only exits and is only started while holding this
+        self.dropped = 0  # Frames evicted early because of max_bytes
+        self.clips = []  # Paths of the clips written so far
+        self._last_trigger = None  # A held fire button re-triggers, those land in the clip already being recorded
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def size(self):
+        return self._size
+
+    def on_message(self, message, received):
+        """ImageTopic message listener, runs on the receive thread so it only appends and evicts"""
+        if "format" not in message:
+            return  # Raw images would have to be encoded, only compressed frames are kept
+        header = message.get("header") or {}
+        stamp = header.get("stamp")
+        stamp = stamp["secs"] + stamp["nsecs"] / 1e9 if stamp else received
+        self.add(message["data"], received, stamp)
+
+    def add(self, data, received, stamp=None):
+        with self._lock:
+            self._frames.append((received, stamp if stamp is not None else received, data))
+            self._size += len(data)
+            while self._frames and (self._size > self.max_bytes or received - self._frames[0][0] > self.seconds):
+                old = self._frames.popleft()
+                self._size -= len(old[2])
+                if received - old[0] <= self.seconds:
+                    self.dropped += 1
+
+    def frames_between(self, start, end):
+        with self._lock:
+            return [frame for frame in self._frames if start <= frame[0] <= end]
+
+    def trigger(self, label="event"):
+        """Queues a clip around now and returns immediately, False if a clip already covers this moment"""
+        now = time.time()
+        if self._last_trigger is not None and now - self._last_trigger < self.after:
+            return False
+        self._last_trigger = now
+        with self._writer_lock:
+            self._jobs.put((now, label))
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="replay-writer", daemon=True)
+                self._writer.start()
+        logging.info(f"Replay clip of {label} queued")
+        return True
+
+    def _write_loop(self):
+        while True:
+            try:
+                trigger_time, label = self._jobs.get(timeout=5)
+            except queue.Empty:
+                # A trigger() between the timeout and here queued a job expecting this thread to write it
+                with self._writer_lock:
+                    if self._jobs.empty():
+                        self._writer = None
+                        return
+                continue
+            delay = trigger_time + self.after - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self._write_clip(trigger_time, label)
+            except Exception as e:
+                logging.error(f"Failed to write replay clip of {label}: {e}")
+
+    def _write_clip(self, trigger_time, label):
+        frames = self.frames_between(trigger_time - self.before, trigger_time + self.after)
+        if not frames:
+            logging.warning(f"No camera frames buffered for the {label} replay")
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{label}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(trigger_time))}"
+        path = os.path.join(self.directory, name)
+        index = {"label": label, "trigger": trigger_time, "frames": []}
+        offset = 0
+        with open(path + ".mjpeg", "wb") as f:
+            for received, stamp, data in frames:
+                jpeg = binascii.a2b_base64(data)
+                f.write(jpeg)
+                index["frames"].append({"received": received, "stamp": stamp, "offset": offset, "size": len(jpeg)})
+                offset += len(jpeg)
+        with open(path + ".json", "w") as f:
+            json.dump(index, f, indent=1)
+        self.clips.append(path + ".mjpeg")
+        logging.info(f"Saved {len(frames)} frame replay of {label} to {path}.mjpeg")
+        return path + ".mjpeg"
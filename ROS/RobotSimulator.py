@@ -0,0 +1,477 @@
+"""
+Local stand-in for the Pioneer that speaks the rosbridge v2 protocol
+
+    python -m ROS.RobotSimulator --port 9090 --rate-scale 10 [--mjpeg-port 8080]
+
+Publishes every topic the driver station watches at configurable rates and payload sizes, forwards client publishes
+to subscribers like rosbridge does, answers the rosapi services and the std_srvs/Empty services the UI calls
+With --mjpeg-port a synthetic camera is also served as a multipart MJPEG stream like the robot's mjpg-streamer
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import random
+import threading
+import time
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import websockets
+
+from ROS.CameraFrames import SyntheticFrameSource, encode_jpeg
+from ROS.PointCloud2 import pointcloud2_message
+from ROS.RobotState import CannonCombinedTopic
+
+try:
+    import cbor2  # Optional, subscribers asking for compression="cbor" get JSON without it
+except ImportError:
+    cbor2 = None
+
+logging = logging.getLogger(__name__)
+
+# topic: (type, base publish rate in Hz at rate_scale 1, 0 means the topic is only published by clients)
+SIMULATED_TOPICS = {
+    "/my_p3at/battery_voltage": ("std_msgs/Float64", 1),
+    "/my_p3at/motors_state": ("std_msgs/Bool", 1),
+    "/my_p3at/cmd_vel": ("geometry_msgs/Twist", 0),
+    "/my_p3at/pose": ("nav_msgs/Odometry", 10),
+    "/my_p3at/sonar": ("sensor_msgs/PointCloud", 10),
+    "/my_p3at/sonar_pointcloud2": ("sensor_msgs/PointCloud2", 10),
+    "/pneumatics/solenoids": ("std_msgs/UInt8", 5),
+    "/cannon/angle": ("std_msgs/Float32", 5),
+    "/can0/set_pressure": ("std_msgs/Float32", 0),
+    "/can1/set_pressure": ("std_msgs/Float32", 0),
+    "/can0/set_state": ("std_msgs/UInt8", 0),
+    "/can1/set_state": ("std_msgs/UInt8", 0),
+    "/can0/auto": ("std_msgs/Bool", 5),
+    "/can1/auto": ("std_msgs/Bool", 5),
+    "/can0/state": ("std_msgs/UInt8", 5),
+    "/can1/state": ("std_msgs/UInt8", 5),
+    "/can0/pressure": ("std_msgs/Float32", 5),
+    "/can1/pressure": ("std_msgs/Float32", 5),
+}
+
+# Extra telemetry topics (extra_topics=N), only there to load test things that scale with the number of topics
+EXTRA_PREFIX = "/sim/telemetry_"
+EXTRA_TOPIC = EXTRA_PREFIX + "{}"
+
+SIMULATED_SERVICES = {
+    "/my_p3at/enable_motors": "std_srvs/Empty",
+    "/my_p3at/disable_motors": "std_srvs/Empty",
+    "/can/fire": "std_srvs/Empty",
+    "/can/estop/clear": "std_srvs/Empty",
+}
+
+SONAR_ANGLES = [90, 50, 30, 10, -10, -30, -50, -90, -90, -130, -150, -170, 170, 150, 130, 90]  # P3-AT ring, degrees
+
+
+def ros_time(now=None):
+    now = time.time() if now is None else now
+    return {"secs": int(now), "nsecs": int((now % 1) * 1e9)}
+
+
+class SimulatedCannon:
+    """Very small model of one cannon's state machine driven by the set_state action enums"""
+
+    def __init__(self):
+        self.state = CannonCombinedTopic.state_enums["Idle"]
+        self.pressure = 0.0
+        self.target_pressure = 60.0
+        self.auto = False
+
+    def command(self, action):
+        states = CannonCombinedTopic.state_enums
+        actions = CannonCombinedTopic.action_enums
+        if action == actions["fill"]:
+            self.state = states["Pressurizing"]
+        elif action == actions["vent"]:
+            self.state = states["Venting"]
+        elif action == actions["arm"] and self.state == states["Ready"]:
+            self.state = states["Armed"]
+        elif action == actions["disarm"] and self.state == states["Armed"]:
+            self.state = states["Ready"]
+        elif action == actions["idle"]:
+            self.state = states["Idle"]
+        elif action == actions["set_auto"]:
+            self.auto = True
+        elif action == actions["disable_auto"]:
+            self.auto = False
+
+    def fire(self):
+        if self.state == CannonCombinedTopic.state_enums["Armed"]:
+            self.pressure = 0.0
+            self.state = CannonCombinedTopic.state_enums["Idle"]
+
+    def step(self, dt):
+        states = CannonCombinedTopic.state_enums
+        if self.state == states["Pressurizing"]:
+            self.pressure = min(self.target_pressure, self.pressure + 10 * dt)
+            if self.pressure >= self.target_pressure:
+                self.state = states["Ready"]
+        elif self.state == states["Venting"]:
+            self.pressure = max(0.0, self.pressure - 20 * dt)
+            if self.pressure <= 0:
+                self.state = states["Idle"]
+        elif self.auto and self.state == states["Idle"]:
+            self.state = states["Pressurizing"]
+
+
+def _encode_bytes(value):
+    """rosbridge sends uint8[] fields as base64 in JSON"""
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class RobotSimulator:
+    """
+    rosbridge v2 websocket server that stands in for the Pioneer
+    rate_scale multiplies every topic's base rate, rates overrides the rate of individual topics (Hz),
+    sonar_points sets the size of both sonar clouds and padding adds that many bytes to every published message
+    extra_topics adds that many std_msgs/Float64 telemetry topics (EXTRA_TOPIC) at 1Hz, to load test topic lists
+    """
+
+    def __init__(self, host="127.0.0.1", port=9090, rate_scale=1.0, rates=None, sonar_points=16, padding=0,
+                 extra_topics=0):
+        self.host = host
+        self.port = port
+        self.rate_scale = rate_scale
+        self.rates = rates or {}
+        self.sonar_points = sonar_points
+        self.padding = "x" * padding if padding else None
+
+        self.loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = None  # type: threading.Thread or None
+        self._server = None
+        self._tasks = []
+        self._subscribers = {}  # topic -> {websocket: [throttle_rate in ms, last send time, compression]}
+        self._params = {}
+        self.topics = dict(SIMULATED_TOPICS)
+        self.topics.update({EXTRA_TOPIC.format(i): ("std_msgs/Float64", 1) for i in range(extra_topics)})
+        self.sent = {topic: 0 for topic in self.topics}  # Messages sent per topic, summed over subscribers
+        self.start_time = time.time()
+
+        # Simulated robot state
+        self.battery_voltage = 12.9
+        self.motors_enabled = False
+        self.cmd_vel = {"linear": {"x": 0.0, "y": 0.0, "z": 0.0}, "angular": {"x": 0.0, "y": 0.0, "z": 0.0}}
+        self.x, self.y, self.yaw = 0.0, 0.0, 0.0
+        self.cannon_angle = 0.0
+        self.cannons = [SimulatedCannon(), SimulatedCannon()]
+        self.solenoids = 0
+        self.seq = 0
+
+    def topic_rate(self, topic):
+        if topic in self.rates:
+            return self.rates[topic]
+        return self.topics[topic][1] * self.rate_scale
+
+    def start(self):
+        """Run the simulator on a background thread, returns once the server is listening"""
+        self._thread = threading.Thread(target=self.run_forever, daemon=True)
+        self._thread.start()
+        if not self._started.wait(5):
+            raise Exception(f"Robot simulator failed to start on {self.host}:{self.port}")
+
+    def run_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._serve())
+        self._started.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    async def _shutdown(self):
+        """Close the server and its connections, then let every task unwind before stopping the loop"""
+        self._server.close()
+        await self._server.wait_closed()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    async def _serve(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port, max_size=None, compression=None)
+        self._tasks.append(self.loop.create_task(self._physics_loop()))
+        for topic in self.topics:
+            if self.topic_rate(topic) > 0:
+                self._tasks.append(self.loop.create_task(self._publish_loop(topic)))
+        logging.info(f"Robot simulator listening on ws://{self.host}:{self.port}")
+
+    async def _handler(self, websocket, *_):
+        try:
+            async for payload in websocket:
+                try:
+                    await self._handle_message(websocket, json.loads(payload))
+                except Exception as e:
+                    logging.error(f"Simulator failed to handle message: {e}")
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for subscribers in self._subscribers.values():
+                subscribers.pop(websocket, None)
+
+    async def _handle_message(self, websocket, message):
+        op = message["op"]
+        if op == "subscribe":
+            subscribers = self._subscribers.setdefault(message["topic"], {})
+            compression = message.get("compression") if cbor2 is not None else None
+            subscribers[websocket] = [message.get("throttle_rate", 0) or 0, 0, compression]
+        elif op == "unsubscribe":
+            self._subscribers.get(message["topic"], {}).pop(websocket, None)
+        elif op == "publish":
+            self._on_client_publish(message["topic"], message["msg"])
+            await self._send_to_subscribers(message["topic"], message["msg"])
+        elif op == "call_service":
+            await websocket.send(json.dumps(self._call_service(message)))
+
+    def _on_client_publish(self, topic, msg):
+        if topic == "/my_p3at/cmd_vel":
+            self.cmd_vel = msg
+        elif topic == "/cannon/angle":
+            self.cannon_angle = msg.get("data", self.cannon_angle)
+        elif topic in ("/can0/set_pressure", "/can1/set_pressure"):
+            self.cannons[int(topic[4])].target_pressure = msg.get("data", 0)
+        elif topic in ("/can0/set_state", "/can1/set_state"):
+            self.cannons[int(topic[4])].command(msg.get("data", 0))
+
+    def _call_service(self, message):
+        service = message["service"]
+        if not service.startswith("/"):
+            service = "/" + service
+        args = message.get("args") or {}
+        result = True
+        values = {}
+        if service == "/rosapi/topics":
+            values = {"topics": list(self.topics), "types": [t for t, _ in self.topics.values()]}
+        elif service == "/rosapi/topic_type":
+            values = {"type": self.topics.get(args.get("topic"), ("", 0))[0]}
+        elif service == "/rosapi/services":
+            values = {"services": list(SIMULATED_SERVICES)}
+        elif service == "/rosapi/service_type":
+            values = {"type": SIMULATED_SERVICES.get(args.get("service"), "")}
+        elif service == "/rosapi/message_details":
+            # Only the top level type is described, enough for clients that cache schemas
+            values = {"typedefs": [{"type": args.get("type", ""), "fieldnames": [], "fieldtypes": [],
+                                    "fieldarraylen": [], "examples": [], "constnames": [], "constvalues": []}]}
+        elif service == "/rosapi/nodes":
+            values = {"nodes": ["/rosbridge_websocket", "/rosapi", "/my_p3at", "/robot_simulator"]}
+        elif service == "/rosapi/get_time":
+            values = {"time": ros_time()}
+        elif service == "/rosapi/subscribers":
+            values = {"subscribers": [f"/client_{id(ws)}" for ws in self._subscribers.get(args.get("topic"), {})]}
+        elif service == "/rosapi/get_param":
+            values = {"value": self._params.get(args.get("name"), args.get("default", ""))}
+        elif service == "/rosapi/set_param":
+            self._params[args.get("name")] = args.get("value")
+        elif service == "/my_p3at/enable_motors":
+            self.motors_enabled = True
+        elif service == "/my_p3at/disable_motors":
+            self.motors_enabled = False
+        elif service == "/can/fire":
+            for cannon in self.cannons:
+                cannon.fire()
+        elif service == "/can/estop/clear":
+            pass
+        else:
+            result = False
+            values = f"Service {service} does not exist"
+        return {"op": "service_response", "id": message.get("id"), "service": message["service"],
+                "values": values, "result": result}
+
+    async def _physics_loop(self):
+        last = time.time()
+        while True:
+            await asyncio.sleep(0.02)
+            now = time.time()
+            dt, last = now - last, now
+            if self.motors_enabled:
+                forward = self.cmd_vel["linear"]["x"]
+                turn = self.cmd_vel["angular"]["z"]
+                self.yaw += turn * dt
+                self.x += forward * math.cos(self.yaw) * dt
+                self.y += forward * math.sin(self.yaw) * dt
+            self.battery_voltage = max(11.5, self.battery_voltage - 0.00002 * dt)
+            solenoids = 0
+            for i, cannon in enumerate(self.cannons):
+                cannon.step(dt)
+                if cannon.state == CannonCombinedTopic.state_enums["Pressurizing"]:
+                    solenoids |= 0b1 | (0b100 << i)
+                elif cannon.state == CannonCombinedTopic.state_enums["Venting"]:
+                    solenoids |= 0b10
+            self.solenoids = solenoids
+
+    def _message(self, topic):
+        now = time.time()
+        if topic == "/my_p3at/battery_voltage":
+            msg = {"data": self.battery_voltage + random.uniform(-0.02, 0.02)}
+        elif topic == "/my_p3at/motors_state":
+            msg = {"data": self.motors_enabled}
+        elif topic == "/my_p3at/pose":
+            msg = self._odometry(now)
+        elif topic == "/my_p3at/sonar":
+            msg = self._sonar(now)
+        elif topic == "/my_p3at/sonar_pointcloud2":
+            msg = self._sonar_pointcloud2(now)
+        elif topic == "/pneumatics/solenoids":
+            msg = {"data": self.solenoids}
+        elif topic == "/cannon/angle":
+            msg = {"data": self.cannon_angle}
+        elif topic.startswith(EXTRA_PREFIX):
+            msg = {"data": random.uniform(0, 100)}
+        else:
+            cannon = self.cannons[int(topic[4])]
+            field = topic.split("/")[-1]
+            msg = {"data": {"auto": cannon.auto, "state": cannon.state, "pressure": cannon.pressure}[field]}
+        if self.padding:
+            msg["padding"] = self.padding
+        return msg
+
+    def _header(self, now, frame_id):
+        self.seq += 1
+        return {"seq": self.seq, "stamp": ros_time(now), "frame_id": frame_id}
+
+    def _odometry(self, now):
+        return {
+            "header": self._header(now, "odom"),
+            "child_frame_id": "base_link",
+            "pose": {"pose": {"position": {"x": self.x, "y": self.y, "z": 0.0},
+                              "orientation": {"x": 0.0, "y": 0.0, "z": math.sin(self.yaw / 2),
+                                              "w": math.cos(self.yaw / 2)}},
+                     "covariance": [0.0] * 36},
+            "twist": {"twist": self.cmd_vel if self.motors_enabled else {
+                "linear": {"x": 0.0, "y": 0.0, "z": 0.0}, "angular": {"x": 0.0, "y": 0.0, "z": 0.0}},
+                "covariance": [0.0] * 36},
+        }
+
+    def _sonar(self, now):
+        points = []
+        for i in range(self.sonar_points):
+            angle = math.radians(SONAR_ANGLES[i % len(SONAR_ANGLES)] + 360 * (i // len(SONAR_ANGLES)) / self.sonar_points)
+            distance = 2.5 + 2.0 * math.sin(now * 0.5 + i) + random.gauss(0, 0.05)
+            points.append({"x": distance * math.cos(angle), "y": distance * math.sin(angle), "z": 0.0})
+        return {"header": self._header(now, "sonar"), "points": points, "channels": []}
+
+    def _sonar_pointcloud2(self, now):
+        points = self._sonar(now)["points"]
+        xyz = [(point["x"], point["y"], point["z"]) for point in points]
+        return pointcloud2_message(xyz, self._header(now, "sonar"))
+
+    async def _publish_loop(self, topic):
+        interval = 1 / self.topic_rate(topic)
+        next_send = time.perf_counter()
+        while True:
+            if self._subscribers.get(topic):
+                await self._send_to_subscribers(topic, self._message(topic))
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_send = time.perf_counter()  # Fell behind, don't try to catch up with a burst
+                await asyncio.sleep(0)
+
+    async def _send_to_subscribers(self, topic, msg):
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return
+        message = {"op": "publish", "topic": topic, "msg": msg}
+        payloads = {}  # Encoded once per compression, like rosbridge
+        now = time.time()
+        for websocket, throttle in list(subscribers.items()):
+            throttle_rate, last_send, compression = throttle
+            if throttle_rate and (now - last_send) * 1000 < throttle_rate:
+                continue
+            throttle[1] = now
+            if compression not in payloads:
+                payloads[compression] = cbor2.dumps(message) if compression == "cbor" else \
+                    json.dumps(message, default=_encode_bytes)
+            try:
+                await websocket.send(payloads[compression])
+                if topic in self.sent:
+                    self.sent[topic] += 1
+            except websockets.ConnectionClosed:
+                subscribers.pop(websocket, None)
+
+
+class MJPEGStandIn:
+    """
+    Serves synthetic camera frames as multipart/x-mixed-replace MJPEG over HTTP, every client gets its own stream
+    Frames are generated on demand per client so a slow client just sees a lower frame rate
+    """
+
+    BOUNDARY = "mjpegframe"
+
+    def __init__(self, host="127.0.0.1", port=8080, fps=30, width=640, height=480, quality=80):
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.quality = quality
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={stand_in.BOUNDARY}")
+                self.end_headers()
+                source = SyntheticFrameSource(stand_in.width, stand_in.height, stand_in.fps)
+                try:
+                    while True:
+                        jpeg = encode_jpeg(source.read(), stand_in.quality)
+                        self.wfile.write(f"--{stand_in.BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"MJPEG stand-in serving on http://{self.server.server_address[0]}:{self.server.server_port}")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="Multiplier applied to every topic's real rate")
+    parser.add_argument("--rate", action="append", default=[], metavar="TOPIC=HZ",
+                        help="Override the rate of a single topic, can be repeated")
+    parser.add_argument("--sonar-points", type=int, default=16)
+    parser.add_argument("--padding", type=int, default=0, help="Extra bytes added to every published message")
+    parser.add_argument("--extra-topics", type=int, default=0, help="Number of extra 1Hz telemetry topics to publish")
+    parser.add_argument("--mjpeg-port", type=int, default=None, help="Also serve a synthetic MJPEG camera stream")
+    args = parser.parse_args()
+
+    rates = {}
+    for override in args.rate:
+        topic, hz = override.split("=")
+        rates[topic] = float(hz)
+
+    import logging as logging_config
+    logging_config.basicConfig(level=logging_config.INFO)
+    simulator = RobotSimulator(args.host, args.port, rate_scale=args.rate_scale, rates=rates,
+                               sonar_points=args.sonar_points, padding=args.padding, extra_topics=args.extra_topics)
+    if args.mjpeg_port is not None:
+        MJPEGStandIn(args.host, args.mjpeg_port).start()
+    simulator.run_forever()
+
+
+if __name__ == '__main__':
+    main()
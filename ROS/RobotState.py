@@ -1,14 +1,15 @@
-import base64
+import collections
+import concurrent.futures
 import random
 import threading
 import time
-from io import BytesIO
 
-import cv2
-import numpy as np
 import roslibpy
 import logging
-from PIL import Image
+
+from ROS.ImageDecode import FrameBuffers, decode_image
+from ROS.PointCloud2 import PointCloud2Decoder
+from ROS.TopicStats import TopicStats
 
 logging = logging.getLogger(__name__)
 
@@ -24,12 +25,18 @@ class SmartTopic:
         self.has_data = False
         self.is_single = True
         self._has_changed = False
+        self.sequence = 0  # Counts received messages, consumers compare it to skip work when nothing new arrived
 
         self._update_interval = []  # Used to calculate the update rate over the last 10 updates
+        self._listeners = []
+        self.stats = TopicStats()  # Bytes, rate and decode/update cost, fed by the transport and _update
 
         self.client = kwargs.get("client", None)
         self.topic_type = kwargs.get("topic_type", None)
         self.throttle_rate = kwargs.get("throttle_rate", 0)
+        self.base_throttle_rate = self.throttle_rate
+        # Throttle (ms) applied while the link probe reports a degraded link, None means never throttled
+        self.degraded_throttle_rate = kwargs.get("degraded_throttle_rate", None)
         self.queue_size = kwargs.get("queue_size", 5)
         self.auto_reconnect = kwargs.get("auto_reconnect", True)
         self.allow_update = kwargs.get("allow_update", False)
@@ -43,54 +50,51 @@ class SmartTopic:
         self._publisher = None  # type: roslibpy.Topic or None
         logging.info(f"{self.disp_name} created and initialized... Waiting for connection")
         if self.client is not None:
-            self.client.on_ready(self.connect, run_in_thread=True)
+            self.client.on_ready(self.connect, run_in_thread=False)
 
     def set_client(self, client):
         try:
             self.client = client
-            self.client.on_ready(self.connect, run_in_thread=True)
+            # connect() never blocks, so it can run directly on the transport's thread/loop
+            self.client.on_ready(self.connect, run_in_thread=False)
         except Exception as e:
             logging.error(f"Error setting client for {self.disp_name}: {e}")
 
     def set_type(self, topic_type):
         self.topic_type = topic_type
 
-    def _topic_type_callback(self, topic_type):
+    def _topic_type_callback(self, response):
+        topic_type = response["type"]
         if topic_type == "":
             self.exists = False
-            logging.debug(f"Topic {self.topic_name} does not exist")
+            logging.error(f"Topic {self.topic_name} does not exist")
             thread = threading.Thread(target=self._recheck_exists, daemon=True)
             thread.start()
         else:
             logging.info(f"Acquired type {topic_type} for topic {self.topic_name}")
+            self.topic_type = topic_type
             self.connect()
 
+    def _topic_type_errback(self, error):
+        logging.error(f"Failed to get type for topic {self.topic_name}: {error}")
+
     def _recheck_exists(self):
         """If the topic didn't exist at ready this loop runs to try to see if it has appeared"""
         return
         time.sleep(5 + random.randint(0, 5))
         if not self.exists and self.client.is_connected:
-            self.client.get_topic_type(self.topic_name, self._topic_type_callback)
+            self.client.get_topic_type(self.topic_name, self._topic_type_callback, self._topic_type_errback)
         else:
             logging.info(f"Topic recheck has been cancelled for {self.topic_name}")
 
     def connect(self):
         if self.topic_type is None:
-            # Get the type of the topic from the ROS master
-            self.topic_type = self.client.get_topic_type(self.topic_name)
-            if self.topic_type == "":
-                self.exists = False
-                logging.error(f"Topic {self.topic_name} does not exist")
-                threading.Thread(target=self._recheck_exists, daemon=True).start()
-                return
-            else:
-                logging.info(f"Acquired type {self.topic_type} for topic {self.topic_name}")
-                self.exists = True
+            # Get the type of the topic from the ROS master, connect() is called again once it arrives
+            self.client.get_topic_type(self.topic_name, self._topic_type_callback, self._topic_type_errback)
+            return
+        self.exists = True
 
-        self._listener = roslibpy.Topic(self.client, self.topic_name, self.topic_type, queue_size=5,
-                                        throttle_rate=self.throttle_rate, reconnect_on_close=self.auto_reconnect,
-                                        compression=self._compression)
-        self._listener.subscribe(self._update)
+        self._subscribe()
         if self.allow_update:
             self._publisher = roslibpy.Topic(self.client, self.topic_name, self.topic_type)
             # self._publisher.advertise()
@@ -98,13 +102,56 @@ class SmartTopic:
         else:
             logging.info(f"{self.disp_name} connected to {self.topic_name} of type {self.topic_type}, publishing disabled")
 
+    def _subscribe(self):
+        compression = self._compression
+        if compression == "cbor":
+            # roslibpy.Topic only accepts png/none, the CBOR request is set after it validated the rest
+            compression = None
+        self._listener = roslibpy.Topic(self.client, self.topic_name, self.topic_type, queue_size=5,
+                                        throttle_rate=self.throttle_rate, reconnect_on_close=self.auto_reconnect,
+                                        compression=compression)
+        if self._compression == "cbor":
+            if getattr(self.client, "supports_cbor", False):
+                self._listener.compression = "cbor"
+            else:
+                logging.info(f"{self.disp_name} can't use CBOR on this transport, falling back to JSON")
+        self._listener.subscribe(self._update)
+
+    def retype(self, topic_type):
+        """Switches to a new message type (e.g. a stale discovery cache), resubscribing if already connected"""
+        if topic_type == self.topic_type:
+            return
+        self.topic_type = topic_type
+        if self._listener is None:
+            return
+        if self._listener.is_subscribed:
+            self._listener.unsubscribe()
+        self._subscribe()
+        if self._publisher is not None:
+            self._publisher = roslibpy.Topic(self.client, self.topic_name, self.topic_type)
+        logging.info(f"{self.disp_name} resubscribed to {self.topic_name} as {self.topic_type}")
+
+    def mark_missing(self):
+        """
+        The robot no longer has this topic (a stale discovery cache), stops using it until it is found again
+        Forgetting the cached type means a connect() still to come asks rosapi instead of assuming the topic exists
+        """
+        logging.error(f"Topic {self.topic_name} does not exist")
+        self.topic_type = None
+        self.exists = False
+        if self._listener is not None and self._listener.is_subscribed:
+            self._listener.unsubscribe()
+        self._publisher = None
+
     def _update(self, message):
         """
         :param message:
         :return:
         """
+        start = time.perf_counter()
         self._lock.acquire()
         self.has_data = True
+        self.sequence += 1
         if "data" in message:
             value = message["data"]
         else:
@@ -119,6 +166,19 @@ class SmartTopic:
         self._update_interval.append(self._last_update)
         if len(self._update_interval) > 10:
             self._update_interval.pop(0)
+        self._notify(value)
+        self.stats.record_update(time.perf_counter() - start)
+
+    def add_listener(self, callback):
+        """callback(value) is called on the receive thread after every message, keep it cheap"""
+        self._listeners.append(callback)
+
+    def _notify(self, value):
+        for listener in self._listeners:
+            try:
+                listener(value)
+            except Exception as e:
+                logging.error(f"Error in {self.disp_name} listener: {e}")
 
     def has_changed(self):
         """Returns None if the value hasn't changed and the new value if it has"""
@@ -214,6 +274,21 @@ class SmartTopic:
     def resubscribe(self):
         self._listener.subscribe(self._update)
 
+    def set_throttle_rate(self, throttle_rate):
+        """Changes the rosbridge throttle_rate (ms), an active subscription is replaced with one at the new rate"""
+        if throttle_rate == self.throttle_rate:
+            return
+        self.throttle_rate = throttle_rate
+        if self._listener is not None and self._listener.is_subscribed:
+            self._listener.unsubscribe()
+            self._subscribe()
+        logging.info(f"{self.disp_name} throttle rate set to {throttle_rate}ms")
+
+    def set_link_degraded(self, degraded):
+        if self.degraded_throttle_rate is None:
+            return
+        self.set_throttle_rate(self.degraded_throttle_rate if degraded else self.base_throttle_rate)
+
     def is_stale(self):
         if self._last_update > time.time() - 5:
             return False
@@ -221,53 +296,203 @@ class SmartTopic:
             return True
 
 
-# class ImageHandler(SmartTopic):
-#     """Processes /camera/image/compressed messages"""
-#
-#     def __init__(self, client, topic_name, disp_name=None, throttle_rate=0, auto_reconnect=True, allow_update=False):
-#         super().__init__(client, topic_name, disp_name, throttle_rate, auto_reconnect, allow_update,
-#                          compression="png")
-#         self.image = None
-#         self.timestamp = None
-#         self.has_changed = False
-#         self._last_image = None
-#
-#         # Set the frame rate to 10 fps via the ros parameter server
-#
-#         # self.client.set_param("framerate", 10)
-#
-#     def connect(self):
-#         print("Connecting to image topic")
-#         super().connect()
-#         self.client.set_param("/usb_cam/framerate", 1)
-#
-#     def _update(self, message):
-#         """Handle a message from the topic"""
-#         # self.timestamp = message["timestamp"]
-#         # dict_keys(['encoding', 'height', 'header', 'step', 'data', 'width', 'is_bigendian'])
-#         print(message["encoding"])
-#         base64_bytes = message['data'].encode('ascii')
-#         image_bytes = base64.b64decode(base64_bytes)
-#         if message["encoding"] == "rgb8":
-#             # print("RGB8")
-#             image = np.frombuffer(image_bytes, dtype=np.uint8).reshape((message["height"], message["width"], 3))
-#             self.image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-#         elif message["encoding"] == "png":
-#             # print("PNG")
-#             self.image = Image.open(BytesIO(image_bytes))
-#
-#         self.has_data = True
-#         self.has_changed = True
-#
-#         # self.image = Image.open(BytesIO(image_bytes))
-#         # self._lock.release()
-#         # self.image = rgb
-#
-#         self._last_update = time.time()
-#         self._update_interval.append(self._last_update)
-#         if len(self._update_interval) > 10:
-#             self._update_interval.pop(0)
-#         # self.unsubscribe()
+class ImageTopic(SmartTopic):
+    """
+    Image or CompressedImage topic decoded off the receive thread
+    The rosbridge callback only stores the newest message, decoding runs on the executor (the owning ROSInterface's
+    decode pool) with at most one decode in flight per topic, nothing is decoded while it has none. A message that arrives before the previous one was decoded replaces it (counted in
+    dropped), so neither the receive thread nor the GUI ever waits on image work and latency can't build up
+    The topic only subscribes while at least one user (a viewer, the replay buffer) holds a token from start() it
+    hasn't passed back to stop(), so the robot doesn't encode frames nobody watches. Frames are only decoded while
+    a user that wants them decoded holds one, the replay buffer only keeps the raw messages
+    """
+
+    def __init__(self, disp_name, topic_name, *args, **kwargs):
+        self.active = kwargs.get("active", False)
+        self._users = {}  # Token handed out by start() and not stopped yet -> whether that user needs decoded frames
+        self._decode = self.active  # Any user needs decoded frames
+        self.executor = kwargs.get("executor", None)  # type: concurrent.futures.Executor or None
+        self.buffers = FrameBuffers()
+        self.received = 0
+        self.decoded = 0
+        self.dropped = 0
+        self.decode_time = 0.0
+        self._pending = None  # (message, receive time) waiting for the decoder
+        self._decoding = False
+        self._frame = None  # (BGR ndarray, receive time, header)
+        self._frame_id = 0
+        self._decode_times = collections.deque(maxlen=30)
+        self._frame_listeners = []
+        self._message_listeners = []
+        super().__init__(disp_name, topic_name, *args, **kwargs)
+
+    def _subscribe(self):
+        if self.active:
+            super()._subscribe()
+
+    def start(self, decode=True):
+        """
+        Subscribes (once the topic is connected) and with decode starts decoding, returns the token to give stop()
+        when done. Without decode only the message listeners see the frames
+        """
+        token = object()
+        with self._lock:
+            self._users[token] = decode
+            self._decode = any(self._users.values())
+        self.active = True
+        if self.exists and (self._listener is None or not self._listener.is_subscribed):
+            self._subscribe()
+        return token
+
+    def stop(self, token):
+        """Releases the use start() returned token for, unsubscribing after the last one. Repeats are ignored"""
+        with self._lock:
+            if token not in self._users:
+                return
+            del self._users[token]
+            self._decode = any(self._users.values())
+            if self._users:
+                return
+        self.active = False
+        if self._listener is not None and self._listener.is_subscribed:
+            self._listener.unsubscribe()
+
+    def add_frame_listener(self, callback):
+        """callback(frame, header) is called on the decode thread for every decoded frame"""
+        self._frame_listeners.append(callback)
+
+    def add_message_listener(self, callback):
+        """callback(message, receive time) is called on the receive thread with every raw message, keep it cheap"""
+        self._message_listeners.append(callback)
+
+    def _update(self, message):
+        start = time.perf_counter()
+        received = time.time()
+        executor = self.executor
+        with self._lock:
+            self.received += 1
+            self.sequence += 1
+            self.has_data = True
+            submit = False
+            if self._decode and executor is not None:
+                if self._pending is not None:
+                    self.dropped += 1
+                self._pending = (message, received)
+                submit = not self._decoding
+                self._decoding = True
+        if submit:
+            try:
+                executor.submit(self._decode_pending)
+            except RuntimeError:
+                # The pool was shut down by terminate(), the next one starts with nothing in flight
+                with self._lock:
+                    self._pending = None
+                    self._decoding = False
+        for listener in self._message_listeners:
+            try:
+                listener(message, received)
+            except Exception as e:
+                logging.error(f"Error in {self.topic_name} message listener: {e}")
+        self._last_update = received
+        self._update_interval.append(self._last_update)
+        if len(self._update_interval) > 10:
+            self._update_interval.pop(0)
+        self.stats.record_update(time.perf_counter() - start)
+
+    def _decode_pending(self):
+        while True:
+            with self._lock:
+                item, self._pending = self._pending, None
+                if item is None:
+                    self._decoding = False
+                    return
+            message, received = item
+            start = time.perf_counter()
+            try:
+                frame = decode_image(message, self.buffers)
+            except Exception as e:
+                logging.error(f"Error decoding {self.topic_name}: {e}")
+                continue
+            if frame is None:
+                continue
+            self.decode_time += time.perf_counter() - start
+            header = message.get("header")
+            with self._lock:
+                self._frame = (frame, received, header)
+                self._frame_id += 1
+                self._has_changed = True
+                self.decoded += 1
+            self._decode_times.append(time.time())
+            for listener in self._frame_listeners:
+                try:
+                    listener(frame, header)
+                except Exception as e:
+                    logging.error(f"Error in {self.topic_name} frame listener: {e}")
+
+    def latest(self):
+        """Returns (frame id, BGR frame, receive time) of the newest decoded frame"""
+        with self._lock:
+            if self._frame is None:
+                return self._frame_id, None, None
+            return self._frame_id, self._frame[0], self._frame[1]
+
+    @property
+    def value(self):
+        with self._lock:
+            return self._frame[0] if self._frame is not None else None
+
+    @property
+    def fps(self):
+        """Decoded frames per second over the last 30 frames"""
+        times = self._decode_times
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    @property
+    def error(self):
+        if not self.exists:
+            return "Topic not available"
+        return None
+
+    def get_status(self):
+        if self.exists and not self.active:
+            return "IDLE", "gray"
+        return super().get_status()
+
+
+class PointCloud2Topic(SmartTopic):
+    """
+    sensor_msgs/PointCloud2 topic whose value is the decoded structured array (a view of the message's data) instead
+    of the message dict. Subscribes with CBOR where the transport supports it so the data skips base64 entirely
+    """
+
+    def __init__(self, disp_name, topic_name, *args, **kwargs):
+        kwargs.setdefault("topic_type", "sensor_msgs/PointCloud2")
+        kwargs.setdefault("compression", "cbor")
+        self.decoder = PointCloud2Decoder()
+        self.header = None
+        super().__init__(disp_name, topic_name, *args, **kwargs)
+
+    def _update(self, message):
+        start = time.perf_counter()
+        try:
+            cloud = self.decoder.decode(message)
+        except Exception as e:
+            logging.error(f"Failed to decode {self.disp_name} point cloud: {e}")
+            return
+        with self._lock:
+            self.has_data = True
+            self.sequence += 1
+            self.header = message.get("header")
+            self._value = cloud
+            self._has_changed = True
+        self._last_update = time.time()
+        self._update_interval.append(self._last_update)
+        if len(self._update_interval) > 10:
+            self._update_interval.pop(0)
+        self._notify(cloud)
+        self.stats.record_update(time.perf_counter() - start)
 
 
 # class State:
@@ -380,6 +605,16 @@ class CannonCombinedTopic:
         self.get_state_topic = get_state_topic
         self.get_auto_topic = get_auto_topic
 
+    @classmethod
+    def for_cannon(cls, robot, cannon_number):
+        """The combined topic of one of the robot's cannons"""
+        return cls(robot.get_state(f"cannon_{cannon_number}_target_pressure"),
+                   # The controller publishes the pressure on state and the state on pressure
+                   robot.get_state(f"cannon_{cannon_number}_state"),
+                   robot.get_state(f"cannon_{cannon_number}_set_state"),
+                   robot.get_state(f"cannon_{cannon_number}_pressure"),
+                   robot.get_state(f"cannon_{cannon_number}_auto"))
+
     def set_pressure(self, pressure):
         try:
             self.set_pressure_topic.value = pressure
@@ -439,6 +674,7 @@ class RobotState:
 
     def __init__(self):
         self._topics = {}
+        self._by_name = {}  # disp_name and topic_name -> SmartTopic, state() is called per widget refresh
 
     # def add_watcher(self, client, name, topic, topic_type, allow_setting=False):
     #     topic = roslibpy.Topic(client, topic, topic_type, reconnect_on_close=True)
@@ -452,12 +688,11 @@ class RobotState:
 
     def add_watcher(self, smart_topic):
         self._topics[smart_topic.disp_name] = smart_topic
+        self._by_name.setdefault(smart_topic.topic_name, smart_topic)
+        self._by_name[smart_topic.disp_name] = smart_topic
 
     def state(self, name):
-        for smart_topic in self.states():
-            if smart_topic.disp_name == name or smart_topic.topic_name == name:
-                return smart_topic
-        return None
+        return self._by_name.get(name)
 
     def states(self):
         return self._topics.values()
@@ -0,0 +1,211 @@
+import collections
+import select
+import threading
+import time
+import logging
+
+import paramiko
+
+logging = logging.getLogger(__name__)
+
+ROSSERIAL_COMMAND = "rosrun rosserial_python serial_node.py _port:=/dev/ttyACM0"
+
+
+class LogBuffer:
+    """Keeps the newest max_bytes of a command's output, older chunks are dropped as new ones arrive"""
+
+    def __init__(self, max_bytes=64 * 1024):
+        self.max_bytes = max_bytes
+        self.version = 0  # Bumped on every append so viewers can skip redrawing an unchanged log
+        self.dropped_bytes = 0
+        self._chunks = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, data: bytes):
+        if not data:
+            return
+        with self._lock:
+            if len(data) > self.max_bytes:
+                self.dropped_bytes += len(data) - self.max_bytes
+                data = data[-self.max_bytes:]
+            self._chunks.append(data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                dropped = self._chunks.popleft()
+                self._size -= len(dropped)
+                self.dropped_bytes += len(dropped)
+            self.version += 1
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._size = 0
+            self.version += 1
+
+    def text(self):
+        with self._lock:
+            data = b"".join(self._chunks)
+        return data.decode("utf-8", errors="replace")
+
+    def __len__(self):
+        return self._size
+
+
+class RemoteCommand:
+    """A command running on one channel of the shared SSH transport"""
+
+    def __init__(self, name, command, channel, log):
+        self.name = name
+        self.command = command
+        self.channel = channel  # type: paramiko.Channel
+        self.log = log  # type: LogBuffer
+        self.exit_status = None
+        self.started = time.time()
+        self.finished = threading.Event()
+
+    @property
+    def running(self):
+        return not self.finished.is_set()
+
+    def wait(self, timeout=None):
+        self.finished.wait(timeout)
+        return self.exit_status
+
+    def stop(self):
+        """Closes the channel and marks the command finished, exit_status stays None"""
+        if self.running:
+            self.channel.close()
+            self.finished.set()
+
+
+class SSHSession:
+    """
+    One authenticated SSH transport to the robot, shared by every remote command (rosserial, restarts...)
+    Each command gets its own channel, a single reader thread waits on all of them with select() and copies their
+    output into a bounded LogBuffer, so a long-running command costs no CPU while it is quiet
+    """
+
+    def __init__(self, address, username="ubuntu", password="ubuntu", port=22, log_size=64 * 1024):
+        self.address = address
+        self.username = username
+        self.password = password
+        self.port = port
+        self.log_size = log_size
+
+        self._client = None  # type: paramiko.SSHClient or None
+        self._commands = {}  # name -> RemoteCommand
+        self._lock = threading.Lock()
+        self._reader = None  # type: threading.Thread or None
+        self._closed = False
+
+    @property
+    def is_connected(self):
+        return self._client is not None and self._client.get_transport() is not None \
+            and self._client.get_transport().is_active()
+
+    def connect(self, timeout=10):
+        """Blocking, opens the transport if it isn't already open"""
+        with self._lock:
+            if self.is_connected:
+                return
+            logging.info(f"Connecting over SSH to {self.address}")
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # Set policy to auto add host key
+            client.connect(self.address, port=self.port, username=self.username, password=self.password,
+                           timeout=timeout)
+            self._client = client
+            self._closed = False
+
+    def start(self, name, command):
+        """Starts command on a new channel of the shared transport and returns its RemoteCommand"""
+        self.connect()
+        channel = self._client.get_transport().open_session()
+        channel.exec_command(command)
+        previous = self._commands.get(name)
+        log = previous.log if previous is not None else LogBuffer(self.log_size)
+        remote = RemoteCommand(name, command, channel, log)
+        with self._lock:
+            self._commands[name] = remote
+        logging.info(f"Started remote command {name}: {command}")
+        self._start_reader()
+        return remote
+
+    def run(self, command, timeout=30):
+        """Runs a short command on the shared transport, returns (exit_status, output)"""
+        remote = self.start(f"run-{time.time()}", command)
+        exit_status = remote.wait(timeout)
+        with self._lock:
+            self._commands.pop(remote.name, None)
+        if exit_status is None:
+            logging.error(f"Remote command {command} timed out after {timeout}s")
+            remote.stop()
+        return exit_status, remote.log.text()
+
+    def command(self, name):
+        return self._commands.get(name)
+
+    def log(self, name):
+        remote = self._commands.get(name)
+        return remote.log if remote is not None else None
+
+    def _start_reader(self):
+        with self._lock:
+            if self._reader is not None and self._reader.is_alive():
+                return
+            self._reader = threading.Thread(target=self._read_loop, name=f"ssh-{self.address}", daemon=True)
+            self._reader.start()
+
+    def _read_loop(self):
+        while not self._closed:
+            with self._lock:
+                running = [remote for remote in self._commands.values() if remote.running]
+            if not running:
+                return  # Restarted by the next start()
+            try:
+                readable, _, _ = select.select([remote.channel for remote in running], [], [], 1)
+            except Exception as e:
+                logging.error(f"SSH select failed: {e}")
+                time.sleep(1)
+                continue
+            for remote in readable:
+                self._read(self._find(running, remote))
+            for remote in running:
+                if remote.channel.exit_status_ready() and not remote.channel.recv_ready() \
+                        and not remote.channel.recv_stderr_ready():
+                    self._finish(remote)
+
+    @staticmethod
+    def _find(running, channel):
+        for remote in running:
+            if remote.channel is channel:
+                return remote
+
+    @staticmethod
+    def _read(remote):
+        try:
+            while remote.channel.recv_ready():
+                remote.log.append(remote.channel.recv(4096))
+            while remote.channel.recv_stderr_ready():
+                remote.log.append(remote.channel.recv_stderr(4096))
+        except Exception as e:
+            logging.error(f"Error reading output of {remote.name}: {e}")
+
+    @staticmethod
+    def _finish(remote):
+        remote.exit_status = remote.channel.recv_exit_status()
+        remote.channel.close()
+        remote.finished.set()
+        if remote.exit_status != 0:
+            logging.error(f"Remote command {remote.name} exited with status {remote.exit_status}")
+        else:
+            logging.info(f"Remote command {remote.name} finished")
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            for remote in self._commands.values():
+                remote.stop()
+            if self._client is not None:
+                self._client.close()
+            self._client = None
@@ -0,0 +1,134 @@
+import time
+import logging
+
+import numpy as np
+
+logging = logging.getLogger(__name__)
+
+
+class SampleHistory:
+    """
+    The last capacity samples of one value as (time, value) numpy ring buffers, appended from the receive thread
+    Every BLOCK samples also get a min/max summary, so columns() can reduce any span of time to a min and a max per
+    pixel column in bounded time: short spans read the raw samples (at most RAW_PER_COLUMN per column), longer spans
+    read the block summaries (at most capacity / BLOCK of them), never hours of raw samples
+    Times must be non decreasing. Memory is only touched as it fills, numpy's zeros are lazily allocated
+    """
+
+    BLOCK = 64
+    RAW_PER_COLUMN = 4 * BLOCK  # Past this many samples per column the block summaries are read instead
+
+    def __init__(self, seconds=4 * 3600, rate=50):
+        blocks = max(int(seconds * rate) // self.BLOCK, 2)
+        self.capacity = blocks * self.BLOCK
+        self.times = np.zeros(self.capacity)
+        self.values = np.zeros(self.capacity, dtype=np.float32)
+        self.block_times = np.zeros(blocks)  # Time of each block's first sample
+        self.block_min = np.zeros(blocks, dtype=np.float32)
+        self.block_max = np.zeros(blocks, dtype=np.float32)
+        self.count = 0  # Samples appended since the start, count - capacity of them have been overwritten
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, value, now=None):
+        now = time.time() if now is None else now
+        value = float(value)
+        index = self.count % self.capacity
+        self.times[index] = now
+        self.values[index] = value
+        block = index // self.BLOCK
+        if index % self.BLOCK == 0:
+            self.block_times[block] = now
+            self.block_min[block] = self.block_max[block] = value
+        else:
+            if value < self.block_min[block]:
+                self.block_min[block] = value
+            if value > self.block_max[block]:
+                self.block_max[block] = value
+        self.count += 1  # Last, a reader on another thread never sees a sample before it is written
+
+    @property
+    def last(self):
+        """(time, value) of the newest sample, None when empty"""
+        if not self.count:
+            return None
+        index = (self.count - 1) % self.capacity
+        return self.times[index], float(self.values[index])
+
+    def _ranges(self, start, end):
+        """(first, last) index ranges into the ring holding the samples with start <= time < end, oldest first"""
+        count = self.count
+        if count <= self.capacity:
+            sections = [(0, count)]
+        else:
+            # The oldest samples sit after the write position, search both halves of the ring
+            split = count % self.capacity
+            sections = [(split, self.capacity), (0, split)]
+        ranges = []
+        for offset, stop in sections:
+            first, last = np.searchsorted(self.times[offset:stop], (start, end))
+            if last > first:
+                ranges.append((offset + first, offset + last))
+        return ranges
+
+    def _span(self, ranges):
+        """Raw (times, values) for the ranges from _ranges, only copied when they wrap around the ring"""
+        if not ranges:
+            return self.times[:0], self.values[:0]
+        if len(ranges) == 1:
+            first, last = ranges[0]
+            return self.times[first:last], self.values[first:last]
+        return (np.concatenate([self.times[first:last] for first, last in ranges]),
+                np.concatenate([self.values[first:last] for first, last in ranges]))
+
+    def _blocks(self, start, end):
+        """
+        (times, mins, maxes) of the complete blocks starting in [start, end) oldest first, followed by the raw samples
+        of the block being filled
+        """
+        count = self.count
+        complete = count // self.BLOCK
+        blocks = len(self.block_times)
+        current = complete % blocks  # Being filled (or next to be), left out of the summaries
+        if complete < blocks:
+            order = np.arange(complete)
+        else:
+            order = np.concatenate((np.arange(current + 1, blocks), np.arange(current)))
+        times = self.block_times[order]
+        first, last = np.searchsorted(times, (start, end))
+        order = order[first:last]
+        tail = slice(current * self.BLOCK, current * self.BLOCK + count % self.BLOCK)
+        tail_times = self.times[tail]
+        keep = (tail_times >= start) & (tail_times < end)
+        tail_values = self.values[tail][keep]
+        return (np.concatenate((times[first:last], tail_times[keep])),
+                np.concatenate((self.block_min[order], tail_values)),
+                np.concatenate((self.block_max[order], tail_values)))
+
+    def columns(self, start, end, columns):
+        """
+        (mins, maxes) of the samples in each of columns equal slices of [start, end), NaN where a column has none
+        The cost depends on columns, not on how many samples the span holds
+        """
+        mins = np.full(columns, np.nan, dtype=np.float32)
+        maxes = np.full(columns, np.nan, dtype=np.float32)
+        if not self.count or end <= start or columns <= 0:
+            return mins, maxes
+        edges = np.linspace(start, end, columns + 1)
+        ranges = self._ranges(start, end)
+        if sum(last - first for first, last in ranges) > self.RAW_PER_COLUMN * columns:
+            # Each column spans more than RAW_PER_COLUMN / BLOCK blocks, placing a block by its first sample time is
+            # off by less than a quarter of a column
+            times, low, high = self._blocks(start, end)
+        else:
+            times, low = self._span(ranges)
+            high = low
+        if not len(times):
+            return mins, maxes
+        bounds = np.searchsorted(times, edges)
+        occupied = np.flatnonzero(bounds[1:] > bounds[:-1])
+        starts = bounds[occupied]
+        mins[occupied] = np.minimum.reduceat(low[:bounds[-1]], starts)
+        maxes[occupied] = np.maximum.reduceat(high[:bounds[-1]], starts)
+        return mins, maxes
@@ -0,0 +1,132 @@
+import operator
+
+import numpy as np
+import logging
+
+logging = logging.getLogger(__name__)
+
+# Colour classes of a sonar point, the values PointCloud2UI has always used for its dots
+FAR, CLEAR, NEAR = 0, 1, 2
+FAR_RANGE = 5.0  # Past this (m) the sonar saw nothing
+NEAR_RANGE = 1.0  # Closer than this (m) is an obstacle
+
+_point_x = operator.itemgetter("x")
+_point_y = operator.itemgetter("y")
+
+
+def points_to_array(points):
+    """Converts the rosbridge point list of a sensor_msgs/PointCloud ([{"x", "y", "z"}, ...]) to an (n, 2) array"""
+    array = np.empty((len(points), 2), dtype=np.float64)
+    # map(itemgetter) and fromiter both run in C, no Python code runs per point
+    array[:, 0] = np.fromiter(map(_point_x, points), dtype=np.float64, count=len(points))
+    array[:, 1] = np.fromiter(map(_point_y, points), dtype=np.float64, count=len(points))
+    return array
+
+
+class SonarScan:
+    """
+    One sonar scan as arrays, points (n, 2) in meters from the center of the robot, their distance and colour class
+    (FAR, CLEAR, NEAR). Everything is computed once per message with array operations, non-finite points are left out
+    """
+
+    def __init__(self, points, far_range=FAR_RANGE, near_range=NEAR_RANGE):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        finite = np.isfinite(self.points).all(axis=1)
+        if not finite.all():
+            self.points = self.points[finite]  # Beams without a reading have nothing to draw
+        self.distance = np.hypot(self.points[:, 0], self.points[:, 1])
+        self.classes = np.full(len(self.points), CLEAR, dtype=np.int8)
+        self.classes[self.distance > far_range] = FAR
+        self.classes[self.distance < near_range] = NEAR
+
+    @classmethod
+    def from_message(cls, message, **kwargs):
+        return cls(points_to_array(message["points"]), **kwargs)
+
+    def __len__(self):
+        return len(self.points)
+
+    def pixels(self, scale=40, center=(320, 240), robot_offset=0.2):
+        """
+        Screen coordinates of the points, (n, 2) ints, forward (+x) is up and left (+y) is left
+        robot_offset pushes points out from the center by the radius of the robot along the forward axis
+        """
+        x, y = self.points[:, 0], self.points[:, 1]
+        forward = np.where(x > 0, x + robot_offset, x - robot_offset)
+        pixels = np.empty((len(self.points), 2), dtype=np.int32)
+        pixels[:, 0] = np.rint(-y * scale) + center[0]
+        pixels[:, 1] = np.rint(-forward * scale) + center[1]
+        return pixels
+
+
+class SonarFilter:
+    """
+    Smooths sonar scans beam by beam: the ranges of the last history scans are kept in a (history, beams) ring and
+    every new scan is replaced by the per beam median (or, with outlier set, only readings further than outlier
+    meters from the median are). Each update is a few array operations over history * beams values
+    A beam without a reading (NaN) keeps its place in the ring and is left out of that beam's median
+    Readers take latest, a (sequence, scan, raw) tuple that update() replaces whole, so the filtered and raw scans
+    they get always belong to the same update
+    """
+
+    def __init__(self, history=5, outlier=None, far_range=FAR_RANGE, near_range=NEAR_RANGE):
+        self.history = history
+        self.outlier = outlier  # None filters every reading through the median
+        self.far_range = far_range
+        self.near_range = near_range
+        self._ranges = None  # type: np.ndarray or None
+        self._index = 0
+        self.latest = (0, None, None)  # (sequence, filtered SonarScan, raw SonarScan), replaced whole on every update
+        self._listeners = []
+
+    @property
+    def sequence(self):
+        return self.latest[0]
+
+    @property
+    def scan(self):
+        return self.latest[1]
+
+    @property
+    def raw(self):
+        return self.latest[2]
+
+    def add_listener(self, callback):
+        """callback(filter) runs after every update, on whichever thread fed the scan"""
+        self._listeners.append(callback)
+
+    def reset(self):
+        self._ranges = None
+
+    def update(self, points):
+        """points is a raw (n, 2) scan, beam i must be the same sensor in every scan and NaN when it has no reading"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        ranges = np.hypot(points[:, 0], points[:, 1])
+        if self._ranges is None or self._ranges.shape[1] != len(ranges):
+            # A new sensor layout, the history starts out as copies of this scan
+            self._ranges = np.repeat(ranges[None, :], self.history, axis=0)
+            self._index = 0
+        self._ranges[self._index] = ranges
+        self._index = (self._index + 1) % self.history
+
+        missing = np.isnan(self._ranges)
+        if missing.any():
+            # nanmedian is several times slower than median, and warns about beams with no reading in the whole history
+            median = np.full(len(ranges), np.nan)
+            seen = ~missing.all(axis=0)
+            median[seen] = np.nanmedian(self._ranges[:, seen], axis=0)
+        else:
+            median = np.median(self._ranges, axis=0)
+        if self.outlier is None:
+            filtered = median
+        else:
+            filtered = np.where(np.abs(ranges - median) > self.outlier, median, ranges)
+        # Beams keep their direction, only their length changes
+        scale = np.divide(filtered, ranges, out=np.ones_like(ranges), where=ranges > 1e-6)
+        self.latest = (self.latest[0] + 1, SonarScan(points * scale[:, None], self.far_range, self.near_range),
+                       SonarScan(points, self.far_range, self.near_range))
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logging.error(f"Error in sonar filter listener: {e}")
@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+import logging
+
+from ROS.Sonar import FAR_RANGE
+
+logging = logging.getLogger(__name__)
+
+
+class SpeedGovernor:
+    """
+    Scales the drive command's forward speed down as the sonar sees obstacles in the robot's path
+    The work happens once per scan (on_scan, a SonarFilter listener): the nearest echo inside the corridor the robot
+    sweeps going forward and going backward is turned into a speed factor per direction. limit(), on the drive path,
+    only reads those two numbers. Full speed past slow_distance, zero at stop_distance (meters from the robot's
+    center), linear in between. Turning in place is never limited
+    Until the first scan arrives the governor stays out of the way (no sonar, nothing to go on), once scans stop
+    arriving for max_age seconds speed is capped at stale_factor
+    """
+
+    def __init__(self, stop_distance=0.5, slow_distance=1.5, half_width=0.35, max_age=1.0, stale_factor=0.25,
+                 far_range=FAR_RANGE, clock=time.monotonic):
+        self.stop_distance = stop_distance
+        self.slow_distance = slow_distance
+        self.half_width = half_width  # Half the robot's width plus a margin
+        self.max_age = max_age
+        self.stale_factor = stale_factor
+        self.far_range = far_range
+        self.clock = clock
+        self.enabled = True
+        # (scan time, forward factor, reverse factor, nearest ahead, nearest behind), replaced whole on every scan
+        self._limits = None
+
+    def on_scan(self, sonar):
+        """SonarFilter listener"""
+        scan = sonar.latest[1]
+        if scan is not None:
+            self.update(scan.points)
+
+    def update(self, points):
+        """points is an (n, 2) scan in the robot frame (x forward, y left)"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        in_path = (np.abs(y) < self.half_width) & (np.hypot(x, y) < self.far_range)
+        ahead = x[in_path & (x > 0)]
+        behind = -x[in_path & (x < 0)]
+        nearest_ahead = ahead.min() if len(ahead) else np.inf
+        nearest_behind = behind.min() if len(behind) else np.inf
+        self._limits = (self.clock(), self.factor(nearest_ahead), self.factor(nearest_behind),
+                        float(nearest_ahead), float(nearest_behind))
+
+    def factor(self, distance):
+        return float(np.clip((distance - self.stop_distance) / (self.slow_distance - self.stop_distance), 0, 1))
+
+    def limit(self, forward):
+        """The forward command (any units, + is forward) after the governor, O(1)"""
+        limits = self._limits
+        if not self.enabled or limits is None or forward == 0:
+            return forward
+        if self.clock() - limits[0] > self.max_age:
+            factor = self.stale_factor
+        else:
+            factor = limits[1] if forward > 0 else limits[2]
+        return forward * factor
+
+    @property
+    def nearest(self):
+        """(nearest obstacle ahead, nearest behind) in the robot's path in meters, inf when clear, None before a scan"""
+        limits = self._limits
+        return None if limits is None else (limits[3], limits[4])
@@ -0,0 +1,129 @@
+import collections
+import csv
+import json
+import threading
+import time
+import logging
+
+from roslibpy.core import Message
+
+logging = logging.getLogger(__name__)
+
+
+class TopicStats:
+    """
+    Receive-path accounting for one topic: bytes on the wire, message count, and the time spent decoding the
+    rosbridge JSON and in SmartTopic._update. Rates are averaged over the last window seconds using one second buckets
+    so recording a message is O(1)
+    Times are perf_counter deltas around non-blocking code, which tracks CPU time without the coarse resolution
+    time.thread_time has on Windows
+    """
+
+    def __init__(self, window=10):
+        self.total_bytes = 0
+        self.total_messages = 0
+        self.decode_time = 0.0
+        self.update_time = 0.0
+        self._buckets = collections.deque(maxlen=window)  # [second, bytes, messages]
+        self._lock = threading.Lock()
+
+    def _bucket(self, now):
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        return self._buckets[-1]
+
+    def record_receive(self, nbytes, decode_seconds):
+        with self._lock:
+            bucket = self._bucket(time.time())
+            bucket[1] += nbytes
+            self.total_bytes += nbytes
+            self.decode_time += decode_seconds
+
+    def record_update(self, update_seconds):
+        with self._lock:
+            bucket = self._bucket(time.time())
+            bucket[2] += 1
+            self.total_messages += 1
+            self.update_time += update_seconds
+
+    def reset(self):
+        with self._lock:
+            self.total_bytes = 0
+            self.total_messages = 0
+            self.decode_time = 0.0
+            self.update_time = 0.0
+            self._buckets.clear()
+
+    def snapshot(self):
+        """Returns a dict of the current rates (per second over the window) and mean per message costs (us)"""
+        with self._lock:
+            now = int(time.time())
+            buckets = [bucket for bucket in self._buckets if now - bucket[0] < self._buckets.maxlen]
+            span = max(now - buckets[0][0] + 1, 1) if buckets else 1
+            messages = self.total_messages
+            return {
+                "bytes": self.total_bytes,
+                "messages": messages,
+                "bytes_per_second": sum(bucket[1] for bucket in buckets) / span,
+                "messages_per_second": sum(bucket[2] for bucket in buckets) / span,
+                "decode_us": self.decode_time / messages * 1e6 if messages else 0.0,
+                "update_us": self.update_time / messages * 1e6 if messages else 0.0,
+                "cpu_seconds": self.decode_time + self.update_time,
+            }
+
+
+def instrument_client(client, stats_by_topic):
+    """
+    Routes per-message size and decode time from the client's receive path into stats_by_topic (topic -> TopicStats)
+    AsyncRos measures this itself, for roslibpy the protocol's on_message is wrapped every time a connection opens
+    """
+    if hasattr(client, "receive_stats"):
+        client.receive_stats = stats_by_topic
+        return
+
+    def _wrap_protocol(proto):
+        def on_message(payload):
+            start = time.perf_counter()
+            message = Message(json.loads(payload.decode("utf8")))
+            decode = time.perf_counter() - start
+            if message["op"] == "publish" and message["topic"] in stats_by_topic:
+                stats_by_topic[message["topic"]].record_receive(len(payload), decode)
+            handler = proto._message_handlers.get(message["op"], None)
+            if handler is None:
+                logging.warning(f"No handler registered for operation {message['op']}")
+                return
+            handler(message)
+        proto.on_message = on_message
+
+    try:
+        client.factory.on("ready", _wrap_protocol)
+    except Exception as e:
+        logging.error(f"Unable to instrument the receive path of {client}: {e}")
+
+
+def top_topics(smart_topics, n=10, key="bytes_per_second"):
+    """Returns (smart_topic, snapshot) pairs for the n topics with the highest key"""
+    rows = [(smart_topic, smart_topic.stats.snapshot()) for smart_topic in smart_topics]
+    rows.sort(key=lambda row: row[1][key], reverse=True)
+    return rows[:n]
+
+
+def format_top_report(smart_topics, n=10, key="bytes_per_second"):
+    lines = [f"{'topic':<32}{'B/s':>10}{'msg/s':>8}{'decode us':>11}{'update us':>11}{'total KiB':>11}"]
+    for smart_topic, snap in top_topics(smart_topics, n, key):
+        lines.append(f"{smart_topic.topic_name:<32}{snap['bytes_per_second']:>10.0f}{snap['messages_per_second']:>8.1f}"
+                     f"{snap['decode_us']:>11.1f}{snap['update_us']:>11.1f}{snap['bytes'] / 1024:>11.1f}")
+    return "\n".join(lines)
+
+
+def export_top_report(smart_topics, path, n=10, key="bytes_per_second"):
+    """Writes the top-n report as CSV"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["topic", "bytes_per_second", "messages_per_second", "decode_us", "update_us",
+                         "total_bytes", "total_messages", "throttle_rate"])
+        for smart_topic, snap in top_topics(smart_topics, n, key):
+            writer.writerow([smart_topic.topic_name, round(snap["bytes_per_second"], 1),
+                             round(snap["messages_per_second"], 2), round(snap["decode_us"], 2),
+                             round(snap["update_us"], 2), snap["bytes"], snap["messages"], smart_topic.throttle_rate])
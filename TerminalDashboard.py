@@ -0,0 +1,104 @@
+from rich.console import Group
+from rich.live import Live
+from rich.table import Table
+
+from DriverCore import DriverCore
+
+import logging
+
+logging = logging.getLogger(__name__)
+
+
+class TerminalDashboard:
+    """
+    The driver station as a rich table in the terminal, for machines without a display
+    Redrawn refresh_per_second times from the calling thread and never in between, with auto refresh off rich has no
+    thread of its own. The topic list is capped at max_topics, problems first
+    """
+
+    COLORS = {"darkorange": "dark_orange"}  # SmartTopic status colors rich names differently
+    SEVERITY = {"red": 0, "darkorange": 1, "green": 2}
+
+    def __init__(self, core: DriverCore, refresh_per_second=2.0, max_topics=12):
+        self.core = core
+        self.refresh_per_second = refresh_per_second
+        self.max_topics = max_topics
+
+    def run(self, stop):
+        """Draws until the threading.Event stop is set"""
+        with Live(self.render(), auto_refresh=False, screen=True) as live:
+            while not stop.wait(1 / self.refresh_per_second):
+                try:
+                    live.update(self.render(), refresh=True)
+                except Exception as e:
+                    logging.error(f"Error drawing dashboard: {e}")
+
+    def render(self):
+        return Group(self.robot_table(), self.cannon_table(), self.topic_table())
+
+    @staticmethod
+    def value(robot, name, format_value=str, missing="[grey50]--[/]"):
+        topic = robot.get_state(name)
+        if topic is None or not topic.has_data:
+            return missing
+        return format_value(topic.value)
+
+    def robot_table(self):
+        robot = self.core.robot
+        table = Table(title="Pioneer", title_justify="left", show_header=False, box=None, padding=(0, 2))
+        table.add_column(style="bold")
+        table.add_column()
+        connected = "[green]UP[/]" if robot.is_connected else "[red]DOWN[/]"
+        table.add_row("Connection", f"{connected} {robot.address or ''}:{robot.port or ''}")
+        link = robot.link_probe.stats()
+        if link["rtt"] is not None:
+            table.add_row("Round trip", f"{link['rtt']:.1f}ms (max {link['rtt_max']:.0f}ms), "
+                                        f"{link['loss']:.0%} loss")
+        table.add_row("Battery", self.value(robot, "battery_voltage", lambda value: f"{value:.1f}V"))
+        table.add_row("Motors", self.value(robot, "motors_state",
+                                           lambda value: "[green]enabled[/]" if value else "[red]disabled[/]"))
+        table.add_row("Cmd vel", self.value(robot, "cmd_vel", lambda value: f"forward {value['linear']['x']:.2f} "
+                                                                            f"turn {value['angular']['z']:.2f}"))
+        nearest = robot.governor.nearest
+        if nearest is not None:
+            ahead, behind = (f"{distance:.2f}m" if distance != float("inf") else "clear" for distance in nearest)
+            table.add_row("Nearest", f"ahead {ahead} behind {behind}")
+        return table
+
+    def cannon_table(self):
+        table = Table(title="Cannons", title_justify="left", box=None, padding=(0, 2))
+        for column in ("Tank", "State", "Pressure", "Auto"):
+            table.add_column(column)
+        for n, cannon in enumerate(self.core.cannons):
+            pressure = f"{cannon.get_pressure():.1f} PSI" if cannon.get_pressure_topic.has_data else "--"
+            state = cannon.get_state()
+            table.add_row(str(n + 1), f"[red]{state}[/]" if cannon.is_armed() else state, pressure,
+                          "on" if cannon.get_auto() else "off")
+        return table
+
+    def topic_table(self):
+        rows = []
+        robots = {id(robot): robot for robot in (self.core.robot, self.core.cannon_robot)}.values()
+        for robot in robots:
+            for topic in robot.get_smart_topics():
+                if not topic.hidden:
+                    status, color = topic.get_status()
+                    rows.append((self.SEVERITY.get(color, 3), topic.topic_name, status, color))
+        rows.sort()
+        table = Table(title=f"Topics ({len(rows)})", title_justify="left", box=None, padding=(0, 2))
+        table.add_column("Topic")
+        table.add_column("Status")
+        for _, name, status, color in rows[:self.max_topics]:
+            table.add_row(name, f"[{self.COLORS.get(color, color)}]{status}[/]")
+        if len(rows) > self.max_topics:
+            table.add_row(f"[grey50]... {len(rows) - self.max_topics} more[/]", "")
+        return table
+
+    def summary(self):
+        """One line of the same, for logging in headless mode"""
+        robot = self.core.robot
+        cannons = ", ".join(f"tank {n + 1} {cannon.get_state()}" for n, cannon in enumerate(self.core.cannons))
+        battery = self.value(robot, "battery_voltage", lambda value: f"{value:.1f}V", "--")
+        problems = sum(1 for topic in robot.get_smart_topics() if not topic.hidden and topic.get_status()[1] != "green")
+        return f"{'connected' if robot.is_connected else 'disconnected'}, battery {battery}, {cannons}, " \
+               f"{problems} topics not OK"
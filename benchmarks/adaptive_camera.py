@@ -0,0 +1,109 @@
+"""
+Offline check of the camera's AdaptiveController over a simulated link
+
+    python -m benchmarks.adaptive_camera [--frames "recording/*.jpg"] [--target-kbps 2000]
+
+Frames (synthetic, or a recording looped) are really encoded, but time is simulated: each frame is sent through a
+link whose bandwidth steps through the phases below, frames queue behind each other like on a TCP connection, and
+the viewer's frame age is fed back to the controller one latency later, like /camera/frame_age.
+The adaptive run is compared to a fixed full quality encoder whose frame age grows without bound once the link
+can't carry it
+"""
+import argparse
+import glob
+
+import cv2
+
+from Cam_pipeline import AdaptiveController, scale_frame
+from ROS.CameraFrames import SyntheticFrameSource, encode_jpeg
+
+# (seconds, link bandwidth in bits per second)
+PHASES = [(20, 8_000_000), (20, 1_000_000), (20, 300_000), (20, 8_000_000)]
+
+
+class SimulatedLink:
+    """A FIFO link: a frame starts sending once the previous one has left and takes size / bandwidth to send"""
+
+    def __init__(self, phases, latency=0.03):
+        self.phases = phases
+        self.latency = latency
+        self.free_at = 0.0
+
+    def bandwidth(self, t):
+        for duration, bandwidth in self.phases:
+            if t < duration:
+                return bandwidth
+            t -= duration
+        return self.phases[-1][1]
+
+    def send(self, nbytes, now):
+        """Returns when the frame arrives at the viewer"""
+        start = max(now, self.free_at)
+        self.free_at = start + nbytes * 8 / self.bandwidth(start)
+        return self.free_at + self.latency
+
+
+class FrameFeed:
+    def __init__(self, pattern):
+        self.frames = [cv2.imread(path) for path in sorted(glob.glob(pattern))] if pattern else []
+        self.source = SyntheticFrameSource()
+        self.index = 0
+
+    def next(self):
+        if not self.frames:
+            return self.source.frame()
+        self.index += 1
+        return self.frames[self.index % len(self.frames)]
+
+
+def simulate(feed, target_bitrate, adaptive, report_interval=0.5):
+    now = 0.0
+    link = SimulatedLink(PHASES)
+    controller = AdaptiveController(target_bitrate, clock=lambda: now)
+    feedback = []  # (time the robot hears about it, frame age)
+    last_report = -report_interval
+    results = []  # (send time, arrival time, bytes, level)
+    end = sum(duration for duration, _ in PHASES)
+    while now < end:
+        while feedback and feedback[0][0] <= now:
+            controller.report_delay(feedback.pop(0)[1], "frame_age")
+        scale, quality, fps = controller.update() if adaptive else controller.levels[0]
+        jpeg = encode_jpeg(scale_frame(feed.next(), scale), quality)
+        controller.record_frame(len(jpeg))
+        arrival = link.send(len(jpeg), now)
+        results.append((now, arrival, len(jpeg), controller.level if adaptive else 0))
+        if arrival - last_report >= report_interval:
+            last_report = arrival
+            feedback.append((arrival + link.latency, arrival - now))
+            feedback.sort()
+        now += 1 / fps
+    return results
+
+
+def report(name, results):
+    print(name)
+    print(f"{'phase':>6}{'link kbps':>11}{'sent kbps':>11}{'fps':>7}{'age p50 ms':>12}{'age p95 ms':>12}{'level':>7}")
+    start = 0.0
+    for index, (duration, bandwidth) in enumerate(PHASES):
+        phase = [row for row in results if start <= row[0] < start + duration]
+        start += duration
+        if not phase:
+            continue
+        ages = sorted(arrival - sent for sent, arrival, _, _ in phase)
+        sent_kbps = sum(nbytes for _, _, nbytes, _ in phase) * 8 / duration / 1000
+        print(f"{index:>6}{bandwidth / 1000:>11.0f}{sent_kbps:>11.0f}{len(phase) / duration:>7.1f}"
+              f"{ages[len(ages) // 2] * 1000:>12.0f}{ages[int(len(ages) * 0.95)] * 1000:>12.0f}{phase[-1][3]:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", default=None, help="Glob of recorded frames to loop instead of synthetic ones")
+    parser.add_argument("--target-kbps", type=float, default=2000)
+    args = parser.parse_args()
+
+    report("fixed (level 0)", simulate(FrameFeed(args.frames), args.target_kbps * 1000, adaptive=False))
+    report("adaptive", simulate(FrameFeed(args.frames), args.target_kbps * 1000, adaptive=True))
+
+
+if __name__ == '__main__':
+    main()
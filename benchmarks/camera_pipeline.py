@@ -0,0 +1,106 @@
+"""
+Runs the camera CapturePipeline against a synthetic frame source and checks it drops frames instead of queueing them
+
+    python -m benchmarks.camera_pipeline --fps 30 --rate 10 --duration 5
+
+A normal run is followed by one with a publish callback slower than the publish period and one with an encoder
+slower than the camera. In every case the published rate should stay near --rate (or the slowest stage) while the
+capture to publish latency stays bounded. Each run checks that
+  - no stage holds more than the one frame its slot keeps, every other frame is counted as dropped
+  - no more frames are encoded than captured
+  - the frame encoded is the newest one captured and the published frames never go back in time
+Exits non-zero if any check fails
+"""
+import argparse
+import sys
+import time
+
+from Cam_pipeline import CapturePipeline
+from ROS.CameraFrames import SyntheticFrameSource, encode_jpeg
+
+
+class NumberedSource(SyntheticFrameSource):
+    """Writes each frame's number into its first pixel, so the encoder can tell which frame it was handed"""
+
+    def frame(self):
+        number = self.count
+        frame = super().frame()
+        frame[0, 0] = (number & 0xff, (number >> 8) & 0xff, (number >> 16) & 0xff)
+        return frame
+
+
+def frame_number(frame):
+    return int(frame[0, 0, 0]) | int(frame[0, 0, 1]) << 8 | int(frame[0, 0, 2]) << 16
+
+
+def run(name, args, publish_delay=0.0, encode_delay=0.0):
+    """Prints one row of results, returns the failed checks"""
+    latencies = []
+    capture_times = []
+    behind = []  # Frames captured after the one handed to the encoder, at the time it was handed over
+
+    def publish(jpeg, capture_time):
+        time.sleep(publish_delay)
+        latencies.append(time.time() - capture_time)
+        capture_times.append(capture_time)
+
+    def encoder(frame, quality):
+        behind.append(source.count - 1 - frame_number(frame))
+        time.sleep(encode_delay)
+        return encode_jpeg(frame, quality)
+
+    source = NumberedSource(args.width, args.height, args.fps)
+    pipeline = CapturePipeline(source, publish, rate=args.rate, encoder=encoder)
+    pipeline.start()
+    time.sleep(args.duration)
+    pipeline.stop()
+    stats = pipeline.stats()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f"{name:<16}{stats['captured'] / args.duration:>9.1f}{stats['encoded'] / args.duration:>9.1f}"
+          f"{stats['published'] / args.duration:>9.1f}{stats['dropped_frames']:>8}{stats['dropped_encoded']:>8}"
+          f"{stats['skipped_ticks']:>8}{p50:>9.1f}{p99:>9.1f}")
+
+    # Once stopped each slot holds at most the one frame nobody took, any more would have been queued somewhere
+    unaccounted_frames = stats["captured"] - stats["encoded"] - stats["dropped_frames"]
+    unaccounted_encoded = stats["encoded"] - stats["published"] - stats["dropped_encoded"]
+    # A frame is at most a publish period, one encode, the publish still running when it was encoded, its own publish
+    # and a frame or two of capture jitter old. Anything queued would grow well past that over the run
+    bound = 1 / args.rate + encode_delay + 2 * publish_delay + 2 / args.fps + 0.05
+    checks = [
+        (0 <= unaccounted_frames <= 1, f"{unaccounted_frames} captured frames neither encoded nor dropped"),
+        (0 <= unaccounted_encoded <= 1, f"{unaccounted_encoded} encoded frames neither published nor dropped"),
+        (stats["encoded"] <= stats["captured"], f"encoded {stats['encoded']} of {stats['captured']} captured"),
+        (stats["published"] > 0, "nothing published"),
+        (not latencies or latencies[-1] <= bound,
+         f"latency {latencies[-1] * 1000 if latencies else 0:.0f}ms over {bound * 1000:.0f}ms"),
+        # One newer frame may land between the encoder taking its frame and reading the count
+        (max(behind, default=0) <= 1, f"encoder handed a frame {max(behind, default=0)} behind the newest"),
+        (all(a < b for a, b in zip(capture_times, capture_times[1:])), "published frames out of capture order"),
+    ]
+    failures = [message for ok, message in checks if not ok]
+    for message in failures:
+        print(f"  FAIL: {message}")
+    return len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=30, help="Synthetic camera frame rate")
+    parser.add_argument("--rate", type=float, default=10, help="Publish rate (Hz)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'run':<16}{'cap/s':>9}{'enc/s':>9}{'pub/s':>9}{'drop f':>8}{'drop e':>8}{'skipped':>8}"
+          f"{'p50 ms':>9}{'p99 ms':>9}")
+    failed = run("normal", args)
+    failed += run("slow publish", args, publish_delay=2.5 / args.rate)
+    failed += run("slow encode", args, encode_delay=2 / args.fps)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
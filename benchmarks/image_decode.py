@@ -0,0 +1,84 @@
+"""
+Image topic decode throughput at 640x480 for every supported encoding
+
+    python -m benchmarks.image_decode --duration 3
+
+decode/s is decode_image() alone on one thread. The ImageTopic columns replay messages into ImageTopic._update as
+fast as one "receive thread" can, the way rosbridge delivers them: callback us is what the receive thread pays per
+message, the rest of the work happens on the decode pool which keeps up with what it can and drops the rest
+"""
+import argparse
+import base64
+import concurrent.futures
+import time
+
+import cv2
+
+from ROS.CameraFrames import SyntheticFrameSource
+from ROS.ImageDecode import FrameBuffers, decode_image
+from ROS.RobotState import ImageTopic
+
+
+def make_message(frame, encoding):
+    height, width = frame.shape[:2]
+    if encoding == "rgb8":
+        data = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).tobytes()
+    elif encoding == "bgr8":
+        data = frame.tobytes()
+    elif encoding == "mono8":
+        data = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).tobytes()
+    else:
+        data = cv2.imencode(f".{'jpg' if encoding == 'jpeg' else encoding}", frame)[1].tobytes()
+        return {"header": {}, "format": encoding, "data": base64.b64encode(data).decode("ascii")}
+    channels = 1 if encoding == "mono8" else 3
+    return {"header": {}, "height": height, "width": width, "encoding": encoding, "is_bigendian": 0,
+            "step": width * channels, "data": base64.b64encode(data).decode("ascii")}
+
+
+def decode_rate(message, duration):
+    buffers = FrameBuffers()
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        decode_image(message, buffers)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def topic_rate(message, duration, rate):
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-decode")
+    topic = ImageTopic("bench", "/bench", topic_type="sensor_msgs/Image", active=True, executor=pool)
+    count = 0
+    callback_time = 0.0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        before = time.perf_counter()
+        topic._update(message)
+        callback_time += time.perf_counter() - before
+        count += 1
+        time.sleep(max(1 / rate - (time.perf_counter() - before), 0))
+    time.sleep(0.2)  # Let the last decode finish
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return callback_time / count * 1e6, count / elapsed, topic.decoded / elapsed, topic.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=3)
+    parser.add_argument("--rate", type=float, default=60, help="Messages per second replayed into the ImageTopic")
+    args = parser.parse_args()
+
+    frame = SyntheticFrameSource(640, 480).frame()
+    print(f"{'encoding':<9}{'msg KiB':>9}{'decode/s':>10}{'callback us':>13}{'recv/s':>8}{'decoded/s':>11}"
+          f"{'dropped':>9}")
+    for encoding in ("rgb8", "bgr8", "mono8", "jpeg", "png"):
+        message = make_message(frame, encoding)
+        rate = decode_rate(message, args.duration)
+        callback_us, received, decoded, dropped = topic_rate(message, args.duration, args.rate)
+        print(f"{encoding:<9}{len(message['data']) / 1024:>9.0f}{rate:>10.0f}{callback_us:>13.1f}{received:>8.0f}"
+              f"{decoded:>11.0f}{dropped:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Cost of refreshing the Pioneer panel's status indicators, stylesheet labels against StatusIndicator
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.indicator_paint --updates 2000
+
+Each update is what PioneerUI.updateUI does every 100ms for the motor state button and the battery voltage label,
+followed by processing the events it caused (polish, layout and paint). The old way sets a stylesheet and the text on
+every update, StatusIndicator.set_state only repaints when the state or the text changed. Rows are for a steady
+value (the common case), a voltage that changes every update and a state that flips every update
+"""
+import argparse
+import time
+
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton
+
+from QT5_Classes.StatusIndicator import StatusIndicator
+
+
+class StyleSheetPanel(QWidget):
+    """What PioneerUI built before, a QPushButton and a QLabel restyled on every update"""
+
+    def __init__(self):
+        super().__init__()
+        self.resize(300, 100)
+        self.motor = QPushButton("Unknown", parent=self)
+        self.motor.setFixedSize(100, 40)
+        self.battery = QLabel("Unknown", parent=self)
+        self.battery.setFixedSize(100, 20)
+        self.battery.move(0, 50)
+
+    def apply(self, enabled, voltage):
+        self.motor.setText("Enabled" if enabled else "Disabled")
+        self.motor.setStyleSheet(f"background-color: {'green' if enabled else 'red'}")
+        color = "green" if voltage > 12.5 else "darkorange" if voltage > 12.2 else "red"
+        self.battery.setStyleSheet(f"color: {color}; font-size: 17px; font-weight: bold")
+        self.battery.setText(f"{round(voltage, 3)}V")
+
+
+class IndicatorPanel(QWidget):
+
+    def __init__(self):
+        super().__init__()
+        self.resize(300, 100)
+        self.motor = StatusIndicator({"unknown": ("darkorange", "#e1e1e1"), "enabled": ("black", "green"),
+                                      "disabled": ("black", "red")}, text="Unknown", border=True, parent=self)
+        self.motor.setFixedSize(100, 40)
+        self.battery = StatusIndicator({"unknown": ("black", None), "good": ("green", None),
+                                        "low": ("darkorange", None), "critical": ("red", None)},
+                                       text="Unknown", parent=self)
+        self.battery.setFixedSize(100, 20)
+        self.battery.move(0, 50)
+
+    def apply(self, enabled, voltage):
+        self.motor.set_state("enabled" if enabled else "disabled", "Enabled" if enabled else "Disabled")
+        state = "good" if voltage > 12.5 else "low" if voltage > 12.2 else "critical"
+        self.battery.set_state(state, f"{round(voltage, 3)}V")
+
+
+SCENARIOS = [
+    ("steady", lambda i: (True, 12.8)),
+    ("voltage changes", lambda i: (True, 12.8 - i * 1e-3 % 0.2)),
+    ("state flips", lambda i: (i % 2 == 0, 12.6 if i % 2 else 12.3)),
+]
+
+
+def run(app, panel, values, updates):
+    panel.show()
+    app.processEvents()
+    start = time.perf_counter()
+    for i in range(updates):
+        panel.apply(*values(i))
+        app.processEvents()
+    return (time.perf_counter() - start) / updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    print(f"{'scenario':<18}{'stylesheet us':>15}{'indicator us':>14}{'speedup':>9}")
+    for name, values in SCENARIOS:
+        old = run(app, StyleSheetPanel(), values, args.updates)
+        new = run(app, IndicatorPanel(), values, args.updates)
+        print(f"{name:<18}{old * 1e6:>15.0f}{new * 1e6:>14.0f}{old / new:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
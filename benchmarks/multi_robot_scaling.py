@@ -0,0 +1,77 @@
+"""
+Measures driver-station CPU use as the number of connected robots grows
+
+    python -m benchmarks.multi_robot_scaling --robots 1 2 4 8 --rate-scale 10
+
+For every robot count N, N robot simulators are started in a separate process (so their CPU is not counted) and N
+independent asyncio ROSInterfaces connect to them. The CPU time this process spends over a fixed window is reported
+next to the per-robot cost, which should stay flat if total CPU grows linearly with robot count
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+
+from ROS.ROSInterface import ROSInterface
+
+# Discovery caches of the simulators stay out of configs/, removed on exit
+DISCOVERY = tempfile.TemporaryDirectory(prefix="discovery-")
+
+
+def wait_for_data(robots, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(robot.get_state("odometry").has_data for robot in robots):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def measure(count, base_port, rate_scale, window):
+    simulators = []
+    robots = []
+    try:
+        for i in range(count):
+            simulators.append(subprocess.Popen([sys.executable, "-m", "ROS.RobotSimulator", "--port", str(base_port + i),
+                                                "--rate-scale", str(rate_scale)],
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        time.sleep(1.5)
+        for i in range(count):
+            robot = ROSInterface(backend="asyncio", name=f"robot{i}", discovery_directory=DISCOVERY.name)
+            robot.connect("127.0.0.1", base_port + i, rosserial=False)
+            robots.append(robot)
+        if not wait_for_data(robots):
+            raise Exception(f"Not every robot produced data with {count} robots")
+        time.sleep(1)
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        time.sleep(window)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        return cpu / wall
+    finally:
+        for robot in robots:
+            robot.terminate()
+        for simulator in simulators:
+            simulator.terminate()
+            simulator.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--robots", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rate-scale", type=float, default=10)
+    parser.add_argument("--window", type=float, default=10, help="Seconds of steady state to measure per count")
+    parser.add_argument("--base-port", type=int, default=9200)
+    args = parser.parse_args()
+
+    print(f"{'robots':>7}{'cpu %':>9}{'cpu % / robot':>15}")
+    for count in args.robots:
+        load = measure(count, args.base_port, args.rate_scale, args.window)
+        print(f"{count:>7}{load * 100:>9.1f}{load * 100 / count:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
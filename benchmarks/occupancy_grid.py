@@ -0,0 +1,77 @@
+"""
+Per scan cost and accuracy of the rolling OccupancyGrid over a long synthetic drive
+
+    python -m benchmarks.occupancy_grid --distance 200
+
+The robot drives down a 3m wide corridor with a slight weave, sonar rays are cast against the two walls (no echo
+past 5m, like the P3-AT) and fused at the true pose. Per window of scans it prints the mean update cost, which should
+stay flat however far the robot has gone, and how much of the mapped corridor around the robot is right: the share
+of wall cells marked occupied and of floor cells marked free
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from ROS.OccupancyGrid import OccupancyGrid
+from ROS.RobotSimulator import SONAR_ANGLES
+
+HALF_WIDTH = 1.5
+SONAR_RANGE = 5.0
+
+
+def cast(pose, angles):
+    """Sonar points (robot frame) for a robot at pose in a corridor along x with walls at y = +-HALF_WIDTH"""
+    x, y, yaw = pose
+    headings = yaw + angles
+    sin = np.sin(headings)
+    with np.errstate(divide="ignore"):
+        distance = np.where(sin > 0, (HALF_WIDTH - y) / sin, np.where(sin < 0, (-HALF_WIDTH - y) / sin, np.inf))
+    distance = np.where(distance < SONAR_RANGE, distance, SONAR_RANGE + 0.5)
+    return np.column_stack((distance * np.cos(angles), distance * np.sin(angles)))
+
+
+def accuracy(grid, x):
+    """(share of wall cells occupied, share of floor cells free) within 3m behind the robot, where it has mapped"""
+    xs = np.arange(x - 3, x, grid.resolution / 2)
+    wall = []
+    for wall_y in (HALF_WIDTH, -HALF_WIDTH):
+        # The wall lies on a cell boundary, an echo can land on either side of it
+        col, row = grid.world_to_cell(xs, np.full_like(xs, wall_y))
+        wall.append(np.maximum(grid.log_odds[row, col], grid.log_odds[row - 1, col]))
+    floor_x, floor_y = np.meshgrid(xs, np.arange(-HALF_WIDTH + 0.2, HALF_WIDTH - 0.2, grid.resolution))
+    col, row = grid.world_to_cell(floor_x.ravel(), floor_y.ravel())
+    floor = grid.log_odds[row, col]
+    return np.mean(np.concatenate(wall) > 0.5), np.mean(floor < -0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distance", type=float, default=200, help="Meters driven")
+    parser.add_argument("--speed", type=float, default=0.5, help="m/s, scans come at 10Hz")
+    parser.add_argument("--window", type=int, default=2000, help="Scans per printed row")
+    args = parser.parse_args()
+
+    grid = OccupancyGrid()
+    angles = np.radians(SONAR_ANGLES)
+    step = args.speed / 10
+    scans = int(args.distance / step)
+    print(f"{'scans':>7}{'x m':>7}{'update us':>11}{'walls %':>9}{'floor %':>9}{'offset':>14}")
+    elapsed = 0.0
+    for scan in range(1, scans + 1):
+        x = scan * step
+        pose = (x, 0.5 * math.sin(x / 4), 0.125 * math.cos(x / 4))  # Weave, heading follows the path
+        points = cast(pose, angles)
+        start = time.perf_counter()
+        grid.update(pose, points)
+        elapsed += time.perf_counter() - start
+        if scan % args.window == 0:
+            walls, floor = accuracy(grid, x)
+            print(f"{scan:>7}{x:>7.0f}{elapsed / args.window * 1e6:>11.0f}{walls * 100:>9.0f}{floor * 100:>9.0f}"
+                  f"{str(tuple(grid.offset.tolist())):>14}")
+            elapsed = 0.0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Receive cost of a sonar scan as a JSON sensor_msgs/PointCloud against a binary sensor_msgs/PointCloud2
+
+    python -m benchmarks.pointcloud_decode --duration 1
+
+Each row is one payload as it comes off the websocket, timed through to the (n, 2) x/y array the sonar view works
+on: the rosbridge decode (json or cbor2), then points_to_array for the point dicts or PointCloud2Decoder and cloud_xy
+for the binary cloud. The CBOR row needs the optional cbor2 package
+"""
+import argparse
+import base64
+import json
+import time
+
+import numpy as np
+
+from ROS.PointCloud2 import PointCloud2Decoder, cloud_xy, pointcloud2_message
+from ROS.Sonar import points_to_array
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def make_points(count):
+    angle = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    distance = np.random.uniform(0.3, 6.0, count)
+    return np.column_stack((distance * np.cos(angle), distance * np.sin(angle), np.zeros(count)))
+
+
+def payloads(points):
+    """(name, payload, payload to xy) for every way the scan can arrive"""
+    cloud = {"header": {}, "channels": [], "points": [{"x": x, "y": y, "z": z} for x, y, z in points.tolist()]}
+    cloud2 = pointcloud2_message(points, {})
+    cloud2_json = dict(cloud2, data=base64.b64encode(cloud2["data"]).decode("ascii"))  # rosbridge's uint8[] in JSON
+    decoder = PointCloud2Decoder()
+    rows = [
+        ("PointCloud json", json.dumps({"op": "publish", "msg": cloud}),
+         lambda payload: points_to_array(json.loads(payload)["msg"]["points"])),
+        ("PointCloud2 json", json.dumps({"op": "publish", "msg": cloud2_json}),
+         lambda payload: cloud_xy(decoder.decode(json.loads(payload)["msg"]))),
+    ]
+    if cbor2 is not None:
+        rows.append(("PointCloud2 cbor", cbor2.dumps({"op": "publish", "msg": cloud2}),
+                     lambda payload: cloud_xy(decoder.decode(cbor2.loads(payload)["msg"]))))
+    return rows
+
+
+def time_per_call(function, payload, duration):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration or count < 3:
+        function(payload)
+        count += 1
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=1)
+    args = parser.parse_args()
+
+    print(f"{'points':>8}  {'format':<18}{'KiB':>9}{'us/msg':>11}{'speedup':>9}")
+    for count in (16, 1_000, 100_000):
+        points = make_points(count)
+        baseline = None
+        for name, payload, to_xy in payloads(points):
+            assert np.allclose(to_xy(payload), points[:, :2], atol=1e-5)
+            seconds = time_per_call(to_xy, payload, args.duration)
+            baseline = baseline or seconds
+            print(f"{count:>8}  {name:<18}{len(payload) / 1024:>9.1f}{seconds * 1e6:>11.0f}{baseline / seconds:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
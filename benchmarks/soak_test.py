@@ -0,0 +1,100 @@
+"""
+Headless soak test of the driver-station ROS stack against the local robot simulator
+
+    python -m benchmarks.soak_test --duration 600 --rate-scale 10 --backend asyncio
+
+Runs a ROSInterface (no Qt, no rosserial) against RobotSimulator and every --interval seconds reports process memory,
+the allocation sites that grew the most, messages dropped per topic (sent by the simulator vs received by the client)
+and the receive latency of the header stamped topics
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+import psutil
+
+from ROS.ROSInterface import ROSInterface
+from ROS.RobotSimulator import RobotSimulator
+
+# Discovery caches of the simulators stay out of configs/, removed on exit
+DISCOVERY = tempfile.TemporaryDirectory(prefix="discovery-")
+
+
+class ReceiveCounter:
+    """Counts the messages delivered for one topic and the latency of stamped messages"""
+
+    def __init__(self):
+        self.received = 0
+        self.latencies = []
+
+    def __call__(self, message):
+        self.received += 1
+        header = message.get("header")
+        if header is not None:
+            stamp = header["stamp"]
+            self.latencies.append(time.time() - (stamp["secs"] + stamp["nsecs"] / 1e9))
+
+    def take_latencies(self):
+        latencies, self.latencies = self.latencies, []
+        return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=600, help="Seconds to run for")
+    parser.add_argument("--interval", type=float, default=30, help="Seconds between reports")
+    parser.add_argument("--rate-scale", type=float, default=10)
+    parser.add_argument("--sonar-points", type=int, default=16)
+    parser.add_argument("--padding", type=int, default=0)
+    parser.add_argument("--backend", choices=ROSInterface.BACKENDS, default="asyncio")
+    parser.add_argument("--port", type=int, default=9098)
+    args = parser.parse_args()
+
+    simulator = RobotSimulator(port=args.port, rate_scale=args.rate_scale, sonar_points=args.sonar_points,
+                               padding=args.padding)
+    simulator.start()
+
+    tracemalloc.start()
+    process = psutil.Process()
+    robot = ROSInterface(backend=args.backend, discovery_directory=DISCOVERY.name)
+    robot.connect("127.0.0.1", args.port, rosserial=False)
+    while not robot.is_connected:
+        time.sleep(0.1)
+
+    counters = {}
+    for topic in robot.get_smart_topics():
+        counters[topic.topic_name] = ReceiveCounter()
+        robot.client.on(topic.topic_name, counters[topic.topic_name])
+
+    time.sleep(2)  # Let the subscriptions settle before taking the baseline
+    baseline_rss = process.memory_info().rss
+    baseline_snapshot = tracemalloc.take_snapshot()
+    sent_offset = dict(simulator.sent)
+    received_offset = {name: counter.received for name, counter in counters.items()}
+    start = time.time()
+
+    while time.time() - start < args.duration:
+        time.sleep(args.interval)
+        rss = process.memory_info().rss
+        print(f"\n[{time.time() - start:7.0f}s] RSS {rss / 2 ** 20:.1f} MiB "
+              f"({(rss - baseline_rss) / 2 ** 20:+.2f} MiB since baseline), threads {process.num_threads()}")
+        for stat in tracemalloc.take_snapshot().compare_to(baseline_snapshot, "lineno")[:3]:
+            print(f"    {stat}")
+        print(f"    {'topic':<28}{'sent':>9}{'recv':>9}{'dropped':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, counter in counters.items():
+            sent = simulator.sent.get(name, 0) - sent_offset.get(name, 0)
+            received = counter.received - received_offset[name]
+            if sent == 0 and received == 0:
+                continue
+            latencies = counter.take_latencies()
+            p50 = f"{latencies[len(latencies) // 2] * 1e3:.2f}" if latencies else "-"
+            p99 = f"{latencies[int(len(latencies) * 0.99) - 1] * 1e3:.2f}" if latencies else "-"
+            print(f"    {name:<28}{sent:>9}{received:>9}{max(sent - received, 0):>9}{p50:>9}{p99:>9}")
+
+    robot.terminate()
+    simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Sonar scan to screen dots, the old per point loop against SonarScan
+
+    python -m benchmarks.sonar_processing --duration 1
+
+16 points is the Pioneer's sonar ring, the larger clouds are what a sonar_pointcloud2 or laser topic would send.
+ms/scan includes converting the rosbridge point dicts to arrays.
+The second table is SonarFilter: its update cost, and how often a beam's colour class flips from one scan to the
+next for noisy readings (gaussian noise plus missed echoes) of a static scene, raw against filtered
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from ROS.Sonar import FAR_RANGE, SonarFilter, SonarScan, points_to_array
+
+
+def make_points(count):
+    points = []
+    for i in range(count):
+        angle = 2 * math.pi * i / count
+        distance = random.uniform(0.3, 6.0)
+        points.append({"x": distance * math.cos(angle), "y": distance * math.sin(angle), "z": 0.0})
+    return points
+
+
+def loop_dots(points):
+    """What PointCloud2UI.process_cloud used to do for every point"""
+    dots = []
+    for point in points:
+        raw_y = point["x"] + 0.2 if point["x"] > 0 else point["x"] - 0.2
+        x = (round(-point["y"] * 40) + 320) - 2
+        y = (round(-raw_y * 40) + 240) - 2
+        distance = np.sqrt(point["x"] ** 2 + point["y"] ** 2)
+        if distance > 5:
+            dots.append((x, y, 0))
+        elif distance < 1:
+            dots.append((x, y, 2))
+        else:
+            dots.append((x, y, 1))
+    return dots
+
+
+def array_dots(points):
+    scan = SonarScan(points_to_array(points))
+    pixels = scan.pixels()
+    dots = np.empty((len(scan), 3), dtype=np.int32)
+    dots[:, :2] = pixels - 2
+    dots[:, 2] = scan.classes
+    return dots
+
+
+def noisy_scans(beams, count, noise=0.15, missed=0.05):
+    """count scans of a static scene with ranges near the class boundaries"""
+    angle = np.linspace(0, 2 * np.pi, beams, endpoint=False)
+    truth = np.random.choice([0.9, 1.1, 2.5, 4.8], beams)
+    for _ in range(count):
+        ranges = truth + np.random.normal(0, noise, beams)
+        ranges[np.random.random(beams) < missed] = FAR_RANGE + 0.5
+        yield np.column_stack((ranges * np.cos(angle), ranges * np.sin(angle)))
+
+
+def flips_per_scan(scans):
+    classes = np.array([scan.classes for scan in scans])
+    return np.mean(classes[1:] != classes[:-1])
+
+
+def time_per_call(function, points, duration):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration or count < 3:
+        function(points)
+        count += 1
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=1)
+    args = parser.parse_args()
+
+    print(f"{'points':>8}{'loop ms':>10}{'array ms':>10}{'speedup':>9}")
+    for count in (16, 1_000, 100_000):
+        points = make_points(count)
+        assert np.array_equal(np.array(loop_dots(points)), array_dots(points))
+        loop = time_per_call(loop_dots, points, args.duration)
+        array = time_per_call(array_dots, points, args.duration)
+        print(f"{count:>8}{loop * 1000:>10.3f}{array * 1000:>10.3f}{loop / array:>9.1f}")
+
+    print()
+    print(f"{'beams':>8}{'filter us':>11}{'raw flips %':>13}{'filtered flips %':>18}")
+    for count in (16, 1_000, 100_000):
+        sonar = SonarFilter()
+        raw, filtered = [], []
+        scans = list(noisy_scans(count, 50 if count > 1000 else 500))
+        start = time.perf_counter()
+        for points in scans:
+            sonar.update(points)
+            raw.append(sonar.raw)
+            filtered.append(sonar.scan)
+        update = (time.perf_counter() - start) / len(scans)
+        print(f"{count:>8}{update * 1e6:>11.0f}{flips_per_scan(raw) * 100:>13.1f}"
+              f"{flips_per_scan(filtered[sonar.history:]) * 100:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
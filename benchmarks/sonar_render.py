@@ -0,0 +1,97 @@
+"""
+Frame time of the sonar view, the old per dot QPainter calls against the batched SonarLayer
+
+    python -m benchmarks.sonar_render --duration 1
+
+Both paint a 640x500 QImage, the raster engine the view falls back to without GPU acceleration. The old view also
+repainted on every 100ms tick, the batched one only paints when a scan arrives, so its idle cost is zero.
+build ms is the once per scan cost of turning the screen pixels into polygons
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5 import QtCore, QtGui
+from PyQt5.QtWidgets import QApplication
+
+from QT5_Classes.PointCloud2UI import SonarLayer, draw_grid
+from ROS.Sonar import SonarScan, points_to_array
+from benchmarks.sonar_processing import make_points
+
+
+def paint_per_dot(qp, dots):
+    """What PointCloud2UI.draw_lines used to do every tick, dots are (x - 2, y - 2, colour class)"""
+    for dot in dots:
+        if dot[2] == 0:
+            qp.setBrush(QtGui.QColor(255, 0, 0))
+        elif dot[2] == 1:
+            qp.setBrush(QtGui.QColor(0, 255, 0))
+        elif dot[2] == 2:
+            qp.setBrush(QtGui.QColor(255, 165, 0))
+        qp.drawEllipse(dot[0], dot[1], 5, 5)
+    last_dot = None
+    for dot in dots:
+        if dot[2] != 0:
+            last_dot = dot
+    qp.setPen(QtGui.QPen(QtCore.Qt.green, 1, QtCore.Qt.SolidLine))
+    for dot in dots:
+        if dot[2] == 0:
+            continue
+        qp.drawLine(last_dot[0] + 2, last_dot[1] + 2, dot[0] + 2, dot[1] + 2)
+        last_dot = dot
+    qp.setPen(QtGui.QPen(QtCore.Qt.gray, 1, QtCore.Qt.DashLine))
+    qp.drawLine(320, 0, 320, 480)
+    qp.drawLine(0, 240, 640, 240)
+
+
+def time_per_call(function, duration):
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration or count < 3:
+        function()
+        count += 1
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=1)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    image = QtGui.QImage(640, 500, QtGui.QImage.Format_RGB32)
+    grid = draw_grid(QtCore.QSize(640, 500))
+
+    print(f"{'points':>8}{'old ms':>10}{'new ms':>10}{'build ms':>10}{'speedup':>9}")
+    for count in (16, 1_000, 10_000, 100_000):
+        scan = SonarScan(points_to_array(make_points(count)))
+        pixels = scan.pixels()
+        dots = np.column_stack((pixels - 2, scan.classes)).tolist()
+        layer = SonarLayer()
+
+        def old():
+            image.fill(QtCore.Qt.black)
+            qp = QtGui.QPainter(image)
+            paint_per_dot(qp, dots)
+            qp.end()
+
+        def new():
+            qp = QtGui.QPainter(image)
+            qp.drawPixmap(0, 0, grid)
+            layer.paint(qp, QtCore.Qt.green)
+            qp.end()
+
+        build = time_per_call(lambda: layer.set_scan(pixels, scan.classes), args.duration)
+        old_time = time_per_call(old, args.duration)
+        new_time = time_per_call(new, args.duration)
+        print(f"{count:>8}{old_time * 1000:>10.3f}{new_time * 1000:>10.3f}{build * 1000:>10.3f}"
+              f"{old_time / new_time:>9.1f}")
+    del app
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Headless check of the SpeedGovernor against synthetic P3-AT sonar scans
+
+    python -m benchmarks.speed_governor
+
+Each scenario fills a SonarFilter with the same synthetic scan (walls placed around the robot, no echo past 5m) and
+checks the forward command the governor lets through in each direction. Time is simulated so the stale sonar case
+runs instantly. Also prints what the drive path pays per command for the lookup. Exits non-zero if a limit is off
+"""
+import sys
+import time
+
+import numpy as np
+
+from ROS.RobotSimulator import SONAR_ANGLES
+from ROS.Sonar import FAR_RANGE, SonarFilter
+from ROS.SpeedGovernor import SpeedGovernor
+
+ANGLES = np.radians(SONAR_ANGLES)
+
+
+def scan(ahead=None, behind=None, left=None):
+    """Sonar points for flat walls ahead (x = ahead), behind (x = -behind) and to the left (y = left)"""
+    ranges = np.full(len(ANGLES), FAR_RANGE + 0.5)
+    cos, sin = np.cos(ANGLES), np.sin(ANGLES)
+    with np.errstate(divide="ignore"):
+        for distance, facing in ((ahead, cos), (behind, -cos), (left, sin)):
+            if distance is not None:
+                hits = np.where(facing > 1e-6, distance / facing, np.inf)
+                ranges = np.minimum(ranges, np.where(hits < FAR_RANGE, hits, ranges))
+    return np.column_stack((ranges * cos, ranges * sin))
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# (name, scan, seconds since the scan, expected forward limit, expected reverse limit)
+SCENARIOS = [
+    ("clear", scan(), 0, 1.0, 1.0),
+    ("wall 3m ahead", scan(ahead=3.0), 0, 1.0, 1.0),
+    ("wall 1m ahead", scan(ahead=1.0), 0, 0.5, 1.0),
+    ("wall 0.4m ahead", scan(ahead=0.4), 0, 0.0, 1.0),
+    ("wall 0.8m behind", scan(behind=0.8), 0, 1.0, 0.3),
+    ("wall 0.5m to the left", scan(left=0.5), 0, 1.0, 1.0),
+    ("boxed in", scan(ahead=0.45, behind=0.45), 0, 0.0, 0.0),
+    ("sonar stale", scan(), 2.0, 0.25, 0.25),
+]
+
+
+def main():
+    failed = 0
+    print(f"{'scenario':<24}{'ahead m':>9}{'behind m':>10}{'forward':>9}{'reverse':>9}")
+    for name, points, age, forward, reverse in SCENARIOS:
+        clock = Clock()
+        sonar = SonarFilter()
+        governor = SpeedGovernor(clock=clock)
+        sonar.add_listener(governor.on_scan)
+        for _ in range(sonar.history):
+            sonar.update(points)
+        clock.now += age
+        got_forward, got_reverse = governor.limit(1.0), -governor.limit(-1.0)
+        ok = abs(got_forward - forward) < 0.02 and abs(got_reverse - reverse) < 0.02
+        failed += not ok
+        ahead, behind = governor.nearest
+        print(f"{name:<24}{ahead:>9.2f}{behind:>10.2f}{got_forward:>9.2f}{got_reverse:>9.2f}"
+              f"{'' if ok else f'  FAIL, expected {forward:.2f} {reverse:.2f}'}")
+
+    governor = SpeedGovernor()
+    if governor.limit(0.7) != 0.7:
+        print("FAIL: limited before any scan arrived")
+        failed += 1
+
+    governor.update(scan(ahead=1.0))
+    count = 200_000
+    start = time.perf_counter()
+    for _ in range(count):
+        governor.limit(0.8)
+    lookup = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    for _ in range(1000):
+        governor.update(scan(ahead=1.0))
+    update = (time.perf_counter() - start) / 1000
+    print(f"\ndrive path lookup {lookup * 1e9:.0f} ns, per scan precompute {update * 1e6:.0f} us")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Refresh cost of the air tank gauges, the old nested QLabel stack against TankGauge
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.tank_gauge --refreshes 300
+
+Each refresh updates every tank and processes the events that caused (polish, layout and paint), the way the frame
+clock drives AirTankElement. The label stack restyles, resizes and retexts its bar on every refresh like the old
+paintEvent did, TankGauge.set_value repaints only the strip of bar that moved and the text. Pressures either hold
+steady or ramp like a fill
+"""
+import argparse
+import time
+
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel
+from PyQt5 import QtCore
+
+from QT5_Classes.CannonUI import TankGauge
+
+MINIMUM, MAXIMUM, UNIT = 0, 120, "PSI"
+
+
+class LabelStackGauge(QWidget):
+    """The tank_box, tank_pressure_bar and tank_pressure_text labels AirTankElement used to build"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setFixedSize(500, 60)
+        self.tank_box = QLabel(self)
+        self.tank_box.setFixedSize(500, 60)
+        self.tank_box.setStyleSheet("background-color: grey; border: 2px solid black")
+        self.tank_pressure_bar = QLabel(self.tank_box)
+        self.tank_pressure_bar.setFixedSize(500, 60)
+        self.tank_pressure_text = QLabel("Unknown", parent=self.tank_box)
+        self.tank_pressure_text.setFixedSize(150, 30)
+        self.tank_pressure_text.setAlignment(QtCore.Qt.AlignCenter)
+        self.tank_pressure_text.setStyleSheet("color: black; background-color: transparent; border: 0px;"
+                                              "font-size: 20px; font-weight: bold")
+        self.tank_pressure_text.move(175, 15)
+
+    def set_value(self, value):
+        self.tank_pressure_bar.setStyleSheet("background-color: green")
+        self.tank_pressure_bar.setFixedSize(int(500 * (value - MINIMUM) / (MAXIMUM - MINIMUM)), 60)
+        self.tank_pressure_text.setText(f"{value:.2f}{UNIT}")
+
+
+def run(app, tanks, make_gauge, pressure, refreshes):
+    window = QWidget()
+    window.resize(520, 70 * tanks)
+    gauges = []
+    for i in range(tanks):
+        gauge = make_gauge(window)
+        gauge.move(10, 70 * i)
+        gauges.append(gauge)
+    window.show()
+    app.processEvents()
+    start = time.perf_counter()
+    for frame in range(refreshes):
+        for gauge in gauges:
+            gauge.set_value(pressure(frame))
+        app.processEvents()
+    elapsed = (time.perf_counter() - start) / refreshes
+    window.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refreshes", type=int, default=300)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    pressures = [("steady", lambda frame: 80.0), ("filling", lambda frame: 20 + frame * 0.3 % 100)]
+    print(f"{'tanks':>6}  {'pressure':<10}{'labels ms':>11}{'gauge ms':>10}{'speedup':>9}")
+    for tanks in (2, 8, 32):
+        for name, pressure in pressures:
+            old = run(app, tanks, LabelStackGauge, pressure, args.refreshes)
+            new = run(app, tanks, lambda parent: TankGauge(MINIMUM, MAXIMUM, UNIT, parent=parent), pressure,
+                      args.refreshes)
+            print(f"{tanks:>6}  {name:<10}{old * 1000:>11.3f}{new * 1000:>10.3f}{old / new:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Topic status refresh cost as the number of topics grows, the old label per topic against the table model
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.topic_table --topics 12 100 500
+
+The robot simulator runs in a separate process with --extra-topics 1Hz telemetry topics on top of the Pioneer's,
+an asyncio ROSInterface subscribes to all of them, driven from the Qt loop like the GUI. Every refresh of both
+widgets is timed including the events it caused (relayout and paint), and the table also reports how many rows it
+emitted dataChanged for. With labels only the first dozen topics are even visible in the 200px box
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+
+from PyQt5.QtCore import QEventLoop
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel
+
+from QT5_Classes.AsyncioPump import QtAsyncioPump
+from QT5_Classes.TopicStatusUI import TopicUI
+from ROS.RobotSimulator import EXTRA_TOPIC
+from ROS.RobotState import SmartTopic
+from ROS.ROSInterface import ROSInterface
+
+import humanize
+
+# Discovery caches of the simulators stay out of configs/, removed on exit
+DISCOVERY = tempfile.TemporaryDirectory(prefix="discovery-")
+
+
+class LabelTopicUI(QWidget):
+    """What TopicUI used to be, an absolutely positioned QLabel per topic rebuilt as HTML on every refresh"""
+
+    def __init__(self, robot):
+        super().__init__()
+        self.setFixedSize(350, 200)
+        self.labels = []
+        for i, topic in enumerate(topic for topic in robot.get_smart_topics() if not topic.hidden):
+            label = QLabel(f"<pre>{topic.topic_name}:</pre>", self)
+            label.setStyleSheet("font-weight: bold")
+            label.move(0, 20 + 15 * i)
+            label.setFixedSize(350, 20)
+            self.labels.append((topic, label))
+
+    def update_loop(self):
+        for topic, label in self.labels:
+            status, color = topic.get_status()
+            stats = topic.stats.snapshot()
+            if stats["messages"]:
+                bandwidth = humanize.naturalsize(stats["bytes_per_second"], gnu=True, format="%.1f")
+                status = f"{bandwidth}/s {status}"
+                label.setToolTip(f"{topic.topic_name}\n"
+                                 f"{stats['bytes_per_second']:.0f} B/s, {stats['messages_per_second']:.1f} msg/s\n"
+                                 f"decode {stats['decode_us']:.1f}us, update {stats['update_us']:.1f}us per msg\n"
+                                 f"{humanize.naturalsize(stats['bytes'], binary=True)} in {stats['messages']} msgs")
+            remaining_width = max(40 - len(topic.topic_name), 0)
+            label.setText(f"<pre>{topic.topic_name}: <font color={color}>{str(status).rjust(remaining_width)}</font></pre>")
+
+
+def spin(app, seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 20)
+
+
+def timed(app, refresh):
+    start = time.perf_counter()
+    refresh()
+    app.processEvents()
+    return time.perf_counter() - start
+
+
+def measure(app, loop, topics, port, refreshes):
+    extra = max(topics - 12, 0)
+    simulator = subprocess.Popen([sys.executable, "-m", "ROS.RobotSimulator", "--port", str(port),
+                                  "--extra-topics", str(extra)],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    robot = ROSInterface(backend="asyncio", loop=loop, discovery_directory=DISCOVERY.name)
+    try:
+        for i in range(extra):
+            robot.add_smart_topic(SmartTopic(f"telemetry_{i}", EXTRA_TOPIC.format(i), topic_type="std_msgs/Float64"))
+        spin(app, 1.5)
+        robot.connect("127.0.0.1", port, rosserial=False)
+        labels = LabelTopicUI(robot)
+        table = TopicUI(robot)
+        table.refresh.cancel()  # Refreshed by hand below
+        labels.show()
+        table.show()
+        spin(app, 4)
+
+        label_times, table_times, changed = [], [], []
+        for _ in range(refreshes):
+            spin(app, 0.5)
+            label_times.append(timed(app, labels.update_loop))
+            table_times.append(timed(app, table.update_loop))
+            changed.append(table.model.changed_rows)
+        visible = sum(1 for topic in robot.get_smart_topics() if not topic.hidden)
+        ok = sum(1 for topic in robot.get_smart_topics() if not topic.hidden and topic.get_status()[1] == "green")
+        labels.close()
+        table.close()
+        return visible, ok, sorted(label_times)[len(label_times) // 2], sorted(table_times)[len(table_times) // 2], \
+            sum(changed) / len(changed)
+    finally:
+        robot.terminate()
+        simulator.terminate()
+        simulator.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, nargs="+", default=[12, 100, 500])
+    parser.add_argument("--refreshes", type=int, default=10)
+    parser.add_argument("--port", type=int, default=9330)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    loop = asyncio.new_event_loop()
+    # Held on the app as it has to outlive the measurements, it owns the timer driving the loop
+    app.asyncio_pump = QtAsyncioPump(loop)
+    print(f"{'topics':>7}{'ok':>6}{'labels ms':>11}{'table ms':>10}{'speedup':>9}{'rows changed':>14}")
+    for i, topics in enumerate(args.topics):
+        visible, ok, labels, table, changed = measure(app, loop, topics, args.port + i, args.refreshes)
+        print(f"{visible:>7}{ok:>6}{labels * 1000:>11.2f}{table * 1000:>10.2f}{labels / table:>9.1f}{changed:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
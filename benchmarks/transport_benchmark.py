@@ -0,0 +1,99 @@
+"""
+Compares the roslibpy (twisted) and asyncio rosbridge transports against the local robot simulator
+
+    python -m benchmarks.transport_benchmark --messages 5000 --rate 1000
+
+Each backend runs in its own subprocess since the twisted reactor cannot be restarted within a process.
+Reported per backend: CPU time per received message, mean/p99 latency from the simulator's header stamp to
+SmartTopic._update and the number of live threads once the subscription is streaming
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import roslibpy
+
+from ROS.AsyncTransport import AsyncRos
+from ROS.RobotState import SmartTopic
+from ROS.RobotSimulator import RobotSimulator
+
+
+class BenchTopic(SmartTopic):
+
+    def __init__(self, *args, expected=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expected = expected
+        self.latencies = []
+        self.first_message = None
+        self.done = threading.Event()
+
+    def _update(self, message):
+        if self.first_message is None:
+            self.first_message = time.process_time()
+        super()._update(message)
+        stamp = message["header"]["stamp"]
+        self.latencies.append(time.time() - (stamp["secs"] + stamp["nsecs"] / 1e9))
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def run_child(backend, port, messages):
+    if backend == "asyncio":
+        client = AsyncRos(host="127.0.0.1", port=port)
+    else:
+        client = roslibpy.Ros(host="127.0.0.1", port=port)
+    topic = BenchTopic("odometry", "/my_p3at/pose", expected=messages)
+    topic.set_client(client)
+    client.run()
+    if not topic.done.wait(120):
+        raise Exception(f"Only received {len(topic.latencies)} of {messages} messages")
+    cpu = time.process_time() - topic.first_message
+    threads = threading.active_count()
+    latencies = sorted(topic.latencies)
+    result = {
+        "backend": backend,
+        "messages": len(latencies),
+        "cpu_per_message_us": cpu / len(latencies) * 1e6,
+        "mean_latency_ms": sum(latencies) / len(latencies) * 1e3,
+        "p99_latency_ms": latencies[int(len(latencies) * 0.99) - 1] * 1e3,
+        "threads": threads,
+    }
+    print(json.dumps(result))
+    client.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=1000, help="Odometry messages per second sent by the simulator")
+    parser.add_argument("--port", type=int, default=9099)
+    parser.add_argument("--child", choices=("roslibpy", "asyncio"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.port, args.messages)
+        return
+
+    # Only odometry is published so every received message is one the benchmark is timing
+    simulator = RobotSimulator(port=args.port, rate_scale=0, rates={"/my_p3at/pose": args.rate})
+    simulator.start()
+
+    print(f"{'backend':<10}{'msgs':>8}{'cpu/msg (us)':>14}{'mean lat (ms)':>15}{'p99 lat (ms)':>14}{'threads':>9}")
+    for backend in ("roslibpy", "asyncio"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.transport_benchmark", "--child", backend,
+                                 "--port", str(args.port), "--messages", str(args.messages)],
+                                capture_output=True, text=True, timeout=300)
+        lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+        if not lines:
+            print(f"{backend:<10} failed: {output.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(lines[-1])
+        print(f"{r['backend']:<10}{r['messages']:>8}{r['cpu_per_message_us']:>14.1f}"
+              f"{r['mean_latency_ms']:>15.2f}{r['p99_latency_ms']:>14.2f}{r['threads']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Trend plot cost as the history behind it grows, from a minute to hours of 50Hz samples
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.trend_plot --hours 4
+
+Five histories like the driver station's (two tank pressures, battery voltage, forward and turn) are filled with
+synthetic 50Hz data, then the plot is repainted over each span. Decimation is SampleHistory.columns for one trace
+at the plot's width, the repaint includes it for every trace. Both should stay flat however many samples the span
+holds, against the naive approach of turning every sample in the span into a polyline point
+"""
+import argparse
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from QT5_Classes.TrendPlot import TrendPlot, TrendLane
+from ROS.SampleHistory import SampleHistory
+
+RATE = 50
+
+
+def filled(seconds, now, seed):
+    history = SampleHistory(seconds, RATE)
+    rng = np.random.default_rng(seed)
+    samples = int(seconds * RATE)
+    times = now - seconds + np.arange(samples) / RATE
+    values = np.cumsum(rng.normal(0, 0.05, samples)) + 50
+    for t, value in zip(times, values):
+        history.append(value, t)
+    return history
+
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=4)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    app = QApplication([])
+    now = 1e9
+    seconds = args.hours * 3600
+    print(f"filling 5 histories with {args.hours:g}h at {RATE}Hz...")
+    histories = [filled(seconds, now, seed) for seed in range(5)]
+    lanes = [TrendLane("Pressure", [("T1", histories[0], "deepskyblue"), ("T2", histories[1], "orange")]),
+             TrendLane("Battery", [("V", histories[2], "limegreen")]),
+             TrendLane("Cmd vel", [("fwd", histories[3], "yellow"), ("turn", histories[4], "magenta")])]
+    plot = TrendPlot(lanes, clock=lambda: now)
+    plot.refresh.cancel()  # Repainted by hand below
+    plot.show()
+    app.processEvents()
+    width = plot.lane_rects()[0].width()
+
+    print(f"{'span':>8}{'samples':>10}{'decimate ms':>13}{'repaint ms':>12}{'naive ms':>10}")
+    for span in (60, 600, 3600, seconds):
+        if span > seconds:
+            continue
+        plot.set_span(span)
+        history = histories[0]
+        samples = sum(last - first for first, last in history._ranges(now - span, now))
+        decimate = timed(lambda: history.columns(now - span, now, width), args.repeats)
+        repaint = timed(plot.repaint, args.repeats)
+        # Every sample scaled to a point, what drawing the raw span would have to do before even painting it
+        naive = timed(lambda: np.column_stack(history._span(history._ranges(now - span, now))) * (1.0, 2.0), 5)
+        print(f"{span / 60:>7g}m{samples:>10}{decimate * 1000:>13.3f}{repaint * 1000:>12.3f}{naive * 1000:>10.3f}")
+    print(f"max repaint {plot.max_paint_time * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,30 @@
+import argparse
 import ctypes
+import os
+import signal
 import sys
 import asyncio
 import threading
 
 import roslibpy
-from PyQt5 import QtGui
-from PyQt5.QtWidgets import QApplication
 
+from DriverCore import DriverCore
 from ROS import ROSInterface
-import DriverStatonUI
 import logging
 import paramiko
 
 logging.basicConfig(level=logging.INFO)
 
-if __name__ == '__main__':
+
+def split_address(address, default_port=9090):
+    host, _, port = address.partition(":")
+    return host, int(port or default_port)
+
+
+def create_app():
+    from PyQt5 import QtGui
+    from PyQt5.QtWidgets import QApplication
+
     app = QApplication([])
     app.setStyle('Windows')
     app.setApplicationName("T-Shirt Cannon Driver Station")
@@ -22,18 +32,105 @@ if __name__ == '__main__':
     app.setWindowIcon(QtGui.QIcon("resources/rse.png"))
     app.setQuitOnLastWindowClosed(True)
 
-    myappid = 'rse.tshirt.cannon.station'  # arbitrary string
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+    if sys.platform == "win32":
+        myappid = 'rse.tshirt.cannon.station'  # arbitrary string
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
+    return app
+
+
+def run_gui(app, core, args):
+    from PyQt5.QtCore import QTimer
+    import DriverStatonUI
+
+    # Held on the app so the window isn't garbage collected while the event loop runs
+    app.driver_station = DriverStatonUI.DriverStationUI(core, ui_fps=args.ui_fps)
+    if args.run_seconds:
+        QTimer.singleShot(int(args.run_seconds * 1000), app.quit)
+    app.exec_()
+
+
+def run_terminal(core, args):
+    """The dashboard, or with --headless a status line logged every --status-interval seconds, until stopped"""
+    from TerminalDashboard import TerminalDashboard
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    if args.run_seconds:
+        timer = threading.Timer(args.run_seconds, stop.set)
+        timer.daemon = True
+        timer.start()
+    dashboard = TerminalDashboard(core, refresh_per_second=args.dashboard_rate)
+    try:
+        if args.headless:
+            while not stop.wait(args.status_interval):
+                logging.info(dashboard.summary())
+        else:
+            dashboard.run(stop)
+    except KeyboardInterrupt:
+        pass
 
-    pioneer = ROSInterface.ROSInterface()  # MAC: a0:a8:cd:be:8d:2c
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="T-Shirt Cannon Driver Station")
+    parser.add_argument("--backend", choices=ROSInterface.ROSInterface.BACKENDS, default="roslibpy",
+                        help="rosbridge transport, asyncio runs all ROS traffic on the Qt thread "
+                             "(on a thread of its own without Qt)")
+    parser.add_argument("--cannon-bridge", metavar="HOST[:PORT]",
+                        help="Connect to a separate rosbridge for the cannon controller")
+    parser.add_argument("--replay-seconds", type=float, default=0.0,
+                        help="Seconds of camera kept before each shot and saved to configs/replays, off by default as "
+                             "recording keeps the robot encoding camera frames with no viewer open")
+    parser.add_argument("--ui-fps", type=int, default=30,
+                        help="Rate the display refreshes at, every widget is updated off this one clock")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dashboard", action="store_true",
+                      help="Show the driver station in the terminal instead of a window, Qt is never loaded")
+    mode.add_argument("--headless", action="store_true",
+                      help="No display at all, only log a status line every --status-interval seconds")
+    parser.add_argument("--connect", metavar="HOST[:PORT]",
+                        help="Connect to the Pioneer's rosbridge on startup, needed without the window")
+    parser.add_argument("--no-rosserial", action="store_true", help="Don't start rosserial over SSH on --connect")
+    parser.add_argument("--dashboard-rate", type=float, default=2.0, help="Terminal dashboard redraws per second")
+    parser.add_argument("--status-interval", type=float, default=10.0, help="Seconds between headless status lines")
+    parser.add_argument("--run-seconds", type=float, help="Exit after this many seconds, for scripted runs")
+    args = parser.parse_args()
+    terminal = args.dashboard or args.headless
+
+    if args.dashboard:
+        # Log lines would tear the dashboard, they go to a file instead
+        os.makedirs("configs", exist_ok=True)
+        logging.basicConfig(filename="configs/driver_station.log", level=logging.INFO, force=True)
+
+    app = None if terminal else create_app()
+    loop = None
+    if args.backend == "asyncio" and app is not None:
+        from QT5_Classes.AsyncioPump import QtAsyncioPump
+        loop = asyncio.new_event_loop()
+        pump = QtAsyncioPump(loop)  # The asyncio loop is stepped by the Qt event loop
+    # Without Qt each interface runs its asyncio loop on a thread of its own
+
+    cannon = None
+    if args.cannon_bridge:
+        # The cannon topics move to their own interface, the Pioneer only keeps its base topics
+        pioneer = ROSInterface.ROSInterface(backend=args.backend, loop=loop, profile="pioneer_base", name="pioneer")
+        cannon = ROSInterface.ROSInterface(backend=args.backend, loop=loop, profile="cannon")
+        cannon.connect(*split_address(args.cannon_bridge), rosserial=False)
+    else:
+        pioneer = ROSInterface.ROSInterface(backend=args.backend, loop=loop)  # MAC: a0:a8:cd:be:8d:2c
+    if args.connect:
+        pioneer.connect(*split_address(args.connect), rosserial=not args.no_rosserial)
     # while pioneer.client.is_connecting:
     #     pass
-    gui = DriverStatonUI.DriverStationUI(pioneer)
-    # threading.Thread(target=gui.run, daemon=True).start()
+    core = DriverCore(pioneer, cannon, replay_seconds=args.replay_seconds)
+    core.start()
 
-    app.exec_()
-    # gui.run()
+    if terminal:
+        run_terminal(core, args)
+    else:
+        run_gui(app, core, args)
     # while pioneer.client.is_connected:
     #     pass
     pioneer.terminate()
+    if cannon is not None:
+        cannon.terminate()
     # Set qt event loop